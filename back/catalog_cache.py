@@ -0,0 +1,125 @@
+import json
+import os
+import threading
+
+
+class FrozenDict(dict):
+    """A dict that refuses in-place modification (json and pickle still work)."""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("catalog data is read-only; use thaw() to get a mutable copy")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(obj):
+    """Recursively convert dicts to FrozenDict and lists to tuples."""
+    if isinstance(obj, dict):
+        return FrozenDict((k, freeze(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(v) for v in obj)
+    return obj
+
+
+def thaw(obj):
+    """Return a mutable deep copy (plain dicts and lists) of frozen data."""
+    if isinstance(obj, dict):
+        return {k: thaw(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [thaw(v) for v in obj]
+    return obj
+
+
+class CatalogCache:
+    """
+    Process-wide read-through cache of parsed JSON files, keyed by path.
+
+    Each lookup revalidates the entry with a single stat() call; the file is
+    only re-parsed when its mtime or size changed. Cached documents are
+    frozen so callers cannot corrupt them for each other.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, path):
+        """
+        Return the frozen content of a JSON file.
+
+        Args:
+            path (str): Path of the JSON file.
+
+        Returns:
+            The parsed document, frozen (FrozenDict/tuple).
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+            ValueError: If the file is not valid JSON.
+        """
+        path = os.path.abspath(path)
+        label = os.path.basename(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"{label} file not found.")
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == signature:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = freeze(json.load(f))
+        except json.JSONDecodeError:
+            raise ValueError(f"Error decoding {label} file.")
+
+        with self._lock:
+            self._entries[path] = (signature, data)
+        return data
+
+    def signature(self, path):
+        """Return the (mtime_ns, size) the cached entry of `path` was loaded with."""
+        entry = self._entries.get(os.path.abspath(path))
+        return entry[0] if entry else None
+
+    def prime(self, path, signature, data):
+        """Store already-parsed, frozen `data` for `path` as if it had been loaded."""
+        with self._lock:
+            self._entries[os.path.abspath(path)] = (signature, data)
+
+    def invalidate(self, path=None):
+        """Drop one entry, or every entry when `path` is None."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(path), None)
+
+    def stats(self):
+        """Return hit/miss counters and the number of cached files."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+_cache = CatalogCache()
+
+
+def get_catalog_cache():
+    """Return the process-wide catalog cache."""
+    return _cache
+
+
+def load_cached_json(path):
+    """Shortcut for get_catalog_cache().load(path)."""
+    return _cache.load(path)
@@ -0,0 +1,183 @@
+import os
+import threading
+
+from catalog_cache import freeze, get_catalog_cache
+
+# 定义数据库目录
+DB_DIR = os.path.join(os.path.dirname(__file__), "..", "databases")
+
+# 目录类数据库：类别 -> 文件名
+CATALOG_FILES = {
+    "courses": "courses.json",
+    "research": "research.json",
+    "contests": "contests.json",
+    "course_requirement": "course_requirement.json",
+    "tags": "tags.json",
+}
+# 各目录中条目列表所在的字段
+ITEM_LIST_KEYS = {
+    "courses": "课程列表",
+    "research": "科研列表",
+    "contests": "竞赛列表",
+}
+# 与前端匹配详情一致的简介字段
+DESCRIPTION_KEYS = {
+    "courses": ("course_introduction", "暂无介绍"),
+    "research": ("abstract", "暂无简介"),
+    "contests": ("description", "暂无简介"),
+}
+
+
+class MajorCatalog:
+    """Everything the catalog knows about one (school, major), precomputed."""
+
+    __slots__ = (
+        "school", "major", "records", "knowledge_tags", "skill_tags",
+        "courses", "research", "contests", "course_names", "research_names",
+        "contest_names", "contest_awards", "courses_by_semester", "course_map",
+        "required_categories", "elective_subcategory_map", "optional_requirements",
+        "user_template",
+    )
+
+    def __init__(self, school, major):
+        self.school = school
+        self.major = major
+        # 各目录文件中该专业的原始记录（只读），类别 -> 记录
+        self.records = {}
+        self.knowledge_tags = ()
+        self.skill_tags = ()
+
+    def _finish(self):
+        courses_record = self.records.get("courses", {})
+        self.courses = courses_record.get("课程列表", ())
+        self.research = self.records.get("research", {}).get("科研列表", ())
+        self.contests = self.records.get("contests", {}).get("竞赛列表", ())
+        self.course_names = [c["name"] for c in self.courses]
+        self.research_names = [r["name"] for r in self.research]
+        self.contest_names = [ct["name"] for ct in self.contests]
+        self.contest_awards = {ct["name"]: ct.get("potential_awards", ["参与奖"]) for ct in self.contests}
+        self.courses_by_semester = {}
+        for course in self.courses:
+            self.courses_by_semester.setdefault(course.get("standard_semester"), []).append(course)
+        self.course_map = courses_record.get("course_map", ())
+        self.required_categories = frozenset(courses_record.get("必修课类别列表", ()))
+        self.elective_subcategory_map = {}
+        for item in courses_record.get("个性化选修课类别从属", ()):
+            for sub in item.get("subcategories", ()):
+                self.elective_subcategory_map[sub] = item.get("category")
+        self.optional_requirements = self.records.get("course_requirement", {}).get("个性化选修课课程要求", ())
+        # 新用户模板：知识/能力骨架与 remaining_tasks，注册时复制一份即可
+        self.user_template = freeze({
+            "knowledge": {t: 0.0 for t in self.knowledge_tags},
+            "skills": {t: 0.0 for t in self.skill_tags},
+            "remaining_tasks": {
+                "must_required_courses": self.course_map,
+                "optional_course_gap": self.optional_requirements,
+            },
+        })
+
+
+class CatalogIndex:
+    """
+    Dict-based index over the catalog databases, built once per catalog version.
+
+    - `major(school, major)` -> MajorCatalog
+    - `records_for_major(kind, major)` -> [(school, raw major record), ...] in file order
+    - `courses` / `research` / `contests` -> name -> item (later majors win, as before)
+    - `descriptions` -> name -> introduction/abstract/description
+    """
+
+    def __init__(self, version, catalogs):
+        self.version = version
+        self.majors = {}
+        self.courses = {}
+        self.research = {}
+        self.contests = {}
+        self.descriptions = {}
+        self._by_major_name = {kind: {} for kind in CATALOG_FILES}
+
+        for kind in ("courses", "research", "contests", "course_requirement"):
+            lookup = getattr(self, kind, None)
+            list_key = ITEM_LIST_KEYS.get(kind)
+            desc_key, desc_default = DESCRIPTION_KEYS.get(kind, (None, None))
+            for college in catalogs[kind].get("学院列表", ()):
+                school = college.get("学院名称")
+                for major_item in college.get("专业列表", ()):
+                    major = major_item.get("专业名称")
+                    self._entry(school, major).records[kind] = major_item
+                    self._by_major_name[kind].setdefault(major, []).append((school, major_item))
+                    for item in major_item.get(list_key, ()) if list_key else ():
+                        lookup[item["name"]] = item
+                        self.descriptions[item["name"]] = item.get(desc_key, desc_default)
+
+        tags = catalogs["tags"]
+        for tag_item in tags if isinstance(tags, (list, tuple)) else ():
+            tag_key = tag_item.get("tag")
+            if tag_key not in ("knowledge", "skills"):
+                continue
+            for college in tag_item.get("学院列表", ()):
+                school = college.get("学院名称")
+                for major, major_tags in college.get("专业列表", {}).items():
+                    entry = self._entry(school, major)
+                    if tag_key == "knowledge":
+                        entry.knowledge_tags = tuple(major_tags)
+                    else:
+                        entry.skill_tags = tuple(major_tags)
+
+        for entry in self.majors.values():
+            entry._finish()
+
+    def _entry(self, school, major):
+        entry = self.majors.get((school, major))
+        if entry is None:
+            entry = self.majors[(school, major)] = MajorCatalog(school, major)
+        return entry
+
+    def major(self, school, major):
+        """Return the MajorCatalog of (school, major), or None."""
+        return self.majors.get((school, major))
+
+    def records_for_major(self, kind, major):
+        """Return [(school, raw major record)] of `kind` for a major name, in file order."""
+        return self._by_major_name[kind].get(major, [])
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _load_catalogs():
+    cache = get_catalog_cache()
+    catalogs, version = {}, []
+    for kind, filename in CATALOG_FILES.items():
+        path = os.path.join(DB_DIR, filename)
+        try:
+            catalogs[kind] = cache.load(path)
+        except (OSError, ValueError):
+            catalogs[kind] = {}
+        version.append(cache.signature(path))
+    return catalogs, tuple(version)
+
+
+def get_catalog_index():
+    """
+    Return the CatalogIndex of the current catalog version.
+
+    Each call revalidates the catalog files through the catalog cache (one
+    stat() per file); the index is only rebuilt when one of them changed.
+    The first call of a process uses the compiled snapshot when it is fresh.
+    """
+    global _index
+    if _index is None:
+        # 冷启动：源文件未变化时直接加载编译好的快照，跳过解析与建索引
+        from catalog_snapshot import load_snapshot
+        with _index_lock:
+            if _index is None:
+                _index = load_snapshot()
+    catalogs, version = _load_catalogs()
+    if _index is not None and _index.version == version:
+        return _index
+    with _index_lock:
+        if _index is None or _index.version != version:
+            _index = CatalogIndex(version, catalogs)
+        return _index
@@ -0,0 +1,225 @@
+import argparse
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from catalog_index import DESCRIPTION_KEYS, get_catalog_index
+
+# 每类（选修课、科研、竞赛）最多发送给 LLM 的条目数；0 表示不检索，发送本专业的全部条目
+TOP_K = int(os.environ.get("RECOMMEND_TOP_K", "8"))
+# 综合得分中需求相关度所占的权重，其余为知识/能力短板得分
+RELEVANCE_WEIGHT = float(os.environ.get("RECOMMEND_RELEVANCE_WEIGHT", "0.6"))
+BM25_K1 = 1.5
+BM25_B = 0.75
+# 中文按字取 n-gram（不依赖分词器），英文和数字按词切分
+NGRAM = 2
+_TOKEN = re.compile(r"[a-z0-9]+|[\u3400-\u9fff]+")
+# 条目中表示所教知识或锻炼能力的字段，与用户的 knowledge / skills 对应
+TEACHES_KEYS = {"courses": "knowledge", "research": "skills", "contests": "skills"}
+COMPLETED_FIELDS = {"courses": "completed_courses", "research": "research_done", "contests": "competitions_done"}
+
+
+def tokenize(text):
+    """Character n-grams of the CJK runs of `text` plus its lowercase ASCII words."""
+    tokens = []
+    for run in _TOKEN.findall((text or "").lower()):
+        if run.isascii() or len(run) <= NGRAM:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + NGRAM] for i in range(len(run) - NGRAM + 1))
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of tokenized documents."""
+
+    def __init__(self, documents, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.frequencies = [Counter(doc) for doc in documents]
+        self.lengths = [len(doc) for doc in documents]
+        self.avg_length = sum(self.lengths) / len(documents) if documents else 0.0
+        df = Counter(term for freq in self.frequencies for term in freq)
+        n = len(documents)
+        self.idf = {term: math.log(1 + (n - count + 0.5) / (count + 0.5)) for term, count in df.items()}
+
+    def scores(self, query_tokens):
+        """BM25 score of every document for the query, in document order."""
+        terms = [t for t in set(query_tokens) if t in self.idf]
+        result = []
+        for freq, length in zip(self.frequencies, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            score = 0.0
+            for term in terms:
+                tf = freq.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            result.append(score)
+        return result
+
+
+def _document(kind, item):
+    desc_key = DESCRIPTION_KEYS[kind][0]
+    return " ".join(str(part) for part in (item.get("name"), item.get(desc_key), item.get("category")) if part)
+
+
+def gap_score(item, kind, user):
+    """
+    How much of what an item teaches falls on the user's weak dimensions, in [0, 1].
+
+    A dimension's weakness is 1 - (user score / the user's best score); the
+    item's knowledge (courses) or skills (research, contests) weights average it.
+    """
+    taught = item.get(TEACHES_KEYS[kind], {})
+    mastery = user.get(TEACHES_KEYS[kind], {})
+    best = max((float(v or 0.0) for v in mastery.values()), default=0.0)
+    total = weighted = 0.0
+    for dim, weight in taught.items():
+        try:
+            weight = float(weight)
+        except (TypeError, ValueError):
+            continue
+        if weight <= 0:
+            continue
+        weakness = 1.0 - float(mastery.get(dim) or 0.0) / best if best > 0 else 1.0
+        total += weight
+        weighted += weight * max(0.0, weakness)
+    return weighted / total if total else 0.0
+
+
+class MajorRetriever:
+    """BM25 indexes over the courses, research projects and contests of one major."""
+
+    def __init__(self, major_catalog):
+        self.major_catalog = major_catalog
+        self.items = {
+            "courses": list(major_catalog.courses),
+            "research": list(major_catalog.research),
+            "contests": list(major_catalog.contests),
+        }
+        self.indexes = {
+            kind: BM25Index([tokenize(_document(kind, item)) for item in items])
+            for kind, items in self.items.items()
+        }
+
+    def rank(self, kind, user, demand, candidates=None):
+        """
+        Score the items of one kind for a demand.
+
+        Args:
+            kind (str): "courses", "research" or "contests".
+            user (dict): The user record (knowledge/skills for the gap score).
+            demand (str): The student's request.
+            candidates (callable): Optional predicate; items failing it are skipped.
+
+        Returns:
+            list: [(score, relevance, gap, item)], best first.
+        """
+        items = self.items[kind]
+        relevance = self.indexes[kind].scores(tokenize(demand))
+        top = max(relevance, default=0.0)
+        ranked = []
+        for position, item in enumerate(items):
+            if candidates is not None and not candidates(item):
+                continue
+            rel = relevance[position] / top if top > 0 else 0.0
+            gap = gap_score(item, kind, user)
+            score = RELEVANCE_WEIGHT * rel + (1 - RELEVANCE_WEIGHT) * gap
+            ranked.append((score, rel, gap, position, item))
+        ranked.sort(key=lambda entry: (-entry[0], entry[3]))
+        return [(score, rel, gap, item) for score, rel, gap, _, item in ranked]
+
+
+_retrievers = {}
+_retrievers_lock = threading.Lock()
+
+
+def get_major_retriever(school, major, catalog_index=None):
+    """Return the MajorRetriever of (school, major) for the current catalog version, or None."""
+    catalog_index = catalog_index or get_catalog_index()
+    major_catalog = catalog_index.major(school, major)
+    if major_catalog is None:
+        return None
+    key = (school, major)
+    with _retrievers_lock:
+        entry = _retrievers.get(key)
+        if entry is None or entry[0] != catalog_index.version:
+            entry = _retrievers[key] = (catalog_index.version, MajorRetriever(major_catalog))
+        return entry[1]
+
+
+def retrieve_items(user, demand, top_k=None, catalog_index=None):
+    """
+    The catalog items of the user's major worth sending to the LLM for a demand.
+
+    Electives of the current semester, research projects and contests the
+    user has not completed are ranked by RELEVANCE_WEIGHT * BM25 relevance
+    to the demand (normalized to the best match) plus the rest * gap_score,
+    and the top `top_k` of each kind are kept. Required courses of the
+    current semester are always kept (they bound how many electives to
+    suggest).
+
+    Args:
+        user (dict): The user record.
+        demand (str): The student's request.
+        top_k (int): Items per kind; TOP_K by default.
+        catalog_index (CatalogIndex): Defaults to the current catalog.
+
+    Returns:
+        dict: kind -> list of catalog items, or None if retrieval is off
+        (top_k <= 0) or the major is unknown.
+    """
+    top_k = TOP_K if top_k is None else top_k
+    if top_k <= 0:
+        return None
+    profile = user.get("profile", {})
+    retriever = get_major_retriever(profile.get("school"), profile.get("major"), catalog_index)
+    if retriever is None:
+        return None
+    progress = user.get("academic_progress", {})
+    semester = progress.get("current_semester")
+    required = retriever.major_catalog.required_categories
+
+    selected = {}
+    for kind, field in COMPLETED_FIELDS.items():
+        done = {item.get("name") for item in progress.get(field, [])}
+        if kind == "courses":
+            offered = [c for c in retriever.items["courses"] if c.get("standard_semester") == semester and c["name"] not in done]
+            electives = {id(c) for c in offered if c.get("category") not in required}
+            chosen = {id(c) for c in offered if id(c) not in electives}
+            chosen.update(id(item) for _, _, _, item in retriever.rank(
+                kind, user, demand, lambda c: id(c) in electives,
+            )[:top_k])
+            # 保持目录中的原有顺序
+            selected[kind] = [c for c in offered if id(c) in chosen]
+        else:
+            ranked = retriever.rank(kind, user, demand, lambda item: item["name"] not in done)
+            selected[kind] = [item for _, _, _, item in ranked[:top_k]]
+    return selected
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the catalog items retrieved for a user's demand.")
+    parser.add_argument("user_id")
+    parser.add_argument("demand")
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    args = parser.parse_args()
+
+    from register import get_user
+
+    user = get_user(args.user_id)
+    if not user:
+        raise SystemExit(f"User with ID {args.user_id} not found.")
+    profile = user.get("profile", {})
+    retriever = get_major_retriever(profile.get("school"), profile.get("major"))
+    selected = retrieve_items(user, args.demand, top_k=args.top_k)
+    if retriever is None or selected is None:
+        raise SystemExit("No catalog for the user's major.")
+    for kind, items in selected.items():
+        names = {item["name"] for item in items}
+        print(f"{kind}: {len(items)}/{len(retriever.items[kind])}")
+        for score, rel, gap, item in retriever.rank(kind, user, args.demand, lambda item: item["name"] in names):
+            print(json.dumps({"name": item["name"], "score": round(score, 3), "relevance": round(rel, 3), "gap": round(gap, 3)}, ensure_ascii=False))
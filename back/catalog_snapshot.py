@@ -0,0 +1,194 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+
+from catalog_cache import freeze, get_catalog_cache
+from catalog_index import CATALOG_FILES, DB_DIR, ITEM_LIST_KEYS, CatalogIndex
+
+SNAPSHOT_PATH = os.path.join(DB_DIR, "catalog.snapshot")
+# 快照格式版本：结构变化时递增，旧快照会被忽略
+SNAPSHOT_FORMAT = 2
+
+
+def validate_catalogs(catalogs):
+    """
+    Check the structure of the catalog databases.
+
+    Args:
+        catalogs (dict): kind -> parsed document (see CATALOG_FILES).
+
+    Returns:
+        list: Human-readable problems; empty if the catalogs are valid.
+    """
+    errors = []
+
+    def is_number(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    for kind, filename in CATALOG_FILES.items():
+        if kind == "tags":
+            continue
+        data = catalogs[kind]
+        if not isinstance(data, dict) or not isinstance(data.get("学院列表"), list):
+            errors.append(f"{filename}: 缺少 学院列表")
+            continue
+        for college in data["学院列表"]:
+            school = college.get("学院名称")
+            if not isinstance(school, str) or not isinstance(college.get("专业列表"), list):
+                errors.append(f"{filename}: 学院条目缺少 学院名称/专业列表")
+                continue
+            for major_item in college["专业列表"]:
+                major = major_item.get("专业名称")
+                where = f"{filename}: {school}/{major}"
+                if not isinstance(major, str):
+                    errors.append(f"{filename}: {school} 下的专业缺少 专业名称")
+                    continue
+                list_key = ITEM_LIST_KEYS.get(kind)
+                if not list_key:
+                    continue
+                seen = set()
+                for item in major_item.get(list_key, []):
+                    name = item.get("name")
+                    if not isinstance(name, str) or not name:
+                        errors.append(f"{where}: {list_key} 中存在缺少 name 的条目")
+                        continue
+                    if name in seen:
+                        errors.append(f"{where}: 重复条目 {name}")
+                    seen.add(name)
+                    if kind == "courses":
+                        if not is_number(item.get("credits", 0)):
+                            errors.append(f"{where}: {name} 的 credits 不是数字")
+                        if not isinstance(item.get("standard_semester"), int):
+                            errors.append(f"{where}: {name} 的 standard_semester 不是整数")
+                        scores = item.get("knowledge", {})
+                    else:
+                        scores = item.get("skills", {})
+                    if not isinstance(scores, dict) or not all(is_number(v) for v in scores.values()):
+                        errors.append(f"{where}: {name} 的维度分值必须是数字")
+
+    tags = catalogs["tags"]
+    if not isinstance(tags, list):
+        errors.append("tags.json: 顶层必须是列表")
+    else:
+        for tag_item in tags:
+            if tag_item.get("tag") not in ("knowledge", "skills"):
+                errors.append(f"tags.json: 未知的 tag {tag_item.get('tag')!r}")
+            for college in tag_item.get("学院列表", []):
+                if not isinstance(college.get("专业列表"), dict):
+                    errors.append(f"tags.json: {college.get('学院名称')} 的 专业列表 必须是对象")
+    return errors
+
+
+def _source_info(path, data=None):
+    stat = os.stat(path)
+    if data is None:
+        with open(path, "rb") as f:
+            data = f.read()
+    return {
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "signature": (stat.st_mtime_ns, stat.st_size),
+    }
+
+
+def compile_snapshot(path=SNAPSHOT_PATH):
+    """
+    Validate the catalog databases and write a binary snapshot of the
+    parsed documents and the compiled CatalogIndex.
+
+    Returns:
+        dict: The source hashes recorded in the snapshot.
+
+    Raises:
+        ValueError: If a catalog file is invalid.
+    """
+    catalogs, sources = {}, {}
+    for kind, filename in CATALOG_FILES.items():
+        source_path = os.path.join(DB_DIR, filename)
+        with open(source_path, "rb") as f:
+            raw = f.read()
+        try:
+            catalogs[kind] = json.loads(raw.decode("utf-8"))
+        except json.JSONDecodeError:
+            raise ValueError(f"Error decoding {filename} file.")
+        sources[kind] = _source_info(source_path, raw)
+
+    errors = validate_catalogs(catalogs)
+    if errors:
+        raise ValueError("Invalid catalog:\n" + "\n".join(errors))
+
+    catalogs = {kind: freeze(data) for kind, data in catalogs.items()}
+    snapshot = {
+        "format": SNAPSHOT_FORMAT,
+        "sources": sources,
+        "catalogs": catalogs,
+        "index": CatalogIndex(None, catalogs),
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return sources
+
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    """
+    Load the snapshot if it matches the current catalog files.
+
+    A source whose (mtime, size) is unchanged is trusted as-is; otherwise its
+    content hash is compared. On a match the parsed documents are primed into
+    the catalog cache, so nothing is re-parsed.
+
+    Returns:
+        CatalogIndex or None: None if there is no usable snapshot.
+    """
+    # 快照只由本项目的编译步骤生成并存放在 databases 目录下
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("format") != SNAPSHOT_FORMAT:
+        return None
+
+    signatures = {}
+    for kind, filename in CATALOG_FILES.items():
+        source_path = os.path.join(DB_DIR, filename)
+        recorded = snapshot["sources"].get(kind)
+        try:
+            stat = os.stat(source_path)
+        except OSError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if recorded is None:
+            return None
+        if tuple(recorded["signature"]) != signature and _source_info(source_path)["sha256"] != recorded["sha256"]:
+            return None
+        signatures[kind] = signature
+
+    cache = get_catalog_cache()
+    for kind, filename in CATALOG_FILES.items():
+        cache.prime(os.path.join(DB_DIR, filename), signatures[kind], snapshot["catalogs"][kind])
+    index = snapshot["index"]
+    index.version = tuple(signatures[kind] for kind in CATALOG_FILES)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate the catalog databases and compile a startup snapshot.")
+    parser.add_argument("--check", action="store_true", help="only validate, do not write the snapshot")
+    args = parser.parse_args()
+
+    if args.check:
+        catalogs = {}
+        for kind, filename in CATALOG_FILES.items():
+            with open(os.path.join(DB_DIR, filename), "r", encoding="utf-8") as f:
+                catalogs[kind] = json.load(f)
+        problems = validate_catalogs(catalogs)
+        print("\n".join(problems) if problems else "catalog OK")
+    else:
+        recorded = compile_snapshot()
+        print(f"snapshot written to {SNAPSHOT_PATH}")
+        for kind, info in recorded.items():
+            print(f"  {CATALOG_FILES[kind]}: {info['sha256'][:12]}")
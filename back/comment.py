@@ -1,9 +1,9 @@
-import json
-import os
+from event_log import get_event_log
+from user_store import get_user_store
 
 def record_comment(user_id, comment):
     """
-    Record a comment for a user in the users.json database.
+    Record a comment for a user as a review event in the event log.
 
     Args:
         user_id (str): The ID of the user to record the comment for.
@@ -12,45 +12,15 @@ def record_comment(user_id, comment):
     Returns:
         bool: True if the comment was successfully recorded, False otherwise.
     """
-    base_dir = os.path.dirname(__file__)
-    users_path = os.path.join(base_dir, '../databases/users.json')
-
-    try:
-        # Load the users database
-        with open(users_path, 'r', encoding='utf-8') as f:
-            users = json.load(f)
-    except FileNotFoundError:
-        raise FileNotFoundError(f"users.json file not found at {users_path}.")
-    except json.JSONDecodeError:
-        raise ValueError("Error decoding users.json file.")
-
-    # Find the user by user_id
-    if isinstance(users, dict):
-        user_info = users.get(user_id)
-    else:
-        user_info = next((user for user in users if user.get("id") == user_id), None)
-
-    if not user_info:
+    if get_user_store().get(user_id) is None:
         raise ValueError(f"User with ID {user_id} not found in users.json.")
 
-    # Update the path_review content field
-    if "path_review" not in user_info:
-        user_info["path_review"] = {
-            "is_public": False,
-            "content": comment,
-            "like_count": 0,
-            "current_rank": 0
-        }
-    else:
-        user_info["path_review"]["content"] = comment
-
-    # Save the updated users database back to file
+    # Append a small review record; it is merged into path_review on compaction
     try:
-        with open(users_path, 'w', encoding='utf-8') as f:
-            json.dump(users, f, ensure_ascii=False, indent=2)
+        get_event_log().append({"op": "review", "user_id": user_id, "content": comment})
         return True
     except IOError as e:
-        raise IOError(f"Error writing to users.json: {e}")
+        raise IOError(f"Error writing to event log: {e}")
 
 def add_like(target_user_id):
     """
@@ -62,40 +32,15 @@ def add_like(target_user_id):
     Returns:
         bool: True if the like was successfully added, False otherwise.
     """
-    base_dir = os.path.dirname(__file__)
-    users_path = os.path.join(base_dir, '../databases/users.json')
-
-    try:
-        # Load the users database
-        with open(users_path, 'r', encoding='utf-8') as f:
-            users = json.load(f)
-    except FileNotFoundError:
-        raise FileNotFoundError(f"users.json file not found at {users_path}.")
-    except json.JSONDecodeError:
-        raise ValueError("Error decoding users.json file.")
-
-    if target_user_id not in users:
+    if get_user_store().get(target_user_id) is None:
         return False
 
-    # Ensure path_review structure is complete
-    if "path_review" not in users[target_user_id]:
-        users[target_user_id]["path_review"] = {
-            "is_public": False,
-            "content": "",
-            "like_count": 0,
-            "current_rank": 0
-        }
-
-    # Increment like_count
-    users[target_user_id]["path_review"]["like_count"] += 1
-
-    # Save the updated users database back to file
+    # Append a like record instead of rewriting the user record
     try:
-        with open(users_path, 'w', encoding='utf-8') as f:
-            json.dump(users, f, ensure_ascii=False, indent=2)
+        get_event_log().append({"op": "like", "user_id": target_user_id})
         return True
     except IOError as e:
-        raise IOError(f"Error writing to users.json: {e}")
+        raise IOError(f"Error writing to event log: {e}")
 
 
 # if __name__ == "__main__":
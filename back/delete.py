@@ -1,30 +1,19 @@
-import json
-import os
-
-
-DB_DIR = os.path.join(os.path.dirname(__file__), "..", "databases")
+from event_log import get_event_log
+from user_store import get_user_store
 
 
 def delete_user(user_id):
-    db_path = os.path.join(DB_DIR, "users.json")
-    if not os.path.exists(db_path):
-        return False
-
-    with open(db_path, "r", encoding="utf-8") as f:
-        try:
-            users = json.load(f)
-        except Exception:
+    try:
+        if not get_user_store().delete(user_id):
             return False
-
-    if user_id not in users:
+        # 尚未合并的点赞/评价事件随用户一起作废
+        event_log = get_event_log()
+        if event_log.pending(user_id):
+            event_log.append({"op": "delete", "user_id": user_id})
+        return True
+    except Exception:
         return False
 
-    users.pop(user_id, None)
-    with open(db_path, "w", encoding="utf-8") as f:
-        json.dump(users, f, ensure_ascii=False, indent=2)
-
-    return True
-
 # if __name__ == "__main__":
 #     test_user_id = "user_xxxxx"
 #     if delete_user(test_user_id):
@@ -0,0 +1,175 @@
+import atexit
+import json
+import os
+import pickle
+import threading
+import zlib
+
+from user_store import add_change_listener, get_user_store
+
+# 累计多少次增量修改后写回磁盘（进程退出时也会写回）
+SAVE_EVERY = int(os.environ.get("DERIVED_INDEX_SAVE_EVERY", "50"))
+
+
+def record_digest(*values):
+    """Fingerprint (crc32 of the canonical JSON) of the record fields an index depends on."""
+    return zlib.crc32(json.dumps(values, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+
+
+class DerivedIndex:
+    """
+    Base class of persistent indexes computed from user records.
+
+    Subclasses implement `digest`, `_add` and `_discard`. The index keeps a
+    per-user digest of the fields it depends on; it follows the user store
+    through change listeners while loaded, and `reconcile` re-derives only
+    the users whose digest differs (e.g. after writes by other processes).
+    """
+
+    # 持久化文件路径与格式版本（子类覆盖）；params() 变化时旧文件同样作废
+    PATH = None
+    FORMAT = 1
+
+    def __init__(self):
+        self.digests = {}
+        self._lock = threading.RLock()
+        self._unsaved = 0
+        self._store_signature = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state.pop("_store_signature", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+        self._store_signature = None
+
+    @classmethod
+    def params(cls):
+        """Settings baked into the saved index (a mismatch forces a rebuild)."""
+        return {}
+
+    def digest(self, record):
+        raise NotImplementedError
+
+    def _add(self, user_id, record):
+        raise NotImplementedError
+
+    def _discard(self, user_id):
+        raise NotImplementedError
+
+    def upsert(self, user_id, record):
+        with self._lock:
+            self.remove(user_id)
+            self._add(user_id, record)
+            self.digests[user_id] = self.digest(record)
+            self._unsaved += 1
+
+    def remove(self, user_id):
+        with self._lock:
+            if self.digests.pop(user_id, None) is not None:
+                self._discard(user_id)
+                self._unsaved += 1
+
+    def apply_changes(self, changes):
+        """User store change listener."""
+        if changes is None:
+            self.reconcile()
+        else:
+            with self._lock:
+                for user_id, record in changes.items():
+                    if record is None:
+                        self.remove(user_id)
+                    elif self.digests.get(user_id) != self.digest(record):
+                        # 与 reconcile 相同：索引依赖的字段没变（如只改了评价、点赞）时不重建
+                        self.upsert(user_id, record)
+                # 本进程的写入已经应用，不必因此再全量核对
+                self._store_signature = get_user_store().signature()
+        if self._unsaved >= SAVE_EVERY:
+            self.save()
+
+    def revalidate(self, store=None):
+        """
+        Reconcile if the store changed since the index last looked at it
+        (e.g. a CLI in another process wrote users); costs one stat() per
+        store file otherwise. Returns the number of changed users.
+        """
+        store = store or get_user_store()
+        signature = store.signature()
+        if signature is None or signature == self._store_signature:
+            return 0
+        return self.reconcile(store)
+
+    def before_reconcile(self):
+        """Hook: drop derived data that is invalid as a whole (e.g. after a catalog change)."""
+
+    def reconcile(self, store=None):
+        """Bring the index up to date with the store; returns the number of changed users."""
+        store = store or get_user_store()
+        self.before_reconcile()
+        changed, seen = 0, set()
+        with self._lock:
+            # 先取签名再扫描：扫描期间的写入会在下一次 revalidate 时发现
+            self._store_signature = store.signature()
+            for user_id, record in store.items():
+                seen.add(user_id)
+                if self.digests.get(user_id) != self.digest(record):
+                    self.upsert(user_id, record)
+                    changed += 1
+            for user_id in set(self.digests) - seen:
+                self.remove(user_id)
+                changed += 1
+        return changed
+
+    def save(self, path=None):
+        path = path or self.PATH
+        with self._lock:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"format": self.FORMAT, "params": self.params(), "index": self}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self._unsaved = 0
+
+    @classmethod
+    def load(cls, path=None):
+        """Return the saved index, or None if it is missing or was saved with other settings."""
+        # 索引文件只由本项目生成并存放在 databases 目录下
+        try:
+            with open(path or cls.PATH, "rb") as f:
+                saved = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+        if not isinstance(saved, dict) or saved.get("format") != cls.FORMAT or saved.get("params") != cls.params():
+            return None
+        return saved["index"] if isinstance(saved.get("index"), cls) else None
+
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_derived_index(cls):
+    """
+    Return the process-wide instance of `cls`: loaded (or built), reconciled,
+    listening to the store and revalidated against the store on every call.
+    """
+    index = _instances.get(cls)
+    if index is None:
+        with _instances_lock:
+            index = _instances.get(cls)
+            if index is None:
+                index = cls.load() or cls()
+                if index.reconcile():
+                    index.save()
+                add_change_listener(index.apply_changes)
+                atexit.register(lambda: index._unsaved and index.save())
+                _instances[cls] = index
+                return index
+    # 其他进程（如 transcript_import、scoring 的命令行）写入后重新核对
+    if index.revalidate():
+        index.save()
+    return index
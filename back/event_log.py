@@ -0,0 +1,325 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows：没有跨进程文件锁，只靠 inode 检查发现日志轮换
+    fcntl = None
+
+from user_store import get_user_store
+
+# 定义数据库目录
+DB_DIR = os.path.join(os.path.dirname(__file__), "..", "databases")
+EVENT_LOG_PATH = os.path.join(DB_DIR, "user_events.jsonl")
+
+# 每累计 FSYNC_BATCH 条事件或每隔 FSYNC_INTERVAL 秒 fsync 一次
+FSYNC_BATCH = int(os.environ.get("EVENT_LOG_FSYNC_BATCH", "64"))
+FSYNC_INTERVAL = float(os.environ.get("EVENT_LOG_FSYNC_INTERVAL", "0.2"))
+# 日志中待合并的事件数超过该阈值时，在后台线程中合并进用户存储
+COMPACT_THRESHOLD = int(os.environ.get("EVENT_LOG_COMPACT_THRESHOLD", "1000"))
+
+logger = logging.getLogger(__name__)
+
+
+def new_path_review(content=""):
+    """Return an empty path_review section."""
+    return {
+        "is_public": False,
+        "content": content,
+        "like_count": 0,
+        "current_rank": 0
+    }
+
+
+def apply_events(user_info, events):
+    """
+    Fold like/review events over a user record in place.
+
+    The ID of the last applied event is kept in path_review["last_event"];
+    events up to it are skipped, so folding the same events again (a merge
+    redone after a crash, or a reader overlapping a merge) counts them once.
+
+    Args:
+        user_info (dict): A user record in the users.json layout.
+        events (list): Events of this user, oldest first.
+
+    Returns:
+        dict: The same record, for chaining.
+    """
+    if not events:
+        return user_info
+    review = user_info.setdefault("path_review", new_path_review())
+    applied = review.get("last_event")
+    if applied is not None:
+        for position, event in enumerate(events):
+            if event.get("id") == applied:
+                events = events[position + 1:]
+                break
+    for event in events:
+        if event["op"] == "like":
+            review["like_count"] = review.get("like_count", 0) + event.get("count", 1)
+        elif event["op"] == "review":
+            review["content"] = event["content"]
+        elif event["op"] == "delete":
+            # 用户被删除：之前的点赞/评价作废，避免同一学号重新注册后继承旧事件
+            review.update(new_path_review())
+    if events and events[-1].get("id") is not None:
+        review["last_event"] = events[-1]["id"]
+    return user_info
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive advisory lock on `path`, shared by every process (a no-op without fcntl)."""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class EventLog:
+    """
+    Append-only JSONL log of small per-user events (likes, review edits).
+
+    Writers append one short line per event, so a like costs O(1) bytes
+    instead of a full users.json rewrite. Readers fold the not-yet-compacted
+    events over the store snapshot; `compact` merges them into the store in
+    one batched transaction and starts a fresh log.
+
+    Several processes (the app and the compact CLI) may share the log:
+    appends and the rotation take a file lock (`<log>.lock`), and a writer
+    whose open file was rotated away reopens the log before writing.
+    """
+
+    def __init__(self, path=EVENT_LOG_PATH):
+        self.path = os.path.abspath(path)
+        self.compacting_path = f"{self.path}.compacting"
+        self.lock_path = f"{self.path}.lock"
+        # 同一时刻只允许一个进程合并
+        self.compact_lock_path = f"{self.path}.compact.lock"
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._writer = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._sync_timer = None
+        self._compact_thread = None
+        # 读端状态：已读取到的偏移量及按用户分组的待合并事件
+        self._inode = None
+        self._offset = 0
+        self._pending = {}
+        self._pending_count = 0
+        # 正在合并、尚未确认写入存储的事件（合并期间读端仍需叠加）
+        self._in_flight = {}
+        if os.path.exists(self.compacting_path):
+            # 上次合并中断：重新合并遗留的日志
+            self._in_flight = self._read_events(self.compacting_path)
+
+    # --- 写端 ---
+    def append(self, event):
+        """
+        Append one event and return immediately.
+
+        Args:
+            event (dict): Must contain "op" ("like", "review" or "delete") and "user_id".
+        """
+        event = dict(event, id=uuid.uuid4().hex, ts=round(time.time(), 3))
+        line = (json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            with _file_lock(self.lock_path):
+                if self._writer is not None and self._rotated():
+                    # 其他进程已把日志改名合并：写入新的日志文件
+                    self._sync()
+                    self._writer.close()
+                    self._writer = None
+                if self._writer is None:
+                    self._writer = open(self.path, "ab")
+                self._writer.write(line)
+                self._writer.flush()
+            self._unsynced += 1
+            if self._unsynced >= FSYNC_BATCH or time.monotonic() - self._last_sync >= FSYNC_INTERVAL:
+                self._sync()
+            elif self._sync_timer is None:
+                self._sync_timer = threading.Timer(FSYNC_INTERVAL, self.sync)
+                self._sync_timer.daemon = True
+                self._sync_timer.start()
+            self._refresh()
+            if self._pending_count >= COMPACT_THRESHOLD:
+                self.compact_in_background()
+
+    def _rotated(self):
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self._writer.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def sync(self):
+        """Flush and fsync all appended events."""
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        if self._sync_timer is not None:
+            self._sync_timer.cancel()
+            self._sync_timer = None
+        if self._writer is not None and self._unsynced:
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    # --- 读端 ---
+    @staticmethod
+    def _read_events(path):
+        grouped = {}
+        with open(path, "rb") as f:
+            data = f.read()
+        # 忽略末尾尚未写完的半行
+        data = data[:data.rfind(b"\n") + 1]
+        for line in data.splitlines():
+            if line.strip():
+                event = json.loads(line)
+                grouped.setdefault(event["user_id"], []).append(event)
+        return grouped
+
+    def _refresh(self):
+        """Read events appended since the last call (incremental tail)."""
+        if self._in_flight and not os.path.exists(self.compacting_path):
+            # 合并已写入存储
+            self._in_flight = {}
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_ino != self._inode or stat.st_size < self._offset:
+            if self._pending and os.path.exists(self.compacting_path):
+                # 日志被（其他进程的）合并改名：已读到的事件合并完成前仍需叠加
+                self._in_flight = self._read_events(self.compacting_path)
+            self._inode, self._offset, self._pending, self._pending_count = None, 0, {}, 0
+        if stat is None:
+            return
+        self._inode = stat.st_ino
+        if stat.st_size == self._offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                event = json.loads(line)
+                self._pending.setdefault(event["user_id"], []).append(event)
+                self._pending_count += 1
+        self._offset += end
+
+    def pending(self, user_id):
+        """Return the events of `user_id` that are not yet in the store."""
+        with self._lock:
+            self._refresh()
+            return self._in_flight.get(user_id, []) + self._pending.get(user_id, [])
+
+    def fold(self, user_id, user_info):
+        """Apply the pending events of one user over its store record."""
+        if user_info is None:
+            return None
+        return apply_events(user_info, self.pending(user_id))
+
+    def fold_items(self, items):
+        """Lazily fold pending events over (user_id, record) pairs."""
+        for user_id, user_info in items:
+            yield user_id, self.fold(user_id, user_info)
+
+    def fold_all(self, users):
+        """Fold pending events over a users.json style dict in place."""
+        for user_id, user_info in users.items():
+            self.fold(user_id, user_info)
+        return users
+
+    # --- 合并 ---
+    def compact(self, store=None):
+        """
+        Merge all logged events into the user store and start a new log.
+
+        The log is rotated under the file lock, so appends (of any process)
+        only wait for a rename, and the merged events are read back from the
+        rotated file, including those appended by other processes. The store
+        update runs outside of the lock; if it is interrupted, the rotated
+        file is merged again on the next run and apply_events skips the
+        events that already reached the store.
+
+        Returns:
+            int: Number of merged events.
+        """
+        store = store or get_user_store()
+        # 同一时刻只允许一次合并（跨进程），避免两次合并交错删除对方的文件
+        with self._compact_lock, _file_lock(self.compact_lock_path):
+            with self._lock:
+                with _file_lock(self.lock_path):
+                    self._refresh()
+                    if not os.path.exists(self.compacting_path):
+                        if not self._pending:
+                            return 0
+                        self._sync()
+                        if self._writer is not None:
+                            self._writer.close()
+                            self._writer = None
+                        os.replace(self.path, self.compacting_path)
+                        self._inode, self._offset, self._pending, self._pending_count = None, 0, {}, 0
+                    in_flight = self._in_flight = self._read_events(self.compacting_path)
+
+            def merge(events):
+                return lambda user_info: apply_events(user_info, events)
+
+            store.update_many({user_id: merge(events) for user_id, events in in_flight.items()})
+            with self._lock:
+                self._in_flight = {}
+                os.remove(self.compacting_path)
+            return sum(len(events) for events in in_flight.values())
+
+    def compact_in_background(self):
+        """Start `compact` on a daemon thread unless one is already running."""
+        with self._lock:
+            if self._compact_thread is not None and self._compact_thread.is_alive():
+                return
+            self._compact_thread = threading.Thread(target=self._compact_quietly, daemon=True)
+            self._compact_thread.start()
+
+    def _compact_quietly(self):
+        try:
+            self.compact()
+        except Exception:
+            logger.exception("Event log compaction failed")
+
+
+_event_log = None
+_event_log_lock = threading.Lock()
+
+
+def get_event_log():
+    """Return the process-wide event log."""
+    global _event_log
+    if _event_log is None:
+        with _event_log_lock:
+            if _event_log is None:
+                _event_log = EventLog()
+    return _event_log
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge the like/review event log into the user store.")
+    parser.add_argument("action", choices=["compact"])
+    parser.parse_args()
+
+    merged = get_event_log().compact()
+    print(f"merged {merged} events")
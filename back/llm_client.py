@@ -0,0 +1,214 @@
+import http.client
+import json
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+DEFAULT_BASE_URL = "https://api.deepseek.com/v1"
+DEFAULT_MODEL = "deepseek-chat"
+# 每个主机最多保留的空闲长连接数
+POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", "4"))
+REQUEST_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "120"))
+# 复用的连接可能已被服务端关闭，这类错误会换一个新连接重试一次
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError, BrokenPipeError)
+
+
+class LLMHTTPError(ConnectionError):
+    """The API answered with a non-200 status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RequestTiming:
+    """Timing of one LLM request."""
+
+    __slots__ = ("stream", "reused", "connect", "first_byte", "total", "status", "started")
+
+    def __init__(self, stream, reused):
+        self.stream = stream
+        self.reused = reused
+        self.connect = 0.0
+        self.first_byte = None
+        self.total = None
+        self.status = None
+        self.started = time.monotonic()
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name != "started"}
+
+
+class ConnectionPool:
+    """Keep-alive http.client connections to one host, reused LIFO (the warmest first)."""
+
+    def __init__(self, base_url, size=POOL_SIZE, timeout=REQUEST_TIMEOUT):
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path.rstrip("/")
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Return (connection, reused)."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout), False
+
+    def release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class LLMClient:
+    """
+    DeepSeek (OpenAI-compatible) chat client over pooled keep-alive connections.
+
+    Chained calls (the two passes of recommend, match re-ranking) reuse a
+    warm connection instead of repeating the TCP and TLS handshakes. The
+    timing of the recent requests is kept in `timings`.
+    """
+
+    def __init__(self, base_url=None, pool_size=POOL_SIZE, timeout=REQUEST_TIMEOUT):
+        self.base_url = base_url or os.environ.get("DEEPSEEK_BASE_URL", DEFAULT_BASE_URL)
+        self.pool = ConnectionPool(self.base_url, size=pool_size, timeout=timeout)
+        self.timings = deque(maxlen=100)
+
+    def _open(self, prompt, api_key, model, stream, timeout=None):
+        """Send one chat completion request; returns (connection, response, timing)."""
+        if not api_key:
+            raise ValueError("DEEPSEEK_API_KEY is not set.")
+        body = json.dumps({
+            "model": model or os.environ.get("DEEPSEEK_MODEL", DEFAULT_MODEL),
+            "stream": stream,
+            "messages": [{"role": "user", "content": prompt}],
+        }).encode("utf-8")
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+            "Connection": "keep-alive",
+        }
+        for attempt in range(2):
+            conn, reused = self.pool.acquire()
+            timing = RequestTiming(stream, reused)
+            # 单次请求可以使用更短的超时（例如网关的截止时间）
+            conn.timeout = timeout or self.pool.timeout
+            try:
+                if conn.sock is not None:
+                    conn.sock.settimeout(conn.timeout)
+                else:
+                    conn.connect()
+                    timing.connect = time.monotonic() - timing.started
+                conn.request("POST", f"{self.pool.path}/chat/completions", body=body, headers=headers)
+                resp = conn.getresponse()
+            except _STALE_ERRORS as exc:
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise ConnectionError(f"Failed to connect to DeepSeek at {self.base_url}.") from exc
+            except OSError as exc:
+                conn.close()
+                raise ConnectionError(f"Failed to connect to DeepSeek at {self.base_url}.") from exc
+            timing.first_byte = time.monotonic() - timing.started
+            timing.status = resp.status
+            if resp.status != 200:
+                detail = resp.read()[:200].decode("utf-8", "replace")
+                self._finish(conn, resp, timing)
+                raise LLMHTTPError(resp.status, f"DeepSeek returned HTTP {resp.status}: {detail}")
+            return conn, resp, timing
+
+    def _finish(self, conn, resp, timing):
+        """Return the connection to the pool if the response was read to the end; record the timing."""
+        if resp.isclosed() and not resp.will_close:
+            self.pool.release(conn)
+        else:
+            conn.close()
+        timing.total = time.monotonic() - timing.started
+        self.timings.append(timing)
+
+    def complete(self, prompt, api_key, model=None, timeout=None):
+        """
+        Send a prompt and return the whole reply.
+
+        `timeout` overrides the socket timeout of this request only.
+
+        Raises:
+            ValueError: If no API key is given.
+            ConnectionError: If the request fails.
+        """
+        conn, resp, timing = self._open(prompt, api_key, model, stream=False, timeout=timeout)
+        try:
+            response_data = json.loads(resp.read().decode("utf-8"))
+        except (OSError, http.client.HTTPException) as exc:
+            raise ConnectionError(f"Failed to read the reply from {self.base_url}.") from exc
+        finally:
+            self._finish(conn, resp, timing)
+        choices = response_data.get("choices", [])
+        if choices:
+            return choices[0].get("message", {}).get("content", "")
+        return ""
+
+    def stream(self, prompt, api_key, model=None, timeout=None):
+        """
+        Send a prompt and yield the reply as it streams in (server-sent events).
+
+        The connection goes back to the pool only if the stream is read to
+        its end; a consumer that stops early closes it.
+        """
+        conn, resp, timing = self._open(prompt, api_key, model, stream=True, timeout=timeout)
+        try:
+            done = False
+            for raw_line in resp:
+                line = raw_line.decode("utf-8").strip()
+                if done or not line.startswith("data:"):
+                    continue
+                data_str = line[len("data:"):].strip()
+                if data_str == "[DONE]":
+                    # 继续读到响应结束，连接才能复用
+                    done = True
+                    continue
+                choices = json.loads(data_str).get("choices", [])
+                if not choices:
+                    continue
+                content = choices[0].get("delta", {}).get("content")
+                if content:
+                    yield content
+            # 按行迭代读到 Content-Length 末尾时响应不会自动标记为结束，read() 收尾后连接才能复用
+            resp.read()
+        except (OSError, http.client.HTTPException) as exc:
+            raise ConnectionError(f"Failed to read the reply from {self.base_url}.") from exc
+        finally:
+            self._finish(conn, resp, timing)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm_client():
+    """Return the process-wide LLMClient of the configured DEEPSEEK_BASE_URL."""
+    base_url = os.environ.get("DEEPSEEK_BASE_URL", DEFAULT_BASE_URL)
+    client = _clients.get(base_url)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(base_url)
+            if client is None:
+                client = _clients[base_url] = LLMClient(base_url)
+    return client
@@ -0,0 +1,279 @@
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_client import LLMHTTPError, get_llm_client
+
+# 同时进行的上游调用数；超出的请求按到达顺序排队
+MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "4"))
+# 排队上限：队列已满时立即拒绝（背压），不再无限堆积线程
+QUEUE_LIMIT = int(os.environ.get("LLM_QUEUE_LIMIT", "50"))
+MAX_RETRIES = int(os.environ.get("LLM_RETRIES", "2"))
+BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF", "0.5"))
+# 每次调用（含排队与重试）的截止时间，秒
+CALL_DEADLINE = float(os.environ.get("LLM_DEADLINE", "120"))
+# 连续失败多少次后熔断，以及熔断多久后放行一次试探请求
+BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.environ.get("LLM_BREAKER_RESET", "30"))
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class GatewayBusy(ConnectionError):
+    """The waiting queue is full."""
+
+
+class CircuitOpen(ConnectionError):
+    """Recent calls kept failing; the upstream is not called until the breaker resets."""
+
+
+class DeadlineExceeded(ConnectionError):
+    """The call did not finish before its deadline."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open (one trial call) -> closed."""
+
+    def __init__(self, failures=BREAKER_FAILURES, reset=BREAKER_RESET):
+        self.failures = failures
+        self.reset = reset
+        self.count = 0
+        self.opened_at = None
+        self.trial = False
+
+    def allow(self):
+        if self.opened_at is None:
+            return True
+        if self.trial or time.monotonic() - self.opened_at < self.reset:
+            return False
+        self.trial = True
+        return True
+
+    def success(self):
+        self.count = 0
+        self.opened_at = None
+        self.trial = False
+
+    def failure(self):
+        self.count += 1
+        if self.trial or self.count >= self.failures:
+            self.opened_at = time.monotonic()
+            self.trial = False
+
+
+class FairQueue:
+    """
+    First-come-first-served admission to at most `limit` concurrent calls.
+
+    Waiters are told their position (1 = next) whenever it changes. Only
+    used from the gateway's event loop thread.
+    """
+
+    def __init__(self, limit=MAX_CONCURRENCY, max_waiting=QUEUE_LIMIT):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.waiting = deque()
+
+    async def acquire(self, notify):
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            return
+        if len(self.waiting) >= self.max_waiting:
+            raise GatewayBusy("当前使用人数过多，请稍后再试。")
+        entry = (asyncio.get_running_loop().create_future(), notify)
+        self.waiting.append(entry)
+        notify(len(self.waiting))
+        try:
+            await entry[0]
+        except asyncio.CancelledError:
+            if entry[0].done() and not entry[0].cancelled():
+                # 名额已经转交给这个请求：归还
+                self.release()
+            else:
+                self.waiting.remove(entry)
+                self._notify_positions()
+            raise
+
+    def release(self):
+        """Hand the slot to the next waiter, or free it."""
+        while self.waiting:
+            future, _ = self.waiting.popleft()
+            if not future.done():
+                future.set_result(None)
+                self._notify_positions()
+                return
+        self.active -= 1
+
+    def _notify_positions(self):
+        for position, (_, notify) in enumerate(self.waiting, start=1):
+            notify(position)
+
+
+class _CallState:
+    __slots__ = ("delivered", "cancelled")
+
+    def __init__(self):
+        self.delivered = False
+        self.cancelled = threading.Event()
+
+
+def _retryable(exc):
+    return not isinstance(exc, LLMHTTPError) or exc.status in RETRY_STATUSES
+
+
+class LLMGateway:
+    """
+    Asyncio gateway in front of the DeepSeek-compatible API.
+
+    An event loop in a background thread admits calls through a FairQueue
+    (bounded concurrency, bounded waiting queue), retries failed attempts
+    with jittered exponential backoff, trips a CircuitBreaker after repeated
+    failures and enforces a per-call deadline. The HTTP requests themselves
+    run on the pooled keep-alive LLMClient in worker threads. `complete`
+    and `stream` are the synchronous adapters used by Streamlit code; the
+    `on_queue(position)` callback runs in the caller's thread.
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, queue_limit=QUEUE_LIMIT):
+        self.admission = FairQueue(max_concurrency, queue_limit)
+        self.breaker = CircuitBreaker()
+        # 超过截止时间的请求在线程中还会运行到套接字超时，预留一些余量
+        self._executor = ThreadPoolExecutor(max_workers=2 * max_concurrency, thread_name_prefix="llm")
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True).start()
+
+    def _blocking_call(self, prompt, api_key, stream, timeout, events, state):
+        client = get_llm_client()
+        if not stream:
+            events.put(("result", client.complete(prompt, api_key, timeout=timeout)))
+            return
+        chunks = client.stream(prompt, api_key, timeout=timeout)
+        try:
+            for chunk in chunks:
+                if state.cancelled.is_set():
+                    break
+                state.delivered = True
+                events.put(("chunk", chunk))
+        finally:
+            chunks.close()
+
+    async def _run(self, prompt, api_key, stream, deadline, events, state):
+        if not api_key:
+            raise ValueError("DEEPSEEK_API_KEY is not set.")
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + deadline
+        try:
+            await asyncio.wait_for(self.admission.acquire(lambda position: events.put(("queued", position))), deadline)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("排队等待超时，请稍后再试。")
+        try:
+            for attempt in range(MAX_RETRIES + 1):
+                if not self.breaker.allow():
+                    raise CircuitOpen("AI 服务暂时不可用，请稍后再试。")
+                # 半开状态下放行的试探请求：无论以何种方式结束都必须了结
+                trial, settled = self.breaker.trial, False
+                try:
+                    remaining = deadline_at - loop.time()
+                    if remaining <= 0:
+                        raise DeadlineExceeded("AI 服务响应超时，请稍后再试。")
+                    call = loop.run_in_executor(
+                        self._executor, self._blocking_call, prompt, api_key, stream, remaining, events, state,
+                    )
+                    try:
+                        await asyncio.wait_for(call, remaining)
+                    except asyncio.TimeoutError:
+                        self.breaker.failure()
+                        settled = True
+                        raise DeadlineExceeded("AI 服务响应超时，请稍后再试。")
+                    except ConnectionError as exc:
+                        # 4xx（如请求过长）说明上游正常，不计入熔断（试探请求除外，见 finally）
+                        if _retryable(exc):
+                            self.breaker.failure()
+                            settled = True
+                        # 已经输出部分内容的流式调用不能重试
+                        if state.delivered or not _retryable(exc) or attempt == MAX_RETRIES:
+                            raise
+                        delay = BACKOFF_BASE * (2 ** attempt) * random.uniform(0.5, 1.5)
+                        if loop.time() + delay >= deadline_at:
+                            raise
+                        await asyncio.sleep(delay)
+                    else:
+                        self.breaker.success()
+                        settled = True
+                        return
+                finally:
+                    # 试探请求以其他方式结束（4xx、其他异常、取消）：重新熔断，等待下一次试探
+                    if trial and not settled:
+                        self.breaker.failure()
+        finally:
+            state.cancelled.set()
+            self.admission.release()
+
+    def _events(self, prompt, api_key, stream, deadline, on_queue):
+        """Submit a call to the loop and yield its ("chunk" | "result", value) events in the caller's thread."""
+        events, state = queue.Queue(), _CallState()
+        future = asyncio.run_coroutine_threadsafe(
+            self._run(prompt, api_key, stream, deadline or CALL_DEADLINE, events, state), self._loop,
+        )
+
+        def finished(f):
+            if f.cancelled():
+                events.put(("error", DeadlineExceeded("LLM call cancelled.")))
+            elif f.exception() is not None:
+                events.put(("error", f.exception()))
+            else:
+                events.put(("done", None))
+
+        future.add_done_callback(finished)
+        try:
+            while True:
+                kind, value = events.get()
+                if kind == "queued":
+                    if on_queue:
+                        on_queue(value)
+                elif kind == "error":
+                    raise value
+                elif kind == "done":
+                    return
+                else:
+                    yield kind, value
+        finally:
+            state.cancelled.set()
+            future.cancel()
+
+    def complete(self, prompt, api_key, on_queue=None, deadline=None):
+        """
+        Blocking call returning the whole reply.
+
+        Raises:
+            ValueError: If no API key is given.
+            ConnectionError: On failure (GatewayBusy, CircuitOpen, DeadlineExceeded or HTTP errors).
+        """
+        result = ""
+        for _, value in self._events(prompt, api_key, False, deadline, on_queue):
+            result = value
+        return result
+
+    def stream(self, prompt, api_key, on_queue=None, deadline=None):
+        """Synchronous generator of reply chunks (e.g. for st.write_stream); same errors as `complete`."""
+        for _, chunk in self._events(prompt, api_key, True, deadline, on_queue):
+            yield chunk
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway():
+    """Return the process-wide LLMGateway."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
@@ -1,140 +1,234 @@
-import json
+import logging
 import os
-import re
 import streamlit as st
 
+from catalog_index import DB_DIR, get_catalog_index
+from derived_index import SAVE_EVERY, DerivedIndex, get_derived_index, record_digest
+from llm_gateway import get_llm_gateway
+from match_prompt import build_match_prompt
+from peer_match import current_semester, find_similar_users, parse_user_ids
+from user_store import get_user_store
+
 # DEEPSEEK_API_KEY = os.environ.get("DEEPSEEK_API_KEY", "")
 try:
     DEEPSEEK_API_KEY = st.secrets["DEEPSEEK_API_KEY"]
 except (FileNotFoundError, KeyError, AttributeError):
     DEEPSEEK_API_KEY = os.environ.get("DEEPSEEK_API_KEY", "")
     
-def stream_conversation_for_match(user_id):
+# 本地相似度初筛的候选数量（LLM 只在该候选集中重排）
+SHORTLIST_SIZE = int(os.environ.get("MATCH_SHORTLIST_SIZE", "10"))
+# 设置为 1 时调用 LLM 对本地候选重排；默认只使用本地匹配结果
+USE_LLM_RERANK = os.environ.get("MATCH_LLM_RERANK", "0") == "1"
+# 用户量很大时先从索引取候选，再按匹配规则精排：
+#   "ann" -> peer_ann 近似近邻索引，"minhash" -> minhash_index 学期前缀 LSH，留空则全量扫描
+CANDIDATE_INDEX = os.environ.get("MATCH_CANDIDATE_INDEX", "").lower()
+INDEX_CANDIDATES = int(os.environ.get("MATCH_INDEX_CANDIDATES", "200"))
+# 匹配结果缓存（跨会话、跨重启保留）；设置为 0 时每次都重新匹配
+USE_MATCH_CACHE = os.environ.get("MATCH_CACHE", "1") == "1"
+MATCH_CACHE_PATH = os.path.join(DB_DIR, "match_cache.pkl")
+
+logger = logging.getLogger(__name__)
+
+
+def llm_response(prompt, on_queue=None):
+    """
+    Get response from DeepSeek's OpenAI-compatible API through the shared gateway
+    (concurrency limit, retries, circuit breaker, deadline; see llm_gateway).
+    Set DEEPSEEK_API_KEY and optionally DEEPSEEK_MODEL/DEEPSEEK_BASE_URL.
+    """
+    api_key = os.environ.get("DEEPSEEK_API_KEY", DEEPSEEK_API_KEY)
+    return get_llm_gateway().complete(prompt, api_key, on_queue=on_queue)
+
+
+class MatchCache(DerivedIndex):
+    """
+    Persistent cache of match results.
+
+    A result is keyed by the fingerprint of the target's profile and
+    academic_progress, the version of the candidate set, the catalog
+    version and the match settings. Candidates of a target in semester s
+    are the users in semesters >= s, so every semester has a version: the
+    sum of its users' fingerprints, updated by the store listeners whenever
+    a user is registered, updated or deleted. Only targets that could see
+    that user miss, and equal store contents give equal keys in every
+    process, so results saved by match_batch are valid for the dashboard.
+    """
+
+    PATH = MATCH_CACHE_PATH
+    FORMAT = 2
+
+    def __init__(self):
+        super().__init__()
+        self.semesters = {}
+        self.versions = {}
+        self.results = {}
+        self._seen_mtime = None
+
+    def digest(self, record):
+        profile = record.get("profile", {})
+        return record_digest(profile.get("school"), profile.get("major"), record.get("academic_progress"))
+
+    def _add(self, user_id, record):
+        semester = current_semester(record)
+        token = record_digest(user_id, self.digest(record))
+        self.semesters[user_id] = (semester, token)
+        self.versions[semester] = (self.versions.get(semester, 0) + token) & 0xFFFFFFFFFFFFFFFF
+
+    def _discard(self, user_id):
+        semester, token = self.semesters.pop(user_id)
+        self.versions[semester] = (self.versions[semester] - token) & 0xFFFFFFFFFFFFFFFF
+        self.results.pop(user_id, None)
+
+    def key(self, user_id, settings, catalog_version=None):
+        """Cache key of `user_id`'s match, or None if the user is not in the store."""
+        with self._lock:
+            if user_id not in self.digests:
+                return None
+            baseline = self.semesters[user_id][0]
+            candidates = tuple(sorted((s, v) for s, v in self.versions.items() if s >= baseline))
+            catalog_version = catalog_version or get_catalog_index().version
+            return self.digests[user_id], candidates, catalog_version, settings
+
+    def get(self, user_id, key):
+        if key is None:
+            return None
+        entry = self.results.get(user_id)
+        if (entry is None or entry[0] != key) and self._merge_saved():
+            entry = self.results.get(user_id)
+        return list(entry[1]) if entry and entry[0] == key else None
+
+    def put(self, user_id, key, result):
+        with self._lock:
+            self.results[user_id] = (key, tuple(result))
+            self._unsaved += 1
+        if self._unsaved >= SAVE_EVERY:
+            self.save()
+
+    def put_many(self, results):
+        """Store {user_id: (key, result)} without saving; the batch job saves at its checkpoints."""
+        with self._lock:
+            for user_id, (key, result) in results.items():
+                self.results[user_id] = (key, tuple(result))
+            self._unsaved += len(results)
+
+    def save(self, path=None):
+        super().save(path)
+        if path is None:
+            self._seen_mtime = os.stat(self.PATH).st_mtime_ns
+
+    def _merge_saved(self):
+        """Adopt the results another process (e.g. match_batch) saved since the last look."""
+        try:
+            mtime = os.stat(self.PATH).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._seen_mtime:
+            return False
+        self._seen_mtime = mtime
+        saved = type(self).load()
+        if saved is None:
+            return False
+        catalog_version = get_catalog_index().version
+        with self._lock:
+            for user_id, entry in saved.results.items():
+                # 只采用对当前数据仍然有效的结果，不覆盖本进程更新的结果
+                if entry != self.results.get(user_id) and entry[0] == self.key(user_id, entry[0][3], catalog_version):
+                    self.results[user_id] = entry
+        return True
+
+
+def get_match_cache():
+    """Return the process-wide MatchCache, revalidated against the user store (see get_derived_index)."""
+    return get_derived_index(MatchCache)
+
+
+def _settings(use_llm):
+    return (bool(use_llm), CANDIDATE_INDEX, SHORTLIST_SIZE if use_llm else None)
+
+
+def cached_match(user_id, use_llm=None):
+    """Return the cached, still valid match of `user_id` (None if it must be recomputed)."""
+    if not USE_MATCH_CACHE:
+        return None
+    use_llm = USE_LLM_RERANK if use_llm is None else use_llm
+    cache = get_match_cache()
+    return cache.get(user_id, cache.key(user_id, _settings(use_llm)))
+
+
+def stream_conversation_for_match(user_id, use_llm=None):
     """
     Function to handle learning path matching for a user.
 
+    Peers are ranked locally by peer_match (the rules of match_en.txt). If
+    LLM re-ranking is enabled, only the local shortlist is sent to the LLM
+    (as built by match_prompt, within its token budget), which may reorder
+    it; any LLM failure falls back to the local ranking. Results are served
+    from MatchCache while neither the target nor a possible candidate changed.
+
     Args:
         user_id (str): The ID of the user to perform matching for.
+        use_llm (bool): Re-rank the shortlist with the LLM. Defaults to the
+            MATCH_LLM_RERANK environment variable.
 
     Returns:
         list: A list of 3 most similar user IDs (format: "user_学工号").
     """
-    base_dir = os.path.dirname(__file__)
-
-    def load_json(relative_path, file_label):
-        file_path = os.path.join(base_dir, relative_path)
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            raise FileNotFoundError(f"{file_label} file not found.")
-        except json.JSONDecodeError:
-            raise ValueError(f"Error decoding {file_label} file.")
-
-    # Step 1: Load user database from users.json
-    users = load_json('../databases/users.json', 'users.json')
-
-    # Step 2: Find the target user by user_id
-    if isinstance(users, dict):
-        target_user_info = users.get(user_id)
-    else:
-        target_user_info = next((user for user in users if user.get("id") == user_id), None)
-
-    if not target_user_info:
-        raise ValueError(f"User with ID {user_id} not found in users.json.")
-
-    # Step 3: Load the prompt template from match_en.txt
-    prompt_path = os.path.join(base_dir, '../prompts/match_en.txt')
+    use_llm = USE_LLM_RERANK if use_llm is None else use_llm
+    if not USE_MATCH_CACHE:
+        return _match(user_id, use_llm)[0]
+
+    cache = get_match_cache()
+    key = cache.key(user_id, _settings(use_llm))
+    result = cache.get(user_id, key)
+    if result is None:
+        result, complete = _match(user_id, use_llm)
+        # LLM 重排失败时的本地回退结果不缓存，下次仍尝试重排
+        if complete and key is not None:
+            cache.put(user_id, key, result)
+    return result
+
+
+def _match(user_id, use_llm):
+    """Compute the match; returns (user IDs, False if LLM re-ranking was requested but skipped)."""
+    # Step 1: Rank candidates locally (raises ValueError if the user does not exist)
+    k = max(SHORTLIST_SIZE, 3) if use_llm else 3
+    users, shortlist = None, None
+    if CANDIDATE_INDEX in ("ann", "minhash"):
+        if CANDIDATE_INDEX == "ann":
+            from peer_ann import query_peers as query_index
+        else:
+            from minhash_index import query_similar_prefix as query_index
+        store = get_user_store()
+        pool = [user_id] + [uid for uid, _ in query_index(user_id, k=INDEX_CANDIDATES)]
+        users = [(uid, record) for uid, record in ((uid, store.get(uid)) for uid in pool) if record]
+        shortlist = find_similar_users(user_id, k=k, users=users)
+        if len(shortlist) < k:
+            # 索引召回不足（如 MinHash 没有碰撞的分桶）：退回全量扫描，保证与不用索引时一样能找到同伴
+            users, shortlist = None, None
+    if shortlist is None:
+        shortlist = find_similar_users(user_id, k=k, users=users)
+    local_ids = [uid for uid, _, _ in shortlist]
+    if not use_llm or len(local_ids) <= 1:
+        return local_ids[:3], True
+
+    # Step 2: Build a compact prompt from the shortlist (same major, pre-target-semester slices, token budget)
+    prompt = build_match_prompt(user_id, candidate_ids=local_ids, users=users)
+    logger.debug("Match prompt for %s: %s", user_id, prompt.summary())
+    if len(prompt.candidate_ids) <= 1:
+        return local_ids[:3], True
+
+    # Step 3: Re-rank with the LLM; keep only shortlisted IDs and fill up from the local order
     try:
-        with open(prompt_path, 'r', encoding='utf-8') as f:
-            prompt_template = f.read()
-    except FileNotFoundError:
-        raise FileNotFoundError("match_en.txt file not found.")
-
-    # Step 4: Build the base prompt with target user and all users data
-    base_prompt = (
-        f"{prompt_template}\n\n"
-        f"Target User Profile:\n{json.dumps(target_user_info, ensure_ascii=False)}\n\n"
-        f"All Users Database:\n{json.dumps(users, ensure_ascii=False)}"
-    )
-
-    # Step 5: Define LLM response function
-    def llm_response(prompt):
-        """
-        Get response from DeepSeek's OpenAI-compatible API.
-        Set DEEPSEEK_API_KEY and optionally DEEPSEEK_MODEL/DEEPSEEK_BASE_URL.
-        """
-        import urllib.request
-
-        api_key = os.environ.get("DEEPSEEK_API_KEY", DEEPSEEK_API_KEY)
-        if not api_key:
-            raise ValueError("DEEPSEEK_API_KEY is not set.")
-
-        base_url = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1")
-        model_name = os.environ.get("DEEPSEEK_MODEL", "deepseek-chat")
-
-        payload = json.dumps({
-            "model": model_name,
-            "stream": False,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ]
-        }).encode("utf-8")
-
-        req = urllib.request.Request(
-            f"{base_url}/chat/completions",
-            data=payload,
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}"
-            }
-        )
-
-        try:
-            with urllib.request.urlopen(req, timeout=120) as resp:
-                response_data = json.loads(resp.read().decode("utf-8"))
-                choices = response_data.get("choices", [])
-                if choices:
-                    return choices[0].get("message", {}).get("content", "")
-                return ""
-        except urllib.error.URLError as exc:
-            raise ConnectionError(f"Failed to connect to DeepSeek at {base_url}.") from exc
-
-    # Step 6: First request - initial matching
-    first_prompt = (
-        f"{base_prompt}\n\n"
-        "Please identify the 3 most similar users based on learning experiences.\n"
-        "Assistant:"
-    )
-
-    first_response = llm_response(first_prompt)
-
-    # Step 7: Second request - validate and refine the first response
-    second_prompt = (
-        f"{base_prompt}\n\n"
-        f"Initial Matching Result:\n{first_response}\n\n"
-        "Validation Request: 请验证上面的匹配结果是否正确合理。\n"
-        "Do not mention any secondary verification in your reply (e.g., \"经过二次验证\").\n"
-        "Please identify the 3 most similar users based on learning experiences.\n"
-        "Assistant:"
-    )
-
-    final_response = llm_response(second_prompt)
-
-    # Step 8: Extract user IDs from the final response
-    # Look for pattern "user_xxxxxx" (user_ followed by digits)
-    user_id_pattern = r'user_\d+'
-    matched_ids = re.findall(user_id_pattern, final_response)
-    
-    # Return first 3 unique matched IDs (excluding the target user)
-    unique_ids = []
-    for uid in matched_ids:
-        if uid not in unique_ids and uid != user_id:
-            unique_ids.append(uid)
-        if len(unique_ids) == 3:
+        reranked = parse_user_ids(llm_response(prompt.text), set(prompt.candidate_ids), exclude=user_id)
+    except (ConnectionError, ValueError) as exc:
+        logger.warning("Match re-ranking skipped for %s: %s", user_id, exc)
+        return local_ids[:3], False
+    for uid in local_ids:
+        if len(reranked) >= 3:
             break
-
-    return unique_ids
+        if uid not in reranked:
+            reranked.append(uid)
+    return reranked[:3], True
 
 
 if __name__ == "__main__":
@@ -0,0 +1,218 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import zlib
+
+from catalog_index import DB_DIR, get_catalog_index
+from match import CANDIDATE_INDEX, _match, _settings, get_match_cache
+from peer_match import current_semester, extract_experience, major_key, rank_experiences
+from user_model import compact_users
+from user_store import get_user_store
+
+CHECKPOINT_PATH = os.path.join(DB_DIR, "match_batch.ckpt.json")
+# 每个分片的用户数；分片是调度、计时和断点续跑的单位
+DEFAULT_SHARD_SIZE = 200
+# 每完成多少个分片保存一次匹配缓存与断点（缓存文件整体重写，不宜每个分片都保存）
+CHECKPOINT_EVERY = int(os.environ.get("MATCH_BATCH_CHECKPOINT_EVERY", "10"))
+
+
+class BatchReport:
+    """Counters and per-shard timings of one precomputation run."""
+
+    def __init__(self, users, shards):
+        self.users = users
+        self.shards = shards
+        self.computed = 0
+        self.skipped_shards = 0
+        self.errors = {}
+        self.shard_seconds = {}
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def users_per_second(self):
+        return self.computed / self.elapsed if self.elapsed > 0 else 0.0
+
+    def slowest(self, n=5):
+        """The n slowest shards as [(shard number, users, seconds)]."""
+        ranked = sorted(self.shard_seconds.items(), key=lambda item: -item[1][1])
+        return [(shard, users, round(seconds, 3)) for shard, (users, seconds) in ranked[:n]]
+
+    def as_dict(self):
+        return {
+            "users": self.users,
+            "computed": self.computed,
+            "shards": self.shards,
+            "resumed_shards": self.skipped_shards,
+            "errors": len(self.errors),
+            "seconds": round(self.elapsed, 3),
+            "users_per_second": round(self.users_per_second, 1),
+            "slowest_shards": self.slowest(),
+        }
+
+
+# 工作进程的状态：全部用户（CompactUser）与按 (学院专业, 基准学期) 缓存的经历（每个进程只构建一次）
+_worker_users = None
+_worker_experiences = {}
+
+
+def _init_worker():
+    global _worker_users
+    # 每个工作进程都持有整个用户库，用紧凑表示以减少内存
+    _worker_users = compact_users(get_user_store().items())
+    _worker_experiences.clear()
+
+
+def _experiences(major, baseline, catalog_index):
+    """[(user_id, semester, Experience)] of the major's users in semesters >= baseline, extracted once per process."""
+    key = (major, baseline)
+    if key not in _worker_experiences:
+        _worker_experiences[key] = [
+            (uid, user.semester(), extract_experience(user.to_dict(), baseline, catalog_index))
+            for uid, user in _worker_users.items()
+            if user.semester() >= baseline and user.major_key() == major
+        ]
+    return _worker_experiences[key]
+
+
+def _match_shard(task):
+    """Worker: match every user of one shard. Returns (shard, {user_id: ids}, {user_id: error}, seconds)."""
+    shard, user_ids, use_llm = task
+    started = time.monotonic()
+    catalog_index = get_catalog_index()
+    results, errors = {}, {}
+    for user_id in user_ids:
+        try:
+            target = _worker_users.get(user_id)
+            if use_llm or CANDIDATE_INDEX or target is None:
+                ids, complete = _match(user_id, use_llm)
+                if not complete:
+                    raise ConnectionError("LLM re-ranking skipped")
+            else:
+                # 与 find_similar_users 相同的排序，但候选经历在分片之间复用
+                target = target.to_dict()
+                baseline = current_semester(target)
+                ranked = rank_experiences(extract_experience(target, baseline, catalog_index), (
+                    (uid, semester - baseline, experience)
+                    for uid, semester, experience in _experiences(major_key(target), baseline, catalog_index)
+                    if uid != user_id
+                ), k=3)
+                ids = [uid for uid, _, _ in ranked]
+            results[user_id] = ids
+        except Exception as exc:
+            # 单个用户失败（数据异常、LLM 出错等）只记录下来，不影响分片内的其他用户
+            errors[user_id] = f"{type(exc).__name__}: {exc}"
+    return shard, results, errors, time.monotonic() - started
+
+
+def _plan_id(keys, shard_size):
+    """Fingerprint of a run: the users, their cache keys and the sharding."""
+    return zlib.crc32(json.dumps([sorted(keys.items()), shard_size], ensure_ascii=False).encode("utf-8"))
+
+
+def _load_checkpoint(plan_id):
+    try:
+        with open(CHECKPOINT_PATH, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return set()
+    return set(checkpoint.get("done", [])) if checkpoint.get("plan") == plan_id else set()
+
+
+def _save_checkpoint(plan_id, done):
+    tmp_path = f"{CHECKPOINT_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"plan": plan_id, "done": sorted(done), "updated": time.time()}, f)
+    os.replace(tmp_path, CHECKPOINT_PATH)
+
+
+def precompute_matches(workers=None, shard_size=DEFAULT_SHARD_SIZE, use_llm=False, resume=True,
+                       checkpoint_every=None, progress=None):
+    """
+    Compute the top-3 peers of every user and store them in the match cache.
+
+    Users are split into shards of `shard_size` and matched by a process
+    pool. Every `checkpoint_every` finished shards (and when the run ends or
+    is interrupted) the results are saved to the MatchCache file and the
+    shards recorded in a checkpoint, so an interrupted run resumes with the
+    remaining shards (as long as no user changed in between); a completed
+    run removes the checkpoint. Keys are taken before the shards are
+    dispatched, so a user changed during the run simply misses the cache.
+
+    Args:
+        workers (int): Pool size; the number of CPUs by default.
+        shard_size (int): Users per shard.
+        use_llm (bool): Also re-rank with the LLM (slow, one call per user).
+        resume (bool): Skip the shards recorded in the checkpoint.
+        checkpoint_every (int): Shards between saves; CHECKPOINT_EVERY by default.
+        progress (callable): Optional callback(BatchReport) after each shard.
+
+    Returns:
+        BatchReport: Counters, users/sec and per-shard timings.
+    """
+    cache = get_match_cache()
+    cache.reconcile()
+    user_ids = sorted(cache.digests)
+    shards = [user_ids[i:i + shard_size] for i in range(0, len(user_ids), shard_size)]
+    settings = _settings(use_llm)
+    catalog_version = get_catalog_index().version
+    keys = {user_id: cache.key(user_id, settings, catalog_version) for user_id in user_ids}
+    plan_id = _plan_id(keys, shard_size)
+    done = _load_checkpoint(plan_id) if resume else set()
+
+    report = BatchReport(len(user_ids), len(shards))
+    report.skipped_shards = len(done & set(range(len(shards))))
+    tasks = [(shard, ids, use_llm) for shard, ids in enumerate(shards) if shard not in done]
+    checkpoint_every = max(1, CHECKPOINT_EVERY if checkpoint_every is None else checkpoint_every)
+    unsaved = set()
+
+    def flush():
+        # 先保存缓存再记断点：断点里的分片其结果一定已经落盘
+        if unsaved:
+            cache.save()
+            done.update(unsaved)
+            unsaved.clear()
+            _save_checkpoint(plan_id, done)
+
+    try:
+        with multiprocessing.Pool(processes=workers, initializer=_init_worker) as pool:
+            for shard, results, errors, seconds in pool.imap_unordered(_match_shard, tasks):
+                cache.put_many({user_id: (keys[user_id], ids) for user_id, ids in results.items()})
+                unsaved.add(shard)
+                if len(unsaved) >= checkpoint_every:
+                    flush()
+                report.computed += len(results)
+                report.errors.update(errors)
+                report.shard_seconds[shard] = (len(shards[shard]), seconds)
+                if progress:
+                    progress(report)
+    finally:
+        flush()
+    if os.path.exists(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the peer matches of every user into the match cache.")
+    parser.add_argument("--workers", type=int, default=None, help="pool size (default: number of CPUs)")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+    parser.add_argument("--llm", action="store_true", help="also re-rank with the LLM")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint of an interrupted run")
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY, help="shards between cache saves")
+    args = parser.parse_args()
+
+    def show_progress(report):
+        finished = len(report.shard_seconds) + report.skipped_shards
+        print(f"  shard {finished}/{report.shards}, {report.computed} users, {report.users_per_second:.0f} users/s")
+
+    result = precompute_matches(
+        workers=args.workers, shard_size=args.shard_size, use_llm=args.llm,
+        resume=not args.restart, checkpoint_every=args.checkpoint_every, progress=show_progress,
+    )
+    print(json.dumps(result.as_dict(), ensure_ascii=False))
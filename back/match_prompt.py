@@ -0,0 +1,192 @@
+import argparse
+import json
+import math
+import os
+
+from catalog_index import get_catalog_index
+from peer_match import current_semester, find_similar_users, major_key
+from user_store import get_user_store
+
+MATCH_TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), "../prompts/match_en.txt")
+# 整个提示词的 token 预算（估算值，含模板）；超出预算的候选按相似度从低到高舍弃
+TOKEN_BUDGET = int(os.environ.get("MATCH_PROMPT_TOKEN_BUDGET", "6000"))
+# 只发送匹配规则用到的字段（academic_progress 的学期切片）
+PROGRESS_FIELDS = (
+    ("completed_courses", "semester", ("name", "category", "semester")),
+    ("research_done", "complete_semester", ("name", "complete_semester")),
+    ("competitions_done", "complete_semester", ("name", "award", "complete_semester")),
+)
+
+
+def estimate_tokens(text):
+    """
+    Rough token count of a prompt: one token per CJK character, four
+    characters per token for everything else (no tokenizer dependency).
+    """
+    wide = sum(1 for ch in text if ord(ch) > 0x2E7F)
+    return wide + math.ceil((len(text) - wide) / 4)
+
+
+def _compact(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _semester_before(value, before_semester):
+    try:
+        return int(value) < before_semester
+    except (TypeError, ValueError):
+        return False
+
+
+def slice_progress(record, before_semester, catalog_index=None):
+    """
+    The part of a user's academic_progress the matching rules look at.
+
+    Keeps only items completed strictly before `before_semester` and only
+    the fields listed in PROGRESS_FIELDS. Courses of the major's required
+    categories are dropped (only electives are compared); categories missing
+    from the record are filled in from the catalog.
+    """
+    catalog_index = catalog_index or get_catalog_index()
+    profile = record.get("profile", {})
+    major_catalog = catalog_index.major(profile.get("school"), profile.get("major"))
+    required_categories = major_catalog.required_categories if major_catalog else frozenset()
+    progress = record.get("academic_progress", {})
+    sliced = {"current_semester": current_semester(record)}
+    for field, semester_key, keys in PROGRESS_FIELDS:
+        items = []
+        for item in progress.get(field, []):
+            if not _semester_before(item.get(semester_key), before_semester):
+                continue
+            entry = {key: item[key] for key in keys if item.get(key) is not None}
+            if field == "completed_courses":
+                if "category" not in entry:
+                    entry["category"] = catalog_index.courses.get(item.get("name"), {}).get("category")
+                if not entry["category"] or entry["category"] in required_categories:
+                    continue
+            items.append(entry)
+        sliced[field] = items
+    return sliced
+
+
+def prefilter_candidates(target, users, exclude=None):
+    """Yield the (user_id, record) of the same school and major whose current semester is >= the target's."""
+    key = major_key(target)
+    baseline = current_semester(target)
+    for uid, record in users:
+        if uid == exclude or not record:
+            continue
+        if major_key(record) == key and current_semester(record) >= baseline:
+            yield uid, record
+
+
+class MatchPrompt:
+    """A built match prompt and its size report."""
+
+    def __init__(self, text, candidate_ids, omitted, budget):
+        self.text = text
+        self.candidate_ids = candidate_ids
+        self.omitted = omitted
+        self.budget = budget
+        self.tokens = estimate_tokens(text)
+
+    def report(self):
+        return {
+            "chars": len(self.text),
+            "tokens": self.tokens,
+            "candidates": len(self.candidate_ids),
+            "omitted": self.omitted,
+            "budget": self.budget,
+        }
+
+    def summary(self):
+        return (
+            f"{self.tokens} tokens ({len(self.text)} chars), "
+            f"{len(self.candidate_ids)} candidates, {self.omitted} omitted by the budget of {self.budget}"
+        )
+
+
+def load_template(path=MATCH_TEMPLATE_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        raise FileNotFoundError("match_en.txt file not found.")
+
+
+def build_match_prompt(user_id, candidate_ids=None, users=None, budget=None, template=None):
+    """
+    Build the LLM matching prompt for `user_id` within a token budget.
+
+    Candidates are restricted to the target's school and major with a
+    current semester >= the target's, and every user is reduced to the
+    pre-target-semester slice of academic_progress. Candidates are added
+    best first while the estimated size of the whole prompt stays within
+    `budget` (at least one candidate is always kept).
+
+    Args:
+        user_id (str): The target user ID.
+        candidate_ids (list): Candidates in preference order (e.g. the local
+            shortlist). Defaults to all pre-filtered users ranked by peer_match.
+        users: Optional iterable of (user_id, record); the user store by default.
+        budget (int): Token budget of the whole prompt; TOKEN_BUDGET by default.
+        template (str): Prompt template; prompts/match_en.txt by default.
+
+    Returns:
+        MatchPrompt: The prompt text, the candidates it contains and its size.
+
+    Raises:
+        ValueError: If the target user does not exist.
+    """
+    budget = TOKEN_BUDGET if budget is None else budget
+    store = get_user_store()
+    if users is None:
+        target = store.get(user_id)
+        pool = store.items() if candidate_ids is None else ((uid, store.get(uid)) for uid in candidate_ids)
+    else:
+        users = dict(users.items() if isinstance(users, dict) else users)
+        target = users.get(user_id)
+        pool = users.items() if candidate_ids is None else ((uid, users.get(uid)) for uid in candidate_ids)
+    if not target:
+        raise ValueError(f"User with ID {user_id} not found in users.json.")
+
+    eligible = dict(prefilter_candidates(target, pool, exclude=user_id))
+    if candidate_ids is None:
+        ranked = find_similar_users(user_id, k=len(eligible), users=[(user_id, target)] + list(eligible.items()))
+        candidate_ids = [uid for uid, _, _ in ranked]
+    ordered = [uid for uid in dict.fromkeys(candidate_ids) if uid in eligible]
+
+    catalog_index = get_catalog_index()
+    baseline = current_semester(target)
+    head = (
+        f"{load_template() if template is None else template}\n\n"
+        f"Target User ({user_id}) academic_progress before semester {baseline}:\n"
+        f"{_compact(slice_progress(target, baseline, catalog_index))}\n\n"
+        "Candidate Users (same major, pre-filtered by the semester rules, one per line):\n"
+    )
+    tail = "\n\nPlease identify the 3 most similar users among the candidates above.\nAssistant:"
+    lines, used = [], estimate_tokens(head) + estimate_tokens(tail)
+    for uid in ordered:
+        line = _compact({"id": uid, "academic_progress": slice_progress(eligible[uid], baseline, catalog_index)})
+        cost = estimate_tokens(line) + 1
+        if lines and used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+
+    text = head + "\n".join(lines) + tail
+    return MatchPrompt(text, ordered[:len(lines)], len(ordered) - len(lines), budget)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the LLM match prompt of a user and report its size.")
+    parser.add_argument("user_id")
+    parser.add_argument("--budget", type=int, default=TOKEN_BUDGET)
+    parser.add_argument("--show", action="store_true", help="print the prompt itself")
+    args = parser.parse_args()
+
+    prompt = build_match_prompt(args.user_id, budget=args.budget)
+    if args.show:
+        print(prompt.text)
+        print()
+    print(json.dumps(prompt.report(), ensure_ascii=False))
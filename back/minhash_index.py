@@ -0,0 +1,202 @@
+import argparse
+import hashlib
+import os
+import random
+
+from catalog_index import DB_DIR
+from derived_index import DerivedIndex, get_derived_index, record_digest
+from user_store import get_user_store
+
+MINHASH_INDEX_PATH = os.path.join(DB_DIR, "minhash.pkl")
+MINHASH_FORMAT = 1
+# 签名长度与 LSH 分段：BANDS 段 × (NUM_PERM / BANDS) 行，约在 Jaccard ≈ 0.5 处陡升
+NUM_PERM = int(os.environ.get("MINHASH_NUM_PERM", "64"))
+BANDS = int(os.environ.get("MINHASH_BANDS", "16"))
+MAX_SEMESTER = 8
+
+_PRIME = (1 << 61) - 1
+# 固定种子：签名在进程之间、重建之后保持一致
+_rng = random.Random(20240901)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def _token_hash(token):
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little") % _PRIME
+
+
+def _semester(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def experience_tokens(record):
+    """Return {semester: set of tokens} of completed courses, research and competitions."""
+    progress = record.get("academic_progress", {})
+    tokens = {}
+    for prefix, field, semester_key in (
+        ("course", "completed_courses", "semester"),
+        ("research", "research_done", "complete_semester"),
+        ("contest", "competitions_done", "complete_semester"),
+    ):
+        for item in progress.get(field, []):
+            semester = _semester(item.get(semester_key))
+            if semester is not None and item.get("name"):
+                tokens.setdefault(semester, set()).add(f"{prefix}:{item['name']}")
+    return tokens
+
+
+def prefix_signatures(record):
+    """
+    MinHash signatures of the experience set of semesters 1..k, for k = 1..MAX_SEMESTER.
+
+    Returns:
+        tuple: MAX_SEMESTER entries; entry k-1 is a tuple of NUM_PERM ints,
+        or None while the prefix is still empty.
+    """
+    per_semester = experience_tokens(record)
+    signatures, running = [], None
+    for semester in range(1, MAX_SEMESTER + 1):
+        tokens = list(per_semester.get(semester, ()))
+        if semester == 1:
+            # 第 1 学期之前（含异常的 0/负数学期）的记录并入第一个前缀
+            tokens += [t for s, items in per_semester.items() if s < 1 for t in items]
+        if tokens:
+            hashes = [_token_hash(t) for t in tokens]
+            current = tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+            running = current if running is None else tuple(map(min, running, current))
+        signatures.append(running)
+    return tuple(signatures)
+
+
+def estimate_jaccard(a, b):
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    if a is None or b is None:
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def _band_keys(signature):
+    rows = NUM_PERM // BANDS
+    return [(band, signature[band * rows:(band + 1) * rows]) for band in range(BANDS)]
+
+
+class MinHashIndex(DerivedIndex):
+    """
+    Per-user MinHash signatures of every semester prefix, with LSH banding.
+
+    `query` finds the students whose first k semesters look like a given
+    student's by looking up the bands of that prefix, instead of comparing
+    every pair; signatures are only recomputed when academic_progress changes.
+    """
+
+    PATH = MINHASH_INDEX_PATH
+    FORMAT = MINHASH_FORMAT
+
+    def __init__(self):
+        super().__init__()
+        self.signatures = {}
+        self.semesters = {}
+        # 每个前缀一组分段桶：(段号, 段内签名) -> {user_id}
+        self.buckets = [{} for _ in range(MAX_SEMESTER)]
+
+    @classmethod
+    def params(cls):
+        return {"num_perm": NUM_PERM, "bands": BANDS}
+
+    def digest(self, record):
+        return record_digest(record.get("academic_progress"))
+
+    def _add(self, user_id, record):
+        signatures = prefix_signatures(record)
+        self.signatures[user_id] = signatures
+        self.semesters[user_id] = _semester(record.get("academic_progress", {}).get("current_semester")) or 0
+        for buckets, signature in zip(self.buckets, signatures):
+            if signature is not None:
+                for key in _band_keys(signature):
+                    buckets.setdefault(key, set()).add(user_id)
+
+    def _discard(self, user_id):
+        self.semesters.pop(user_id, None)
+        for buckets, signature in zip(self.buckets, self.signatures.pop(user_id, ())):
+            if signature is None:
+                continue
+            for key in _band_keys(signature):
+                bucket = buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(user_id)
+                    if not bucket:
+                        del buckets[key]
+
+    def query(self, user_id, prefix=None, k=10):
+        """
+        Students whose first `prefix` semesters are similar to `user_id`'s.
+
+        Args:
+            user_id (str): The target user (must be indexed).
+            prefix (int): Semesters 1..prefix are compared. Defaults to the
+                semesters before the target's current semester (match.py rule).
+            k (int): Maximum number of results.
+
+        Returns:
+            list: [(user_id, estimated Jaccard)], best first. With the default
+            prefix, only users whose current semester is >= the target's.
+        """
+        with self._lock:
+            signatures = self.signatures.get(user_id)
+            if signatures is None:
+                return []
+            min_semester = 0
+            if prefix is None:
+                min_semester = self.semesters.get(user_id, 0)
+                prefix = min(min_semester - 1, MAX_SEMESTER)
+            if prefix < 1 or signatures[prefix - 1] is None:
+                return []
+            target = signatures[prefix - 1]
+            buckets = self.buckets[prefix - 1]
+            candidates = set()
+            for key in _band_keys(target):
+                candidates |= buckets.get(key, set())
+            candidates.discard(user_id)
+            ranked = [
+                (uid, estimate_jaccard(target, self.signatures[uid][prefix - 1]))
+                for uid in candidates if self.semesters.get(uid, 0) >= min_semester
+            ]
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return ranked[:k]
+
+
+def get_minhash_index():
+    """Return the process-wide MinHashIndex, loading (or building) and reconciling it on first use."""
+    return get_derived_index(MinHashIndex)
+
+
+def query_similar_prefix(user_id, prefix=None, k=10):
+    """Shortcut for get_minhash_index().query(); raises ValueError for an unknown user."""
+    index = get_minhash_index()
+    if user_id not in index.signatures:
+        raise ValueError(f"User with ID {user_id} not found in users.json.")
+    return index.query(user_id, prefix=prefix, k=k)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the per-semester MinHash index.")
+    sub = parser.add_subparsers(dest="action", required=True)
+    sub.add_parser("build", help="rebuild the index from the user store")
+    query_parser = sub.add_parser("query", help="print students whose first semesters look alike")
+    query_parser.add_argument("user_id")
+    query_parser.add_argument("--prefix", type=int, default=None)
+    query_parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.action == "build":
+        # 通过模块名创建索引：以脚本运行时类属于 __main__，保存的文件无法被其他进程加载
+        from minhash_index import MinHashIndex as IndexClass
+        index = IndexClass()
+        changed = index.reconcile(get_user_store())
+        index.save()
+        print(f"indexed {changed} users ({MINHASH_INDEX_PATH})")
+    else:
+        for uid, score in query_similar_prefix(args.user_id, prefix=args.prefix, k=args.k):
+            print(f"{uid}\t{score:.3f}")
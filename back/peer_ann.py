@@ -0,0 +1,284 @@
+import argparse
+import os
+import zlib
+
+import numpy as np
+
+from catalog_index import DB_DIR, get_catalog_index
+from derived_index import DerivedIndex, get_derived_index, record_digest
+from user_store import get_user_store
+
+ANN_INDEX_PATH = os.path.join(DB_DIR, "peer_ann.pkl")
+# 索引格式版本：结构变化时递增，旧文件会被忽略并重建
+ANN_FORMAT = 1
+# 随机投影 LSH 参数：哈希表个数与每个表的位数
+NUM_TABLES = int(os.environ.get("PEER_ANN_TABLES", "16"))
+NUM_BITS = int(os.environ.get("PEER_ANN_BITS", "8"))
+# 向量中 知识 / 能力 / 修读经历 三部分的权重
+BLOCK_WEIGHTS = (0.4, 0.3, 0.3)
+
+
+def _unit(values):
+    norm = np.linalg.norm(values)
+    return values / norm if norm > 0 else values
+
+
+def _current_semester(record):
+    try:
+        return int(record.get("academic_progress", {}).get("current_semester", 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+class MajorPartition:
+    """
+    Random-projection LSH over the users of one (school, major).
+
+    A user's vector is the concatenation of the unit-normalised knowledge
+    scores, skill scores and a one-hot of completed electives, research and
+    contests of the major. Each of NUM_TABLES tables hashes the vector to
+    the sign pattern of NUM_BITS random hyperplanes; similar vectors (by
+    cosine) tend to share a bucket in at least one table.
+    """
+
+    def __init__(self, major_catalog):
+        self.school = major_catalog.school
+        self.major = major_catalog.major
+        self.layout = self.layout_of(major_catalog)
+        knowledge_tags, skill_tags, items = self.layout
+        self.knowledge_cols = {tag: i for i, tag in enumerate(knowledge_tags)}
+        self.skill_cols = {tag: i for i, tag in enumerate(skill_tags)}
+        self.item_cols = {item: i for i, item in enumerate(items)}
+        self.dim = len(knowledge_tags) + len(skill_tags) + len(items)
+
+        # 超平面由专业名确定，重建索引后桶编号保持一致
+        rng = np.random.default_rng(zlib.crc32(f"{self.school}/{self.major}".encode("utf-8")))
+        self.planes = rng.standard_normal((NUM_TABLES, NUM_BITS, self.dim)).astype(np.float32)
+        self.bit_weights = (1 << np.arange(NUM_BITS)).astype(np.int64)
+
+        self.vectors = np.zeros((16, self.dim), dtype=np.float32)
+        self.semesters = np.zeros(16, dtype=np.int16)
+        self.user_ids = []
+        self.rows = {}
+        self.free_rows = []
+        self.tables = [{} for _ in range(NUM_TABLES)]
+        self.row_keys = {}
+
+    @staticmethod
+    def layout_of(major_catalog):
+        electives = tuple(
+            ("course", c["name"]) for c in major_catalog.courses
+            if c.get("category") not in major_catalog.required_categories
+        )
+        items = (
+            electives
+            + tuple(("research", name) for name in major_catalog.research_names)
+            + tuple(("contest", name) for name in major_catalog.contest_names)
+        )
+        return tuple(major_catalog.knowledge_tags), tuple(major_catalog.skill_tags), items
+
+    def vectorize(self, record):
+        knowledge = np.zeros(len(self.knowledge_cols), dtype=np.float32)
+        for tag, value in record.get("knowledge", {}).items():
+            if tag in self.knowledge_cols:
+                knowledge[self.knowledge_cols[tag]] = value
+        skills = np.zeros(len(self.skill_cols), dtype=np.float32)
+        for tag, value in record.get("skills", {}).items():
+            if tag in self.skill_cols:
+                skills[self.skill_cols[tag]] = value
+        items = np.zeros(len(self.item_cols), dtype=np.float32)
+        progress = record.get("academic_progress", {})
+        for kind, field in (("course", "completed_courses"), ("research", "research_done"), ("contest", "competitions_done")):
+            for item in progress.get(field, []):
+                col = self.item_cols.get((kind, item.get("name")))
+                if col is not None:
+                    items[col] = 1.0
+        blocks = (knowledge, skills, items)
+        return np.concatenate([w * _unit(b) for w, b in zip(BLOCK_WEIGHTS, blocks)])
+
+    def hash_keys(self, vector):
+        bits = (self.planes @ vector) > 0
+        return tuple((bits @ self.bit_weights).tolist())
+
+    def upsert(self, user_id, record):
+        self.remove(user_id)
+        if self.free_rows:
+            row = self.free_rows.pop()
+        else:
+            row = len(self.user_ids)
+            self.user_ids.append(None)
+            if row >= len(self.vectors):
+                self.vectors = np.resize(self.vectors, (len(self.vectors) * 2, self.dim))
+                self.semesters = np.resize(self.semesters, len(self.semesters) * 2)
+        vector = self.vectorize(record)
+        self.vectors[row] = vector
+        self.semesters[row] = _current_semester(record)
+        self.user_ids[row] = user_id
+        self.rows[user_id] = row
+        keys = self.hash_keys(vector)
+        self.row_keys[row] = keys
+        for table, key in zip(self.tables, keys):
+            table.setdefault(key, set()).add(row)
+
+    def remove(self, user_id):
+        row = self.rows.pop(user_id, None)
+        if row is None:
+            return
+        for table, key in zip(self.tables, self.row_keys.pop(row)):
+            bucket = table.get(key)
+            bucket.discard(row)
+            if not bucket:
+                del table[key]
+        self.user_ids[row] = None
+        self.vectors[row] = 0.0
+        self.free_rows.append(row)
+
+    def candidates(self, vector, want):
+        """Rows sharing a bucket with `vector`; probes neighbouring buckets (one flipped bit) if too few."""
+        keys = self.hash_keys(vector)
+        rows = set()
+        for table, key in zip(self.tables, keys):
+            rows |= table.get(key, set())
+        if len(rows) < want:
+            for table, key in zip(self.tables, keys):
+                for bit in range(NUM_BITS):
+                    rows |= table.get(key ^ (1 << bit), set())
+        return rows
+
+    def query(self, vector, min_semester, k, exclude=None):
+        rows = self.candidates(vector, want=4 * k)
+        rows = [r for r in rows if self.user_ids[r] not in (None, exclude) and self.semesters[r] >= min_semester]
+        if len(rows) < k:
+            # 桶内候选不足时退化为分区内的精确扫描
+            rows = [
+                r for r, uid in enumerate(self.user_ids)
+                if uid not in (None, exclude) and self.semesters[r] >= min_semester
+            ]
+        if not rows:
+            return []
+        rows = np.array(rows, dtype=np.intp)
+        matrix = self.vectors[rows]
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(vector) or 1.0)
+        scores = (matrix @ vector) / np.where(norms > 0, norms, 1.0)
+        order = np.lexsort((rows, -scores))[:k]
+        return [(self.user_ids[rows[i]], float(scores[i])) for i in order]
+
+
+class PeerIndex(DerivedIndex):
+    """
+    Persistent ANN index of all users, partitioned by (school, major).
+
+    Kept in sync through the user store's change listeners (register,
+    progress updates, deletes, imports); on load it is reconciled against
+    the store with per-user fingerprints, so writes made while no index
+    was loaded are picked up too.
+    """
+
+    PATH = ANN_INDEX_PATH
+    FORMAT = ANN_FORMAT
+
+    def __init__(self):
+        super().__init__()
+        self.partitions = {}
+        self.locations = {}
+
+    @classmethod
+    def params(cls):
+        return {"tables": NUM_TABLES, "bits": NUM_BITS}
+
+    def digest(self, record):
+        profile = record.get("profile", {})
+        return record_digest(
+            profile.get("school"), profile.get("major"),
+            record.get("academic_progress"), record.get("knowledge"), record.get("skills"),
+        )
+
+    def _partition(self, record):
+        profile = record.get("profile", {})
+        key = (profile.get("school"), profile.get("major"))
+        partition = self.partitions.get(key)
+        if partition is None:
+            major_catalog = get_catalog_index().major(*key)
+            if major_catalog is None:
+                return None
+            partition = self.partitions[key] = MajorPartition(major_catalog)
+        return partition
+
+    def _add(self, user_id, record):
+        partition = self._partition(record)
+        if partition is not None:
+            partition.upsert(user_id, record)
+            self.locations[user_id] = (partition.school, partition.major)
+
+    def _discard(self, user_id):
+        location = self.locations.pop(user_id, None)
+        if location in self.partitions:
+            self.partitions[location].remove(user_id)
+
+    def before_reconcile(self):
+        """Drop partitions whose catalog layout changed (their users are re-added by reconcile)."""
+        catalog_index = get_catalog_index()
+        with self._lock:
+            for key, partition in list(self.partitions.items()):
+                major_catalog = catalog_index.major(*key)
+                if major_catalog is None or MajorPartition.layout_of(major_catalog) != partition.layout:
+                    del self.partitions[key]
+                    for user_id in list(partition.rows):
+                        self.locations.pop(user_id, None)
+                        self.digests.pop(user_id, None)
+
+    def query(self, record, k=3, exclude=None):
+        """
+        Return up to k (user_id, cosine) peers of a user record, best first.
+
+        Only users of the same (school, major) whose current semester is >=
+        the record's are returned (the candidate rule of match.py).
+        """
+        with self._lock:
+            profile = record.get("profile", {})
+            partition = self.partitions.get((profile.get("school"), profile.get("major")))
+            if partition is None:
+                return []
+            return partition.query(partition.vectorize(record), _current_semester(record), k, exclude=exclude)
+
+
+def get_peer_index():
+    """Return the process-wide PeerIndex, loading (or building) and reconciling it on first use."""
+    return get_derived_index(PeerIndex)
+
+
+def query_peers(user_id, k=3):
+    """
+    Approximate top-k peers of a stored user.
+
+    Returns:
+        list: [(user_id, cosine similarity)], best first.
+
+    Raises:
+        ValueError: If the user does not exist.
+    """
+    record = get_user_store().get(user_id)
+    if not record:
+        raise ValueError(f"User with ID {user_id} not found in users.json.")
+    return get_peer_index().query(record, k=k, exclude=user_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the peer ANN index.")
+    sub = parser.add_subparsers(dest="action", required=True)
+    sub.add_parser("build", help="rebuild the index from the user store")
+    query_parser = sub.add_parser("query", help="print the approximate peers of a user")
+    query_parser.add_argument("user_id")
+    query_parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.action == "build":
+        # 通过模块名创建索引：以脚本运行时类属于 __main__，保存的文件无法被其他进程加载
+        from peer_ann import PeerIndex as IndexClass
+        index = IndexClass()
+        changed = index.reconcile()
+        index.save()
+        print(f"indexed {changed} users in {len(index.partitions)} partitions ({ANN_INDEX_PATH})")
+    else:
+        for uid, score in query_peers(args.user_id, k=args.k):
+            print(f"{uid}\t{score:.4f}")
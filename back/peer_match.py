@@ -0,0 +1,269 @@
+import math
+import re
+from collections import Counter
+
+from catalog_index import get_catalog_index
+from user_store import get_user_store
+
+# 三个维度在总相似度中的权重（与 prompts/match_en.txt 的匹配逻辑对应）
+DIMENSION_WEIGHTS = {"electives": 0.5, "research": 0.25, "competitions": 0.25}
+DEFAULT_TOP_K = 3
+# 奖项名称中无法在竞赛库中查到分值时，按关键字估计等级（0~1）
+AWARD_KEYWORD_LEVELS = (
+    (("特等奖", "金奖", "Outstanding", "Finalist"), 1.0),
+    (("一等奖", "银奖", "Meritorious"), 0.8),
+    (("二等奖", "铜奖", "Honorable"), 0.6),
+    (("三等奖",), 0.4),
+    (("优秀奖", "优胜奖", "通过", "晋级"), 0.3),
+)
+DEFAULT_AWARD_LEVEL = 0.2
+
+
+class Experience:
+    """A user's learning experience before a given semester, reduced to match features."""
+
+    __slots__ = (
+        "elective_categories", "elective_names", "research_names", "research_skills",
+        "contest_names", "award_levels",
+    )
+
+    def __init__(self):
+        self.elective_categories = Counter()
+        self.elective_names = set()
+        self.research_names = set()
+        self.research_skills = Counter()
+        self.contest_names = set()
+        self.award_levels = []
+
+    def is_empty(self):
+        return not (self.elective_names or self.research_names or self.contest_names)
+
+
+def award_level(award, contest_info=None):
+    """Return the level (0-1) of an award, using the contest's bonus table when it lists the award."""
+    bonus = (contest_info or {}).get("bonus_points_for_grad", {})
+    if award in bonus and bonus[award]:
+        return float(bonus[award]) / max(float(v) for v in bonus.values())
+    text = str(award or "")
+    for keywords, level in AWARD_KEYWORD_LEVELS:
+        if any(keyword in text for keyword in keywords):
+            return level
+    return DEFAULT_AWARD_LEVEL
+
+
+def extract_experience(user, before_semester, catalog_index=None):
+    """
+    Collect the experiences completed strictly before `before_semester`.
+
+    Args:
+        user (dict): A user record (users.json shape).
+        before_semester (int): The target user's current semester.
+        catalog_index (CatalogIndex): Used to classify courses and weigh awards.
+
+    Returns:
+        Experience: The match features.
+    """
+    catalog_index = catalog_index or get_catalog_index()
+    progress = user.get("academic_progress", {})
+    profile = user.get("profile", {})
+    major_catalog = catalog_index.major(profile.get("school"), profile.get("major"))
+    required_categories = major_catalog.required_categories if major_catalog else frozenset()
+
+    def before(value):
+        try:
+            return int(value) < before_semester
+        except (TypeError, ValueError):
+            return False
+
+    experience = Experience()
+    for course in progress.get("completed_courses", []):
+        if not before(course.get("semester")):
+            continue
+        category = course.get("category") or catalog_index.courses.get(course.get("name"), {}).get("category")
+        # 个性化选修：不属于本专业必修类别的课程
+        if category and category not in required_categories:
+            experience.elective_categories[category] += 1
+            experience.elective_names.add(course.get("name"))
+
+    for research in progress.get("research_done", []):
+        if not before(research.get("complete_semester")):
+            continue
+        experience.research_names.add(research.get("name"))
+        for skill, value in catalog_index.research.get(research.get("name"), {}).get("skills", {}).items():
+            experience.research_skills[skill] += float(value)
+
+    for contest in progress.get("competitions_done", []):
+        if not before(contest.get("complete_semester")):
+            continue
+        experience.contest_names.add(contest.get("name"))
+        experience.award_levels.append(award_level(contest.get("award"), catalog_index.contests.get(contest.get("name"))))
+    return experience
+
+
+def weighted_jaccard(a, b):
+    """Weighted Jaccard similarity of two non-negative count mappings."""
+    keys = set(a) | set(b)
+    upper = sum(max(a.get(k, 0), b.get(k, 0)) for k in keys)
+    return sum(min(a.get(k, 0), b.get(k, 0)) for k in keys) / upper if upper else 0.0
+
+
+def cosine(a, b):
+    """Cosine similarity of two sparse vectors (dicts)."""
+    dot = sum(value * b.get(k, 0.0) for k, value in a.items())
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def _count_similarity(a, b):
+    return min(a, b) / max(a, b) if max(a, b) else 0.0
+
+
+def similarity(target, candidate):
+    """
+    Score how similar two experiences are.
+
+    A dimension where neither user has any experience is left out, so two
+    students are not considered alike just because both did nothing.
+
+    Returns:
+        tuple: (overall score in [0, 1], {dimension: score})
+    """
+    parts = {}
+    if target.elective_categories or candidate.elective_categories:
+        # 选修课类别重合度为主，具体课程重合作为补充
+        parts["electives"] = (
+            0.7 * weighted_jaccard(target.elective_categories, candidate.elective_categories)
+            + 0.3 * _jaccard(target.elective_names, candidate.elective_names)
+        )
+    if target.research_names or candidate.research_names:
+        # 科研：项目数量接近程度 + 研究方向（能力维度分布）相关性
+        parts["research"] = (
+            0.4 * _jaccard(target.research_names, candidate.research_names)
+            + 0.3 * cosine(target.research_skills, candidate.research_skills)
+            + 0.3 * _count_similarity(len(target.research_names), len(candidate.research_names))
+        )
+    if target.contest_names or candidate.contest_names:
+        # 竞赛：参赛数量 + 获奖等级接近程度
+        level_gap = 1.0
+        if target.award_levels and candidate.award_levels:
+            level_gap = abs(
+                sum(target.award_levels) / len(target.award_levels)
+                - sum(candidate.award_levels) / len(candidate.award_levels)
+            )
+        parts["competitions"] = (
+            0.4 * _jaccard(target.contest_names, candidate.contest_names)
+            + 0.3 * _count_similarity(len(target.contest_names), len(candidate.contest_names))
+            + 0.3 * (1.0 - level_gap)
+        )
+    weight = sum(DIMENSION_WEIGHTS[d] for d in parts)
+    score = sum(DIMENSION_WEIGHTS[d] * s for d, s in parts.items()) / weight if weight else 0.0
+    return score, parts
+
+
+def current_semester(user):
+    try:
+        return int(user.get("academic_progress", {}).get("current_semester", 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def major_key(user):
+    """(school, major) of a user record; peers are only matched within the same major."""
+    profile = user.get("profile", {})
+    return profile.get("school"), profile.get("major")
+
+
+def find_similar_users(user_id, k=DEFAULT_TOP_K, users=None):
+    """
+    Rank peers of `user_id` by learning-path similarity, locally and deterministically.
+
+    Follows prompts/match_en.txt: only users of the same school and major
+    whose current semester is >= the target's are candidates, and for both
+    sides only experiences completed before the target's current semester
+    are compared.
+
+    Args:
+        user_id (str): The target user ID.
+        k (int): Number of peers to return.
+        users: Optional iterable of (user_id, record); the user store by default.
+
+    Returns:
+        list: [(user_id, score, {dimension: score})], best first. Ties are
+        broken by the smaller semester gap, then by user ID.
+
+    Raises:
+        ValueError: If the target user does not exist.
+    """
+    items = users.items() if isinstance(users, dict) else users
+    if items is None:
+        store = get_user_store()
+        target_user = store.get(user_id)
+        items = store.items()
+    else:
+        items = list(items)
+        target_user = next((record for uid, record in items if uid == user_id), None)
+    if not target_user:
+        raise ValueError(f"User with ID {user_id} not found in users.json.")
+
+    catalog_index = get_catalog_index()
+    baseline = current_semester(target_user)
+    major = major_key(target_user)
+    target = extract_experience(target_user, baseline, catalog_index)
+    candidates = []
+    for uid, record in items:
+        if uid == user_id or not record or major_key(record) != major:
+            continue
+        gap = current_semester(record) - baseline
+        if gap >= 0:
+            candidates.append((uid, gap, extract_experience(record, baseline, catalog_index)))
+    return rank_experiences(target, candidates, k)
+
+
+def rank_experiences(target, candidates, k=DEFAULT_TOP_K):
+    """
+    Rank already extracted candidate experiences against a target experience.
+
+    Args:
+        target (Experience): The target's experience.
+        candidates: Iterable of (user_id, semester gap, Experience); the
+            experiences must be extracted with the target's current semester.
+        k (int): Number of peers to return.
+
+    Returns:
+        list: [(user_id, score, {dimension: score})], as find_similar_users.
+    """
+    ranked = []
+    for uid, gap, experience in candidates:
+        score, parts = similarity(target, experience)
+        ranked.append((-score, gap, uid, parts))
+    ranked.sort(key=lambda entry: entry[:3])
+    return [(uid, round(-neg_score, 4), parts) for neg_score, _, uid, parts in ranked[:k]]
+
+
+def describe_experience(user, before_semester, catalog_index=None):
+    """Short text summary of the compared experiences (used for the LLM re-ranking prompt)."""
+    experience = extract_experience(user, before_semester, catalog_index)
+    return {
+        "current_semester": current_semester(user),
+        "elective_categories": dict(experience.elective_categories),
+        "electives": sorted(experience.elective_names),
+        "research": sorted(experience.research_names),
+        "competitions": [
+            {"name": c.get("name"), "award": c.get("award")}
+            for c in user.get("academic_progress", {}).get("competitions_done", [])
+            if c.get("name") in experience.contest_names
+        ],
+    }
+
+
+def parse_user_ids(text, allowed, exclude=None):
+    """Return the user_<digits> IDs found in `text` that are in `allowed`, in order, without duplicates."""
+    found = []
+    for uid in re.findall(r'user_\d+', text or ""):
+        if uid in allowed and uid != exclude and uid not in found:
+            found.append(uid)
+    return found
@@ -0,0 +1,124 @@
+import json
+import threading
+
+from catalog_index import ITEM_LIST_KEYS, get_catalog_index
+
+# 提示词中目录部分的顺序与文件名；整块发送的种类进入共享前缀，按需求检索的种类放在用户画像之后
+CONTEXT_KINDS = (
+    ("course_requirement", "course_requirement.json"),
+    ("contests", "contests.json"),
+    ("courses", "courses.json"),
+    ("research", "research.json"),
+)
+# 拆分序列化结果时占位的条目列表
+_SLOT = "\x00items\x00"
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+class MajorContext:
+    """
+    Pre-serialized catalog section of the plan prompt for one (school, major, semester).
+
+    Everything here depends only on the catalog version and the cohort, so
+    it is serialized once and shared by every user and message of the cohort:
+
+    - `full[kind]`: the major-scoped block of every school offering the
+      major (current-semester courses only), as sent without retrieval;
+    - for a retrieved subset, the user's school record is kept as a
+      serialized prefix/suffix around its item list plus one serialized
+      string per item, so `block(kind, items)` only joins strings.
+
+    The output is byte-identical to json.dumps of the same structures.
+    """
+
+    def __init__(self, catalog_index, school, major, semester):
+        self.version = catalog_index.version
+        self.full = {}
+        self._frames = {}
+        self._items = {}
+        for kind, _ in CONTEXT_KINDS:
+            records = []
+            for school_name, major_info in catalog_index.records_for_major(kind, major):
+                if kind == "courses" and semester is not None:
+                    filtered_major = dict(major_info)
+                    major_catalog = catalog_index.major(school_name, major)
+                    filtered_major["课程列表"] = major_catalog.courses_by_semester.get(semester, [])
+                    major_info = filtered_major
+                records.append({"学院名称": school_name, "专业": major_info})
+                list_key = ITEM_LIST_KEYS.get(kind)
+                if list_key and school_name == school:
+                    framed = dict(major_info)
+                    framed[list_key] = [_SLOT]
+                    prefix, suffix = _dumps([{"学院名称": school_name, "专业": framed}]).split(_dumps(_SLOT))
+                    self._frames[kind] = (prefix, suffix)
+                    self._items[kind] = {id(item): (item, _dumps(item)) for item in major_info.get(list_key, ())}
+            self.full[kind] = _dumps(records)
+
+    def block(self, kind, items=None):
+        """
+        The serialized block of one kind.
+
+        Args:
+            kind (str): A key of CONTEXT_KINDS.
+            items (list): Catalog items of the user's school to send instead of
+                the full list (e.g. from catalog_retrieval); None for all.
+                Items of another catalog version are serialized on the fly.
+        """
+        if items is None:
+            return self.full[kind]
+        if kind not in self._frames:
+            # 用户所在学院没有该类目录
+            return "[]"
+        prefix, suffix = self._frames[kind]
+        serialized = self._items.get(kind, {})
+        parts = []
+        for item in items:
+            entry = serialized.get(id(item))
+            parts.append(entry[1] if entry is not None and entry[0] is item else _dumps(item))
+        return prefix + ", ".join(parts) + suffix
+
+    def shared_section(self, selected=None):
+        """
+        The "Major-Scoped Databases" section: the blocks sent in full.
+
+        It does not depend on the demand, so it is byte-identical for every
+        user and message of the cohort and belongs in the shared prompt prefix.
+
+        Args:
+            selected (dict): Optional kind -> items of a retrieval; those kinds
+                are left to `retrieved_section`.
+        """
+        selected = selected or {}
+        lines = [f"{filename}: {self.block(kind)}" for kind, filename in CONTEXT_KINDS if selected.get(kind) is None]
+        return "Major-Scoped Databases:\n" + "\n".join(lines)
+
+    def retrieved_section(self, selected=None):
+        """The blocks of the retrieved kinds (they change with the demand), or "" if none."""
+        selected = selected or {}
+        lines = [
+            f"{filename}: {self.block(kind, selected[kind])}"
+            for kind, filename in CONTEXT_KINDS if selected.get(kind) is not None
+        ]
+        return "Retrieved Catalog Items (selected for this request):\n" + "\n".join(lines) if lines else ""
+
+
+_contexts = {}
+_contexts_lock = threading.Lock()
+
+
+def get_major_context(school, major, semester, catalog_index=None):
+    """Return the MajorContext of (school, major, semester) for the current catalog version."""
+    catalog_index = catalog_index or get_catalog_index()
+    key = (school, major, semester)
+    with _contexts_lock:
+        context = _contexts.get(key)
+        if context is None or context.version != catalog_index.version:
+            if context is not None:
+                # 目录已更新：旧版本的上下文全部作废
+                for stale in [k for k, c in _contexts.items() if c.version != catalog_index.version]:
+                    del _contexts[stale]
+            context = _contexts[key] = MajorContext(catalog_index, school, major, semester)
+        return context
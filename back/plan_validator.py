@@ -0,0 +1,292 @@
+import queue
+import re
+import threading
+import unicodedata
+
+from catalog_index import get_catalog_index
+
+# prompts/check.md：GPA 低于该值时暂不推荐科研和竞赛
+LOW_GPA = 2.5
+# 推荐内容所在的行：列表项、编号项或标题
+RECOMMENDATION_LINE = re.compile(r"^\s*(?:[-*•]|\d+\s*[.、)）]|#+)")
+# 草稿中显式写出的名称：书名号，或列表项开头的加粗文字
+QUOTED_NAME = re.compile(r"《([^《》\n]{2,60})》")
+BOLD_ITEM = re.compile(r"^\s*(?:[-*•]|\d+\s*[.、)）])\s*\*\*([^*\n]{2,60})\*\*")
+KIND_LABELS = {"courses": "课程", "research": "科研项目", "contests": "竞赛"}
+
+
+class Violation:
+    """One rule a draft plan breaks."""
+
+    __slots__ = ("rule", "name", "message")
+
+    def __init__(self, rule, name, message):
+        self.rule = rule
+        self.name = name
+        self.message = message
+
+    def __repr__(self):
+        return f"Violation({self.rule!r}, {self.name!r})"
+
+
+_name_patterns = {}
+_name_patterns_lock = threading.Lock()
+
+
+def _catalog_names(catalog_index):
+    """
+    (regex matching every catalog item name longest first, normalized names)
+    of all majors, built once per catalog version.
+    """
+    entry = _name_patterns.get(catalog_index.version)
+    if entry is None:
+        names = {n for n in set(catalog_index.courses) | set(catalog_index.research) | set(catalog_index.contests) if n}
+        alternatives = "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+        entry = (re.compile(alternatives) if alternatives else None, {_normalize(name) for name in names})
+        with _name_patterns_lock:
+            _name_patterns.clear()
+            _name_patterns[catalog_index.version] = entry
+    return entry
+
+
+def _normalize(name):
+    return re.sub(r"\s+", "", name)
+
+
+def normalize_reply(text):
+    """
+    A short LLM reply without whitespace and punctuation (NFKC), for
+    comparing it with a fixed answer such as "无需修正" ("无需修正。" matches).
+    """
+    text = unicodedata.normalize("NFKC", text or "")
+    return "".join(ch for ch in text if not ch.isspace() and not unicodedata.category(ch).startswith("P"))
+
+
+class _MajorNames:
+    """Name lookups of one major used by the rules."""
+
+    def __init__(self, major_catalog):
+        self.kinds = {}
+        self.courses = {}
+        self.normalized = {}
+        if major_catalog is None:
+            return
+        for course in major_catalog.courses:
+            self.kinds[course["name"]] = "courses"
+            self.courses[course["name"]] = course
+        for name in major_catalog.research_names:
+            self.kinds[name] = "research"
+        for name in major_catalog.contest_names:
+            self.kinds[name] = "contests"
+        self.normalized = {_normalize(name): name for name in self.kinds}
+
+    def resolve(self, mention):
+        """The catalog name a free-text mention refers to (exact, or one containing the other), or None."""
+        mention = _normalize(mention)
+        if mention in self.normalized:
+            return self.normalized[mention]
+        for normalized, name in self.normalized.items():
+            if len(mention) >= 4 and (mention in normalized or normalized in mention):
+                return name
+        return None
+
+
+def recommended_items(draft, catalog_index=None, extra_names=()):
+    """
+    Catalog item names found in the recommendation lines of a draft (list items and headings).
+
+    `extra_names` (e.g. the user's completed items missing from the catalog)
+    are matched first, so a catalog name inside one of them is not reported.
+
+    Returns:
+        list: Names in order of first appearance.
+    """
+    catalog_index = catalog_index or get_catalog_index()
+    pattern = _catalog_names(catalog_index)[0]
+    extra = sorted((n for n in extra_names if n), key=len, reverse=True)
+    extra_pattern = re.compile("|".join(re.escape(n) for n in extra)) if extra else None
+    found = []
+    for line in (draft or "").splitlines():
+        if not RECOMMENDATION_LINE.match(line):
+            continue
+        matches = []
+        if extra_pattern is not None:
+            matches = [(m.start(), m.group(0)) for m in extra_pattern.finditer(line)]
+            line = extra_pattern.sub(lambda m: "\0" * len(m.group(0)), line)
+        if pattern is not None:
+            matches += [(m.start(), m.group(0)) for m in pattern.finditer(line)]
+        for _, name in sorted(matches):
+            if name not in found:
+                found.append(name)
+    return found
+
+
+def _gpa(user):
+    try:
+        return float(user.get("average_grades") or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class PlanValidator:
+    """
+    The rules of one user, prepared once so that a draft can be checked in
+    pieces (e.g. line by line while it streams in).
+
+    Rules (prompts/recommend_en.txt and prompts/check.md):
+    - every named course, research project and contest exists for the user's major;
+    - recommended electives are offered in the user's current semester;
+    - nothing recommended has already been completed;
+    - recommended electives belong to a category that still has a gap in
+      remaining_tasks.optional_course_gap;
+    - no research or contests for a GPA below LOW_GPA.
+
+    Only explicit names are checked (catalog names on list lines, 《》 and
+    bold list-item titles); wording and ranking are left to the LLM.
+    Violations accumulate across `check` calls, each (rule, name) once.
+    """
+
+    def __init__(self, user, catalog_index=None):
+        self.catalog_index = catalog_index or get_catalog_index()
+        profile = user.get("profile", {})
+        self.major = profile.get("major")
+        major_catalog = self.catalog_index.major(profile.get("school"), self.major)
+        self.names = _MajorNames(major_catalog)
+        self.required_categories = major_catalog.required_categories if major_catalog else frozenset()
+        progress = user.get("academic_progress", {})
+        try:
+            self.semester = int(progress.get("current_semester"))
+        except (TypeError, ValueError):
+            self.semester = None
+
+        self.completed = {}
+        for field, kind in (("completed_courses", "courses"), ("research_done", "research"), ("competitions_done", "contests")):
+            for item in progress.get(field, []):
+                self.completed[item.get("name")] = kind
+        self.closed_categories = set()
+        for gap in user.get("remaining_tasks", {}).get("optional_course_gap", []):
+            try:
+                open_gap = int(gap.get("course_gap", 0)) > 0
+            except (TypeError, ValueError):
+                open_gap = True
+            if not open_gap:
+                self.closed_categories.update(p.strip() for p in str(gap.get("category", "")).split("/") if p.strip())
+        self.all_names = _catalog_names(self.catalog_index)[1]
+        self.extra_names = [name for name in self.completed if name and _normalize(name) not in self.all_names]
+        self.low_gpa = 0.0 < _gpa(user) < LOW_GPA
+        self.violations = []
+        self._seen = set()
+
+    def _add(self, rule, name, message):
+        if (rule, name) not in self._seen:
+            self._seen.add((rule, name))
+            self.violations.append(Violation(rule, name, message))
+
+    def check(self, text):
+        """
+        Check a draft, or a run of complete lines of one.
+
+        Returns:
+            list: All violations found so far.
+        """
+        names = self.names
+        # 显式写出的名称必须能在本专业目录中找到：书名号中的名称都要检查，
+        # 列表项的加粗标题也可能是“推荐理由”之类的小标题，只检查是否属于其他专业
+        mentions = [(m.group(1), True) for m in QUOTED_NAME.finditer(text or "")]
+        mentions += [(m.group(1), False) for line in (text or "").splitlines() for m in BOLD_ITEM.finditer(line)]
+        for mention, quoted in mentions:
+            if names.resolve(mention) is not None:
+                continue
+            if _normalize(mention) in self.all_names:
+                self._add("not_for_major", mention, f"「{mention}」不属于{self.major}专业的可选范围")
+            elif quoted:
+                self._add("unknown_item", mention, f"「{mention}」在课程、科研和竞赛数据库中不存在")
+
+        for name in recommended_items(text, self.catalog_index, extra_names=self.extra_names):
+            if name in self.completed:
+                self._add("completed", name, f"「{name}」用户已经完成，不应再次推荐")
+                continue
+            kind = names.kinds.get(name)
+            if kind is None:
+                self._add("not_for_major", name, f"「{name}」不属于{self.major}专业的可选范围")
+                continue
+            if kind == "courses":
+                course = names.courses[name]
+                category = course.get("category")
+                if category in self.required_categories:
+                    # 必修课只作为背景信息出现，不属于推荐内容
+                    continue
+                if self.semester is not None and course.get("standard_semester") not in (None, self.semester):
+                    self._add("wrong_semester", name, f"课程「{name}」开设于第 {course.get('standard_semester')} 学期，不是当前第 {self.semester} 学期")
+                if category in self.closed_categories:
+                    self._add("category_met", name, f"课程「{name}」所属类别「{category}」的选修要求已经满足")
+            elif self.low_gpa:
+                self._add("low_gpa", name, f"用户 GPA 低于 {LOW_GPA}，暂不推荐{KIND_LABELS[kind]}「{name}」")
+        return list(self.violations)
+
+
+def validate_plan(draft, user, catalog_index=None):
+    """
+    Check a whole draft plan against the catalog and the user record (see PlanValidator).
+
+    Args:
+        draft (str): The LLM's draft reply.
+        user (dict): The user record.
+        catalog_index (CatalogIndex): Defaults to the current catalog.
+
+    Returns:
+        list: Violation objects; empty if the draft passes.
+    """
+    return PlanValidator(user, catalog_index).check(draft)
+
+
+class StreamingValidation:
+    """
+    Validate a draft on a background thread while it streams in.
+
+    `feed` hands every completed line to the worker, so checking overlaps
+    with generation; `result` checks the last partial line and returns all
+    violations. A caller that stops early (the stream failed or was
+    abandoned) must call `close` so the worker exits.
+    """
+
+    def __init__(self, user, catalog_index=None):
+        self.validator = PlanValidator(user, catalog_index)
+        self._pending = ""
+        self._closed = False
+        self._lines = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="plan-validation", daemon=True)
+        self._worker.start()
+
+    def _run(self):
+        while True:
+            text = self._lines.get()
+            if text is None:
+                return
+            self.validator.check(text)
+
+    def feed(self, chunk):
+        self._pending += chunk
+        head, sep, self._pending = self._pending.rpartition("\n")
+        if sep:
+            self._lines.put(head)
+
+    def result(self, timeout=None):
+        """Wait for the worker and return the violations of everything fed."""
+        if self._pending and not self._closed:
+            self._lines.put(self._pending)
+            self._pending = ""
+        self.close(timeout)
+        return list(self.validator.violations)
+
+    def close(self, timeout=None):
+        """Stop the worker after the lines fed so far; safe to call more than once."""
+        if not self._closed:
+            self._closed = True
+            self._lines.put(None)
+        self._worker.join(timeout)
+
+
+def describe_violations(violations):
+    """Numbered list of the violations, for the correction prompt."""
+    return "\n".join(f"{i}. {v.message}" for i, v in enumerate(violations, start=1))
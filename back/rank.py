@@ -1,51 +1,55 @@
 import json
 import os
 
+from event_log import get_event_log
+from user_store import get_user_store
+
+
+def _rank_setter(rank):
+    def set_rank(user_info):
+        user_info['path_review']['current_rank'] = rank
+    return set_rank
+
+
 def generate_comment_rank_list():
     """
     Generate a ranking list of users based on their comment like_count.
-    Updates users.json with current_rank and saves the ranking to rank.json.
+    Updates the user store with current_rank and saves the ranking to rank.json.
     
     Returns:
         list: A list of dictionaries with user ranking information in rank.json format.
               Each entry contains: user_name, like_count, current_rank
     """
     base_dir = os.path.dirname(__file__)
-    users_path = os.path.join(base_dir, '../databases/users.json')
     rank_path = os.path.join(base_dir, '../databases/rank.json')
-    
-    try:
-        # Load users database
-        with open(users_path, 'r', encoding='utf-8') as f:
-            users = json.load(f)
-    except FileNotFoundError:
-        raise FileNotFoundError(f"users.json file not found at {users_path}.")
-    except json.JSONDecodeError:
-        raise ValueError("Error decoding users.json file.")
+    store = get_user_store()
     
     # Extract user ranking data
     user_ranking_data = []
-    for user_id, user_info in users.items():
+    for user_id, user_info in get_event_log().fold_items(store.items()):
         user_name = user_info.get('profile', {}).get('name', 'Unknown')
-        like_count = user_info.get('path_review', {}).get('like_count', 0)
+        path_review = user_info.get('path_review', {})
         user_ranking_data.append({
             'user_id': user_id,
             'user_name': user_name,
-            'like_count': like_count
+            'like_count': path_review.get('like_count', 0),
+            'previous_rank': path_review.get('current_rank')
         })
     
     # Sort by like_count in descending order
     user_ranking_data.sort(key=lambda x: x['like_count'], reverse=True)
     
-    # Create the ranking list and update users.json with current_rank
+    # Create the ranking list and collect the users whose current_rank changed
     ranking_list = []
+    rank_updates = {}
     for rank, user_data in enumerate(user_ranking_data, start=1):
         user_id = user_data['user_id']
         user_name = user_data['user_name']
         like_count = user_data['like_count']
         
-        # Update the current_rank in users.json
-        users[user_id]['path_review']['current_rank'] = rank
+        # Only users whose rank moved are written back to the store
+        if user_data['previous_rank'] != rank:
+            rank_updates[user_id] = _rank_setter(rank)
         
         # Add to ranking list in rank.json format
         ranking_list.append({
@@ -54,12 +58,12 @@ def generate_comment_rank_list():
             'current_rank': rank
         })
     
-    # Save updated users.json
+    # Save updated ranks in a single store transaction
     try:
-        with open(users_path, 'w', encoding='utf-8') as f:
-            json.dump(users, f, ensure_ascii=False, indent=2)
+        if rank_updates:
+            store.update_many(rank_updates)
     except IOError as e:
-        raise IOError(f"Error writing to users.json: {e}")
+        raise IOError(f"Error writing to user store: {e}")
     
     # Save ranking list to rank.json
     try:
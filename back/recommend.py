@@ -3,45 +3,48 @@ import os
 import sys
 import streamlit as st
 
+from catalog_index import get_catalog_index
+from catalog_retrieval import retrieve_items
+from llm_gateway import get_llm_gateway
+from plan_context import get_major_context
+from plan_validator import StreamingValidation, describe_violations, normalize_reply, validate_plan
+from register import get_user
+from response_cache import get_response_cache
+
 # DEEPSEEK_API_KEY = os.environ.get("DEEPSEEK_API_KEY", "")
 try:
     DEEPSEEK_API_KEY = st.secrets["DEEPSEEK_API_KEY"]
 except (FileNotFoundError, KeyError, AttributeError):
     DEEPSEEK_API_KEY = os.environ.get("DEEPSEEK_API_KEY", "")
 
+# 设置为 1 时每次都用第二轮 LLM 校验草稿；默认只在本地校验发现问题时才进行第二轮
+ALWAYS_LLM_VALIDATE = os.environ.get("PLAN_LLM_VALIDATE", "0") == "1"
+# 输出方式：speculative 边生成边显示草稿，校验在后台同时进行，有问题时在末尾追加修正说明；
+# buffered 等草稿校验（必要时修正）完成后再输出
+PLAN_STREAMING = os.environ.get("PLAN_STREAMING", "speculative")
+# speculative 模式下第二轮认为无需修正时的回复（忽略空白与标点后完全相同才算），不显示给用户
+NO_CORRECTION = "无需修正"
+CORRECTION_HEADER = "\n\n---\n**修正说明**\n\n"
+
 _SESSION_CACHE = {}
 
-def stream_conversation_for_plan(user_id, demand):
+def stream_conversation_for_plan(user_id, demand, on_queue=None):
     """
     Function to handle streaming conversation for generating a personalized learning plan.
 
     Args:
         user_id (str): The ID of the user to fetch data for.
         demand (str): The user's specific demand or request.
+        on_queue (callable): Optional callback(position) while the request waits
+            for a free LLM slot; called in the consuming thread.
 
     Returns:
         generator: A generator that yields the response from the LLM in a streaming manner.
     """
     base_dir = os.path.dirname(__file__)
 
-    def load_json(relative_path, file_label):
-        file_path = os.path.join(base_dir, relative_path)
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            raise FileNotFoundError(f"{file_label} file not found.")
-        except json.JSONDecodeError:
-            raise ValueError(f"Error decoding {file_label} file.")
-
-    # Step 1: Load user data from users.json
-    users = load_json('../databases/users.json', 'users.json')
-
-    # Step 2: Find the user by user_id
-    if isinstance(users, dict):
-        user_info = users.get(user_id)
-    else:
-        user_info = next((user for user in users if user.get("id") == user_id), None)
+    # Steps 1-2: Load the user record (single-record read from the user store)
+    user_info = get_user(user_id)
 
     if not user_info:
         raise ValueError(f"User with ID {user_id} not found in users.json.")
@@ -52,66 +55,39 @@ def stream_conversation_for_plan(user_id, demand):
     if not major:
         raise ValueError(f"User with ID {user_id} does not have a major in users.json.")
 
-    # Step 3: Load the prompt template from recommend_en.txt
-    prompt_path = os.path.join(base_dir, '../prompts/recommend_en.txt')
-    try:
-        with open(prompt_path, 'r', encoding='utf-8') as f:
-            prompt_template = f.read()
-    except FileNotFoundError:
-        raise FileNotFoundError("recommend_en.txt file not found.")
-
-    # Step 4: Load and filter databases by major
-    contests = load_json('../databases/contests.json', 'contests.json')
-    courses = load_json('../databases/courses.json', 'courses.json')
-    research = load_json('../databases/research.json', 'research.json')
-    course_requirement = load_json('../databases/course_requirement.json', 'course_requirement.json')
-
-    def filter_by_major(data, restrict_courses=False):
-        result = []
-        for school in data.get("学院列表", []):
-            for major_info in school.get("专业列表", []):
-                if major_info.get("专业名称") == major:
-                    if restrict_courses and current_semester is not None:
-                        filtered_major = dict(major_info)
-                        filtered_courses = []
-                        for course in major_info.get("课程列表", []):
-                            offered_semester = course.get("standard_semester")
-                            if offered_semester == current_semester:
-                                filtered_courses.append(course)
-                        filtered_major["课程列表"] = filtered_courses
-                        major_info = filtered_major
-                    result.append({
-                        "学院名称": school.get("学院名称"),
-                        "专业": major_info
-                    })
-        return result
-
-    contests_by_major = filter_by_major(contests)
-    courses_by_major = filter_by_major(courses, restrict_courses=True)
-    research_by_major = filter_by_major(research)
-    course_requirement_by_major = filter_by_major(course_requirement)
-
-    # Step 5: Build a stable base prompt (first-turn context)
-    base_prompt = (
-        f"{prompt_template}\n\n"
-        f"User Profile: {json.dumps(user_info, ensure_ascii=False)}\n\n"
-        f"Major-Scoped Databases:\n"
-        f"contests.json: {json.dumps(contests_by_major, ensure_ascii=False)}\n"
-        f"courses.json: {json.dumps(courses_by_major, ensure_ascii=False)}\n"
-        f"research.json: {json.dumps(research_by_major, ensure_ascii=False)}\n"
-        f"course_requirement.json: {json.dumps(course_requirement_by_major, ensure_ascii=False)}"
-    )
+    # Step 3: Select the catalog items for the demand (retrieval; None sends
+    # the whole major scope) and take the pre-serialized catalog blocks of the
+    # user's cohort, built once per (school, major, semester) and catalog version
+    catalog_index = get_catalog_index()
+    selected = retrieve_items(user_info, demand, catalog_index=catalog_index)
+    major_context = get_major_context(profile.get("school"), major, current_semester, catalog_index)
 
-    # Step 6: Maintain multi-turn context in memory (per user_id)
+    # Step 4: Maintain multi-turn context in memory (per user_id)
     session = _SESSION_CACHE.get(user_id)
     if not session:
+        # Step 5: The static template and the per-user profile are kept apart:
+        # prompts start with the template and the catalog blocks sent in full
+        # (a prefix shared by every user and demand of the cohort, which the
+        # provider can cache) and only then carry the user's own data and the
+        # items retrieved for this demand
+        prompt_path = os.path.join(base_dir, '../prompts/recommend_en.txt')
+        try:
+            with open(prompt_path, 'r', encoding='utf-8') as f:
+                prompt_template = f.read()
+        except FileNotFoundError:
+            raise FileNotFoundError("recommend_en.txt file not found.")
         session = {
-            "base_prompt": base_prompt,
+            "base_prompt": prompt_template,
+            "user_profile": f"User Profile: {json.dumps(user_info, ensure_ascii=False)}",
             "turns": [],
             "assistant_responses": []
         }
         _SESSION_CACHE[user_id] = session
+    shared_prefix = f"{session['base_prompt']}\n\n{major_context.shared_section(selected)}"
+    retrieved = major_context.retrieved_section(selected)
+    user_context = f"{session['user_profile']}\n\n{retrieved}" if retrieved else session["user_profile"]
 
+    # Step 6: Assemble this turn's prompt
     session["turns"].append({"role": "user", "content": demand})
 
     recent_assistant_responses = session["assistant_responses"][-2:]
@@ -122,7 +98,8 @@ def stream_conversation_for_plan(user_id, demand):
     turns_text = f"User: {demand}"
 
     first_prompt = (
-        f"{session['base_prompt']}\n\n"
+        f"{shared_prefix}\n\n"
+        f"{user_context}\n\n"
         f"Recent Assistant Replies:\n{recent_assistant_text}\n\n"
         f"Conversation History:\n{turns_text}\n\n"
         "Assistant:"
@@ -131,85 +108,119 @@ def stream_conversation_for_plan(user_id, demand):
     # Step 7: Interact with the cloud LLM (DeepSeek streaming)
     def llm_stream_response(prompt):
         """
-        Stream response from DeepSeek's OpenAI-compatible API.
+        Stream response from DeepSeek's OpenAI-compatible API through the shared gateway
+        (concurrency limit, fair queue, retries, circuit breaker, deadline; see llm_gateway).
         Set DEEPSEEK_API_KEY and optionally DEEPSEEK_MODEL/DEEPSEEK_BASE_URL.
         """
-        import urllib.request
-
         api_key = os.environ.get("DEEPSEEK_API_KEY", DEEPSEEK_API_KEY)
-        if not api_key:
-            raise ValueError("DEEPSEEK_API_KEY is not set.")
-
-        base_url = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1")
-        model_name = os.environ.get("DEEPSEEK_MODEL", "deepseek-chat")
-
-        payload = json.dumps({
-            "model": model_name,
-            "stream": True,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ]
-        }).encode("utf-8")
-
-        req = urllib.request.Request(
-            f"{base_url}/chat/completions",
-            data=payload,
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}"
-            }
-        )
+        return get_llm_gateway().stream(prompt, api_key, on_queue=on_queue)
 
-        try:
-            with urllib.request.urlopen(req, timeout=120) as resp:
-                for raw_line in resp:
-                    if not raw_line:
-                        continue
-                    line = raw_line.decode("utf-8").strip()
-                    if not line or not line.startswith("data:"):
-                        continue
-                    data_str = line[len("data:"):].strip()
-                    if data_str == "[DONE]":
-                        break
-                    data = json.loads(data_str)
-                    choices = data.get("choices", [])
-                    if not choices:
-                        continue
-                    delta = choices[0].get("delta", {})
-                    content = delta.get("content")
-                    if content:
-                        yield content
-        except urllib.error.URLError as exc:
-            raise ConnectionError(f"Failed to connect to DeepSeek at {base_url}.") from exc
-
-    # Step 8: Return the streaming response from the LLM and store it
-    def stream_and_store():
-        # First request: generate an initial response.
-        first_chunks = []
-        for chunk in llm_stream_response(first_prompt):
-            first_chunks.append(chunk)
-        first_response = "".join(first_chunks).strip()
-
-        # Second request: validate and correct the first response.
-        second_prompt = (
-            f"{session['base_prompt']}\n\n"
+    def validation_prompt(draft, violations, instruction=""):
+        problems = (
+            f"The draft has the following problems, fix them:\n{describe_violations(violations)}\n"
+            if violations else ""
+        )
+        return (
+            f"{shared_prefix}\n\n"
+            f"{user_context}\n\n"
             f"User Demand:\n{demand}\n\n"
-            f"Draft Response:\n{first_response}\n\n"
+            f"Draft Response:\n{draft}\n\n"
             "Validation Request: 请验证第一轮的draft response是否符合回复要求，是否合理准确。\n"
+            f"{problems}"
+            f"{instruction}"
             "Do not mention any secondary verification in your reply (e.g., \"经过二次验证\").\n\n"
             "Assistant:"
         )
 
+    # Repeating a demand with unchanged progress and catalog reuses the stored
+    # reply (optional, see response_cache; the settings are fixed per process)
+    response_cache = get_response_cache()
+    response_key = response_cache.key(demand, user_info, catalog_index.version)
+
+    def remember(response):
+        session["assistant_responses"].append(response)
+        response_cache.put(response_key, response)
+
+    def stream_correction(draft, violations):
+        # Second request: validate and correct the draft.
         second_chunks = []
-        for chunk in llm_stream_response(second_prompt):
+        for chunk in llm_stream_response(validation_prompt(draft, violations)):
             second_chunks.append(chunk)
             yield chunk
-
         final_response = "".join(second_chunks).strip()
         if final_response:
-            session["assistant_responses"].append(final_response)
+            remember(final_response)
+
+    # Step 8: Return the streaming response from the LLM and store it
+    def stream_and_store():
+        # First request: generate an initial response.
+        first_response = "".join(llm_stream_response(first_prompt)).strip()
+
+        # Check the draft locally; only a draft that breaks a rule is sent back for correction.
+        violations = validate_plan(first_response, user_info, catalog_index)
+        if first_response and not violations and not ALWAYS_LLM_VALIDATE:
+            remember(first_response)
+            yield first_response
+            return
 
-    return stream_and_store()
+        yield from stream_correction(first_response, violations)
+
+    def stream_speculative():
+        # First request: show the draft as it is generated while it is validated in the background.
+        validation = StreamingValidation(user_info, catalog_index)
+        draft_chunks = []
+        try:
+            for chunk in llm_stream_response(first_prompt):
+                draft_chunks.append(chunk)
+                validation.feed(chunk)
+                yield chunk
+            violations = validation.result()
+        finally:
+            # 生成出错或页面不再读取（生成器被关闭）时也要结束后台校验线程
+            validation.close()
+        draft = "".join(draft_chunks).strip()
+        if not draft:
+            # Nothing was shown: fall back to a full second answer.
+            yield from stream_correction(draft, violations)
+            return
+        if not violations and not ALWAYS_LLM_VALIDATE:
+            remember(draft)
+            return
+
+        # Second request: a correction appended below the draft already on screen.
+        instruction = (
+            "The draft has already been shown to the user. Reply only with a short list of corrections "
+            "(what to drop or replace, and why), "
+            f"or exactly \"{NO_CORRECTION}\" if nothing needs to change.\n"
+        )
+        correction_chunks, shown = [], False
+        for chunk in llm_stream_response(validation_prompt(draft, violations, instruction)):
+            correction_chunks.append(chunk)
+            if shown:
+                yield chunk
+                continue
+            # Hold the reply back until it cannot be NO_CORRECTION any more
+            # ("无需修正。" is suppressed, "无需修正，但建议删除X" is not).
+            pending = "".join(correction_chunks).lstrip()
+            if not NO_CORRECTION.startswith(normalize_reply(pending)):
+                shown = True
+                yield CORRECTION_HEADER + pending
+        correction = "".join(correction_chunks).strip()
+        if not shown and normalize_reply(correction) not in ("", NO_CORRECTION):
+            shown = True
+            yield CORRECTION_HEADER + correction
+        remember(draft + CORRECTION_HEADER + correction if shown else draft)
+
+    def replay(response):
+        session["assistant_responses"].append(response)
+        yield response
+
+    cached = response_cache.get(response_key)
+    if cached is not None:
+        return replay(cached)
+    if PLAN_STREAMING == "buffered":
+        return stream_and_store()
+    return stream_speculative()
 
 
 if __name__ == "__main__":
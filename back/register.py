@@ -2,30 +2,42 @@ import json
 import os
 from datetime import datetime, timedelta, timezone
 
+from catalog_cache import load_cached_json, thaw
+from catalog_index import get_catalog_index
+from event_log import get_event_log
+from user_store import get_user_store
+
 # 定义数据库目录
 DB_DIR = os.path.join(os.path.dirname(__file__), "..", "databases")
 def login_user(student_id):
     """
     登录验证：根据学号检查用户是否存在
     """
-    users_all = get_db_data("users.json")
     user_id = f"user_{str(student_id).zfill(10)}"
+    user = get_user(user_id)
     
-    if user_id in users_all:
-        return True, user_id, users_all[user_id]
+    if user:
+        return True, user_id, user
     return False, "学号未注册", None
+def get_user(user_id):
+    """按 user_id 读取单个用户（叠加尚未合并的点赞/评价事件），不存在时返回 None"""
+    try:
+        return get_event_log().fold(user_id, get_user_store().get(user_id))
+    except Exception: return None
+
 def get_db_data(filename):
-    """读取JSON数据，返回原始字典"""
-    path = os.path.join(DB_DIR, filename)
-    if not os.path.exists(path): return {}
-    with open(path, "r", encoding="utf-8") as f:
+    """读取JSON数据，返回原始字典（users.json 由用户存储后端导出，并叠加尚未合并的点赞/评价事件）"""
+    if filename == "users.json":
         try:
-            return json.load(f)
-        except: return {}
+            return get_event_log().fold_all(get_user_store().load_all())
+        except Exception: return {}
+    # 课程/科研/竞赛等目录数据走进程级缓存，返回只读视图（需修改时先 thaw）
+    try:
+        return load_cached_json(os.path.join(DB_DIR, filename))
+    except (OSError, ValueError): return {}
 
-def register_user(data):
-    """注册用户并初始化结构"""
-    db_path = os.path.join(DB_DIR, "users.json")
+def _new_user_record(data):
+    """按注册信息构造新用户记录（专业模板随目录索引预先生成，这里只做复制）"""
     user_id = f"user_{str(data['student_id']).zfill(10)}"
     
     new_user = {
@@ -47,52 +59,57 @@ def register_user(data):
         "average_grades": 0.0
     }
 
-    # 1. 尝试从 tags.json 初始化标签 (假设 tags.json 是个列表)
-    tags_all = get_db_data("tags.json")
-    if isinstance(tags_all, list):
-        for item in tags_all:
-            for college in item.get("学院列表", []):
-                if college.get("学院名称") == data["school"]:
-                    major_tags = college.get("专业列表", {}).get(data["major"], [])
-                    tag_key = item.get("tag") # knowledge 或 skills
-                    if tag_key in new_user:
-                        new_user[tag_key] = {t: 0.0 for t in major_tags}
-
-    # 2. 初始化必修课地图与个性化选修课要求
-    courses_data = get_db_data("courses.json")
-    for college in courses_data.get("学院列表", []):
-        if college.get("学院名称") == data["school"]:
-            for major_item in college.get("专业列表", []):
-                if major_item.get("专业名称") == data["major"]:
-                    new_user["remaining_tasks"]["must_required_courses"] = major_item.get("course_map", [])
-                    break
-
-    requirements_data = get_db_data("course_requirement.json")
-    for college in requirements_data.get("学院列表", []):
-        if college.get("学院名称") == data["school"]:
-            for major_item in college.get("专业列表", []):
-                if major_item.get("专业名称") == data["major"]:
-                    new_user["remaining_tasks"]["optional_course_gap"] = major_item.get("个性化选修课课程要求", [])
-                    break
+    major_catalog = get_catalog_index().major(data["school"], data["major"])
+    if major_catalog:
+        # 知识/能力标签、必修课地图与个性化选修课要求均来自 (学院, 专业) 模板
+        template = major_catalog.user_template
+        new_user["knowledge"] = dict(template["knowledge"])
+        new_user["skills"] = dict(template["skills"])
+        new_user["remaining_tasks"] = thaw(template["remaining_tasks"])
+    return user_id, new_user
 
+def register_user(data):
+    """注册用户并初始化结构"""
     try:
-        users = get_db_data("users.json")
-        if not isinstance(users, dict): users = {}
-        if user_id in users: return False, "学号已注册"
-        
-        users[user_id] = new_user
-        with open(db_path, "w", encoding="utf-8") as f:
-            json.dump(users, f, ensure_ascii=False, indent=2)
+        user_id, new_user = _new_user_record(data)
+        if not get_user_store().insert(user_id, new_user): return False, "学号已注册"
         return True, user_id
     except Exception as e:
         return False, str(e)
 
+def register_users(data_list):
+    """
+    批量注册（如新生入学），所有新用户在一次存储写入中创建
+    返回与 data_list 一一对应的 (是否成功, user_id 或错误信息)
+    """
+    results, records = [], {}
+    for data in data_list:
+        try:
+            user_id, new_user = _new_user_record(data)
+        except Exception as e:
+            results.append((False, str(e)))
+            continue
+        if user_id in records:
+            results.append((False, "学号已注册"))
+            continue
+        records[user_id] = new_user
+        results.append((True, user_id))
+
+    try:
+        inserted = set(get_user_store().insert_many(records)) if records else set()
+    except Exception as e:
+        return [(False, str(e)) if ok else (ok, value) for ok, value in results]
+    return [
+        (ok, value) if not ok or value in inserted else (False, "学号已注册")
+        for ok, value in results
+    ]
+
 def get_mandatory_roadmap(major):
     """
     根据专业生成必修课地图并写入 courses.json 的 course_map
     目前该函数只允许开发者使用
     """
-    courses_data = get_db_data("courses.json")
+    courses_data = thaw(get_db_data("courses.json"))
     roadmap = []
 
     for college in courses_data.get("学院列表", []):
@@ -117,41 +134,148 @@ def get_mandatory_roadmap(major):
 
 def get_selection_options(user_id):
     """获取该专业下可选的课程、科研和竞赛"""
-    users = get_db_data("users.json")
-    user = users.get(user_id)
+    user = get_user(user_id)
     if not user: return {"courses": [], "research": [], "contest_list": [], "contest_awards": {}}
     
-    school = user["profile"]["school"]
-    major_name = user["profile"]["major"]
     res = {"courses": [], "research": [], "contest_list": [], "contest_awards": {}}
-    
-    # 1. 提取课程
-    c_data = get_db_data("courses.json")
-    for college in c_data.get("学院列表", []):
-        if college.get("学院名称") == school:
-            for m in college.get("专业列表", []):
-                if m.get("专业名称") == major_name:
-                    res["courses"] = [c["name"] for c in m.get("课程列表", [])]
-
-    # 2. 提取科研
-    r_data = get_db_data("research.json")
-    for college in r_data.get("学院列表", []):
-        if college.get("学院名称") == school:
-            for m in college.get("专业列表", []):
-                if m.get("专业名称") == major_name:
-                    res["research"] = [r["name"] for r in m.get("科研列表", [])]
-
-    # 3. 提取竞赛
-    ct_data = get_db_data("contests.json")
-    for college in ct_data.get("学院列表", []):
-        if college.get("学院名称") == school:
-            for m in college.get("专业列表", []):
-                if m.get("专业名称") == major_name:
-                    for ct in m.get("竞赛列表", []):
-                        res["contest_list"].append(ct["name"])
-                        res["contest_awards"][ct["name"]] = ct.get("potential_awards", ["参与奖"])
+    major_catalog = get_catalog_index().major(user["profile"]["school"], user["profile"]["major"])
+    if major_catalog:
+        # 课程、科研、竞赛名称均已按专业预先整理
+        res["courses"] = list(major_catalog.course_names)
+        res["research"] = list(major_catalog.research_names)
+        res["contest_list"] = list(major_catalog.contest_names)
+        res["contest_awards"] = dict(major_catalog.contest_awards)
     return res
 
+def _deduplicate(data_list):
+    """同名条目只保留最后一次出现的内容"""
+    unique_data = {}
+    for item in data_list:
+        unique_data[item['name']] = item
+    return list(unique_data.values())
+
+def knowledge_term(base, credits, gpa):
+    """
+    一门课对一个知识维度的贡献：维度分 * 学分 * 绩点，保留两位小数
+    逐门计算与批量重算（scoring.py）共用，保证两条路径结果一致
+    """
+    return round(base * credits * gpa, 2)
+
+def _recompute_progress(user, payload):
+    """
+    按 payload 覆盖用户的修读记录，并从零重新计算各项分值（原地修改 user）
+    """
+    # 1. 逻辑去重（确保同一项目不重复出现在列表中）
+    user["academic_progress"]["completed_courses"] = _deduplicate(payload.get("courses", []))
+    user["academic_progress"]["competitions_done"] = _deduplicate(payload.get("competitions", []))
+    user["academic_progress"]["research_done"] = _deduplicate(payload.get("research", []))
+
+    # 2. 查找字典 (按目录版本预先建好的全局名称索引)
+    catalog_index = get_catalog_index()
+    course_lookup = catalog_index.courses
+    research_lookup = catalog_index.research
+    contest_lookup = catalog_index.contests
+
+    # 3. 初始化/清零 知识点和能力分数，准备重算
+    for k in user["knowledge"]: user["knowledge"][k] = 0.0
+    for s in user["skills"]: user["skills"][s] = 0.0
+    
+    # 4. --- 计算课程贡献 (仅 Knowledge) ---
+    total_credits = 0.0
+    total_grade_points = 0.0
+
+    for c_done in user["academic_progress"]["completed_courses"]:
+        name = c_done["name"]
+        gpa = float(c_done.get("grade", 0))
+        if name in course_lookup:
+            info = course_lookup[name]
+            creds = float(info.get("credits", 0))
+            total_credits += creds
+            total_grade_points += creds * gpa
+            
+            # 更新知识树分数：维度分 * 学分 * 绩点
+            if "knowledge" in info:
+                for kd, base in info["knowledge"].items():
+                    if kd in user["knowledge"]:
+                        user["knowledge"][kd] += knowledge_term(base, creds, gpa)
+
+    # 5. --- 计算科研贡献 (仅 Skills) ---
+    # 逻辑：直接累加科研库中定义的 skills 基础分
+    for r_done in user["academic_progress"]["research_done"]:
+        name = r_done["name"]
+        if name in research_lookup:
+            info = research_lookup[name]
+            if "skills" in info:
+                for sd, val in info["skills"].items():
+                    if sd in user["skills"]:
+                        user["skills"][sd] += float(val)
+
+    # 6. --- 计算竞赛贡献 (仅 Skills) ---
+    # 逻辑：直接累加竞赛库中定义的 skills 基础分 (忽略获奖情况)
+    for ct_done in user["academic_progress"]["competitions_done"]:
+        name = ct_done["name"]
+        if name in contest_lookup:
+            info = contest_lookup[name]
+            if "skills" in info:
+                for sd, val in info["skills"].items():
+                    if sd in user["skills"]:
+                        user["skills"][sd] += float(val)
+
+    # 7. 更新 remaining_tasks (必修课与个性化选修课学分缺口)
+    if "remaining_tasks" not in user:
+        user["remaining_tasks"] = {"must_required_courses": [], "optional_course_gap": []}
+
+    # 必修课：已完成且属于必修类别时，从清单中移除
+    major_catalog = catalog_index.major(
+        user.get("profile", {}).get("school"), user.get("profile", {}).get("major")
+    )
+    required_categories = major_catalog.required_categories if major_catalog else set()
+    elective_subcategory_map = major_catalog.elective_subcategory_map if major_catalog else {}
+
+    completed_names = {c.get("name") for c in user["academic_progress"].get("completed_courses", []) if c.get("name")}
+    must_required = user["remaining_tasks"].get("must_required_courses", [])
+    if required_categories and must_required:
+        user["remaining_tasks"]["must_required_courses"] = [
+            item for item in must_required
+            if not (
+                item.get("name") in completed_names
+                and course_lookup.get(item.get("name"), {}).get("category") in required_categories
+            )
+        ]
+
+    # 个性化选修：根据课程所属类别匹配课程要求类别，course_gap 逐门课程递减，最低不小于 0
+    optional_gaps = user["remaining_tasks"].get("optional_course_gap", [])
+
+    def split_requirement_categories(category_text):
+        parts = [p.strip() for p in category_text.split("/") if p.strip()]
+        return parts
+
+    for c_done in user["academic_progress"].get("completed_courses", []):
+        name = c_done.get("name")
+        if not name or name not in course_lookup:
+            continue
+        course_info = course_lookup[name]
+        course_category = course_info.get("category")
+        if not course_category:
+            continue
+
+        for gap_item in optional_gaps:
+            req_category = gap_item.get("category", "")
+            if not req_category:
+                continue
+            req_parts = split_requirement_categories(req_category)
+            if course_category in req_parts:
+                current_gap = int(gap_item.get("course_gap", 0))
+                gap_item["course_gap"] = max(0, current_gap - 1)
+                break
+
+    user["remaining_tasks"]["optional_course_gap"] = optional_gaps
+
+    # 8. 更新汇总统计字段 (GPA & 总学分)，学分绩点和一并保存供增量追加使用
+    user["total_credits"] = total_credits
+    user["total_grade_points"] = total_grade_points
+    user["average_grades"] = round(total_grade_points / total_credits, 2) if total_credits > 0 else 0.0
+
 def update_user_progress(user_id, payload):
     """
     更新用户进度并重新计算分值
@@ -159,158 +283,143 @@ def update_user_progress(user_id, payload):
     1. 课程 -> 仅加在 knowledge (技能树)
     2. 科研/竞赛 -> 仅加在 skills (雷达图)
     """
-    users_all = get_db_data("users.json")
-    user = users_all.get(user_id)
-    if not user: return False
-
     try:
-        # 1. 逻辑去重（确保同一项目不重复出现在列表中）
-        def deduplicate(data_list):
-            unique_data = {}
-            for item in data_list:
-                unique_data[item['name']] = item
-            return list(unique_data.values())
-
-        user["academic_progress"]["completed_courses"] = deduplicate(payload.get("courses", []))
-        user["academic_progress"]["competitions_done"] = deduplicate(payload.get("competitions", []))
-        user["academic_progress"]["research_done"] = deduplicate(payload.get("research", []))
-
-        # 2. 准备查找字典 (扁平化所有数据库方便查询)
-        def build_lookup(db_name, list_key):
-            lookup = {}
-            db_content = get_db_data(db_name)
-            for college in db_content.get("学院列表", []):
-                for major in college.get("专业列表", []):
-                    for item in major.get(list_key, []):
-                        lookup[item["name"]] = item
-            return lookup
-
-        course_lookup = build_lookup("courses.json", "课程列表")
-        research_lookup = build_lookup("research.json", "科研列表")
-        contest_lookup = build_lookup("contests.json", "竞赛列表")
-
-        # 3. 初始化/清零 知识点和能力分数，准备重算
-        for k in user["knowledge"]: user["knowledge"][k] = 0.0
-        for s in user["skills"]: user["skills"][s] = 0.0
-        
-        # 4. --- 计算课程贡献 (仅 Knowledge) ---
-        total_credits = 0.0
-        total_grade_points = 0.0
-
-        for c_done in user["academic_progress"]["completed_courses"]:
-            name = c_done["name"]
-            gpa = float(c_done.get("grade", 0))
-            if name in course_lookup:
-                info = course_lookup[name]
-                creds = float(info.get("credits", 0))
-                total_credits += creds
-                total_grade_points += creds * gpa
-                
-                # 更新知识树分数：维度分 * 学分 * 绩点
-                if "knowledge" in info:
-                    for kd, base in info["knowledge"].items():
-                        if kd in user["knowledge"]:
-                            user["knowledge"][kd] += round(base * creds * gpa, 2)
-
-        # 5. --- 计算科研贡献 (仅 Skills) ---
-        # 逻辑：直接累加科研库中定义的 skills 基础分
-        for r_done in user["academic_progress"]["research_done"]:
-            name = r_done["name"]
-            if name in research_lookup:
-                info = research_lookup[name]
-                if "skills" in info:
-                    for sd, val in info["skills"].items():
-                        if sd in user["skills"]:
-                            user["skills"][sd] += float(val)
-
-        # 6. --- 计算竞赛贡献 (仅 Skills) ---
-        # 逻辑：直接累加竞赛库中定义的 skills 基础分 (忽略获奖情况)
-        for ct_done in user["academic_progress"]["competitions_done"]:
-            name = ct_done["name"]
-            if name in contest_lookup:
-                info = contest_lookup[name]
-                if "skills" in info:
-                    for sd, val in info["skills"].items():
-                        if sd in user["skills"]:
-                            user["skills"][sd] += float(val)
-
-        # 7. 更新 remaining_tasks (必修课与个性化选修课学分缺口)
-        if "remaining_tasks" not in user:
-            user["remaining_tasks"] = {"must_required_courses": [], "optional_course_gap": []}
-
-        # 必修课：已完成且属于必修类别时，从清单中移除
-        required_categories = set()
-        elective_subcategory_map = {}
-        major_name = user.get("profile", {}).get("major")
-        school_name = user.get("profile", {}).get("school")
-        courses_data = get_db_data("courses.json")
-        for college in courses_data.get("学院列表", []):
-            if college.get("学院名称") == school_name:
-                for major in college.get("专业列表", []):
-                    if major.get("专业名称") == major_name:
-                        required_categories = set(major.get("必修课类别列表", []))
-                        for item in major.get("个性化选修课类别从属", []):
-                            parent = item.get("category")
-                            for sub in item.get("subcategories", []):
-                                elective_subcategory_map[sub] = parent
-                        break
-
-        completed_names = {c.get("name") for c in user["academic_progress"].get("completed_courses", []) if c.get("name")}
-        must_required = user["remaining_tasks"].get("must_required_courses", [])
-        if required_categories and must_required:
-            user["remaining_tasks"]["must_required_courses"] = [
-                item for item in must_required
-                if not (
-                    item.get("name") in completed_names
-                    and course_lookup.get(item.get("name"), {}).get("category") in required_categories
-                )
-            ]
-
-        # 个性化选修：根据课程所属类别匹配课程要求类别，course_gap 逐门课程递减，最低不小于 0
-        optional_gaps = user["remaining_tasks"].get("optional_course_gap", [])
-
-        def split_requirement_categories(category_text):
-            parts = [p.strip() for p in category_text.split("/") if p.strip()]
-            return parts
+        # 在存储后端的单条记录事务中完成读-改-写，避免并发会话互相覆盖
+        return get_user_store().update(user_id, lambda user: _recompute_progress(user, payload))
+    except Exception as e:
+        print(f"Update Error: {e}")
+        return False
 
-        for c_done in user["academic_progress"].get("completed_courses", []):
-            name = c_done.get("name")
-            if not name or name not in course_lookup:
-                continue
-            course_info = course_lookup[name]
-            course_category = course_info.get("category")
-            if not course_category:
+def _apply_completed_delta(user, courses, research, competitions):
+    """
+    只把新增的修读记录计入用户分值（原地修改 user）
+    已存在的同名条目视为重复提交：内容相同则跳过，课程绩点变化时只修正差值
+    """
+    progress = user.setdefault("academic_progress", {})
+    remaining = user.setdefault("remaining_tasks", {"must_required_courses": [], "optional_course_gap": []})
+    catalog_index = get_catalog_index()
+    course_lookup = catalog_index.courses
+    major_catalog = catalog_index.major(
+        user.get("profile", {}).get("school"), user.get("profile", {}).get("major")
+    )
+    required_categories = major_catalog.required_categories if major_catalog else set()
+
+    def knowledge_terms(info, gpa):
+        creds = float(info.get("credits", 0))
+        return {
+            kd: knowledge_term(base, creds, gpa)
+            for kd, base in info.get("knowledge", {}).items() if kd in user["knowledge"]
+        }
+
+    # 1. 课程 -> knowledge、学分、必修清单与个性化选修缺口
+    completed = progress.setdefault("completed_courses", [])
+    positions = {c.get("name"): i for i, c in enumerate(completed)}
+    total_credits = float(user.get("total_credits", 0.0))
+    # 学分绩点和随记录保存，新增课程按修读顺序累加，与从零重算的结果逐位一致
+    # 旧记录没有该字段、或有课程绩点被修改时才按全部已修课程重新求和
+    total_grade_points = user.get("total_grade_points")
+    regraded = total_grade_points is None
+    for c_new in _deduplicate(courses):
+        name = c_new["name"]
+        info = course_lookup.get(name)
+        if name in positions:
+            c_old = completed[positions[name]]
+            if c_old == c_new:
                 continue
-
-            for gap_item in optional_gaps:
-                req_category = gap_item.get("category", "")
-                if not req_category:
-                    continue
-                req_parts = split_requirement_categories(req_category)
+            completed[positions[name]] = c_new
+            # 重复提交但绩点变化：撤销旧贡献再计入新贡献，学分与缺口不变
+            if info:
+                regraded = True
+                for kd, value in knowledge_terms(info, float(c_old.get("grade", 0))).items():
+                    user["knowledge"][kd] -= value
+                for kd, value in knowledge_terms(info, float(c_new.get("grade", 0))).items():
+                    user["knowledge"][kd] += value
+            continue
+
+        positions[name] = len(completed)
+        completed.append(c_new)
+        if not info:
+            continue
+        creds = float(info.get("credits", 0))
+        total_credits += creds
+        if not regraded:
+            total_grade_points += creds * float(c_new.get("grade", 0))
+        for kd, value in knowledge_terms(info, float(c_new.get("grade", 0))).items():
+            user["knowledge"][kd] += value
+
+        if info.get("category") in required_categories:
+            remaining["must_required_courses"] = [
+                item for item in remaining.get("must_required_courses", []) if item.get("name") != name
+            ]
+        course_category = info.get("category")
+        if course_category:
+            for gap_item in remaining.get("optional_course_gap", []):
+                req_parts = [p.strip() for p in gap_item.get("category", "").split("/") if p.strip()]
                 if course_category in req_parts:
-                    current_gap = int(gap_item.get("course_gap", 0))
-                    gap_item["course_gap"] = max(0, current_gap - 1)
+                    gap_item["course_gap"] = max(0, int(gap_item.get("course_gap", 0)) - 1)
                     break
 
-        user["remaining_tasks"]["optional_course_gap"] = optional_gaps
-
-        # 8. 更新汇总统计字段 (GPA & 总学分)
-        user["total_credits"] = total_credits
-        user["average_grades"] = round(total_grade_points / total_credits, 2) if total_credits > 0 else 0.0
+    # 2. 科研/竞赛 -> skills（同名条目只更新记录内容，不重复加分）
+    for field, items, lookup in (
+        ("research_done", research, catalog_index.research),
+        ("competitions_done", competitions, catalog_index.contests),
+    ):
+        done = progress.setdefault(field, [])
+        done_positions = {item.get("name"): i for i, item in enumerate(done)}
+        for item in _deduplicate(items):
+            if item["name"] in done_positions:
+                done[done_positions[item["name"]]] = item
+                continue
+            done_positions[item["name"]] = len(done)
+            done.append(item)
+            info = lookup.get(item["name"])
+            if info:
+                for sd, val in info.get("skills", {}).items():
+                    if sd in user["skills"]:
+                        user["skills"][sd] += float(val)
+
+    # 3. 汇总统计字段
+    if regraded:
+        total_grade_points = 0.0
+        for c_done in completed:
+            info = course_lookup.get(c_done.get("name"))
+            if info:
+                total_grade_points += float(info.get("credits", 0)) * float(c_done.get("grade", 0))
+    user["total_credits"] = total_credits
+    user["total_grade_points"] = total_grade_points
+    user["average_grades"] = round(total_grade_points / total_credits, 2) if total_credits > 0 else 0.0
+
+def add_completed_items(user_id, courses=(), research=(), competitions=(), full_recompute=False):
+    """
+    增量追加修读记录，只按新增条目更新 knowledge、skills、学分、绩点与 remaining_tasks
+    同名条目重复提交不会重复计分；full_recompute=True 时合并记录后从零重算
+    """
+    def apply(user):
+        if full_recompute:
+            progress = user.get("academic_progress", {})
+            # 重算前把必修清单与选修缺口恢复为专业模板，避免已计入的课程被再次扣减
+            profile = user.get("profile", {})
+            major_catalog = get_catalog_index().major(profile.get("school"), profile.get("major"))
+            if major_catalog:
+                user["remaining_tasks"] = thaw(major_catalog.user_template["remaining_tasks"])
+            _recompute_progress(user, {
+                "courses": progress.get("completed_courses", []) + list(courses),
+                "research": progress.get("research_done", []) + list(research),
+                "competitions": progress.get("competitions_done", []) + list(competitions),
+            })
+        else:
+            _apply_completed_delta(user, courses, research, competitions)
 
-        # 9. 保存回 JSON
-        users_all[user_id] = user
-        with open(os.path.join(DB_DIR, "users.json"), "w", encoding="utf-8") as f:
-            json.dump(users_all, f, ensure_ascii=False, indent=2)
-        return True
+    try:
+        return get_user_store().update(user_id, apply)
     except Exception as e:
         print(f"Update Error: {e}")
         return False
-    
+
 
 def update_current_semester(user_id):
-    users_all = get_db_data("users.json")
-    user = users_all.get(user_id)
+    store = get_user_store()
+    user = store.get(user_id)
     if not user:
         return False
 
@@ -342,19 +451,18 @@ def update_current_semester(user_id):
     elif current_semester > 8:
         current_semester = 8
 
-    if "academic_progress" not in user:
-        user["academic_progress"] = {}
-    user["academic_progress"]["current_semester"] = int(current_semester)
+    # 学期未变化时不写库
+    if user.get("academic_progress", {}).get("current_semester") == int(current_semester):
+        return current_semester
 
-    users_all[user_id] = user
-    with open(os.path.join(DB_DIR, "users.json"), "w", encoding="utf-8") as f:
-        json.dump(users_all, f, ensure_ascii=False, indent=2)
+    def set_semester(record):
+        record.setdefault("academic_progress", {})["current_semester"] = int(current_semester)
 
+    store.update(user_id, set_semester)
     return current_semester
 
 def graduate_warning(user_id):
-    users_all = get_db_data("users.json")
-    user = users_all.get(user_id)
+    user = get_user(user_id)
     if not user:
         return [False]
 
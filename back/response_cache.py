@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from derived_index import record_digest
+
+# 规划回复的本地缓存有效期（秒）；0 表示不缓存，每次都请求 LLM
+RESPONSE_CACHE_TTL = float(os.environ.get("PLAN_RESPONSE_CACHE_TTL", "0"))
+# 最多缓存的回复数，超出时淘汰最久未用的
+RESPONSE_CACHE_SIZE = int(os.environ.get("PLAN_RESPONSE_CACHE_SIZE", "512"))
+# 指纹只覆盖影响规划结果的用户字段（不含点赞数等）
+PROGRESS_FIELDS = ("profile", "academic_progress", "remaining_tasks")
+
+
+def normalize_demand(demand):
+    """
+    Canonical form of a demand for cache lookups: NFKC, lowercase, without
+    whitespace and punctuation ("本学期应该选什么课？" == "本学期 应该选什么课").
+    """
+    text = unicodedata.normalize("NFKC", demand or "").lower()
+    return "".join(ch for ch in text if not ch.isspace() and not unicodedata.category(ch).startswith("P"))
+
+
+def progress_fingerprint(user):
+    """Fingerprint of the parts of a user record a plan depends on."""
+    return record_digest(*(user.get(field) for field in PROGRESS_FIELDS))
+
+
+class ResponseCache:
+    """
+    In-process LRU of final LLM replies with a time-to-live.
+
+    Keys are built by `key`: the normalized demand, the user's progress
+    fingerprint, the catalog version and the caller's settings, so a reply
+    is reused only while none of them changed.
+    """
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, size=RESPONSE_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.size > 0
+
+    @staticmethod
+    def key(demand, user, catalog_version, settings=()):
+        return (normalize_demand(demand), progress_fingerprint(user), catalog_version, tuple(settings))
+
+    def get(self, key):
+        """The cached reply of `key`, or None if absent or expired."""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, response):
+        if not self.enabled or not response:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide ResponseCache of plan replies."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
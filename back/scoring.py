@@ -0,0 +1,263 @@
+import argparse
+import threading
+
+import numpy as np
+
+from catalog_index import get_catalog_index
+from user_store import get_user_store
+
+# 重算时一次处理的用户数
+DEFAULT_BATCH_SIZE = 512
+# 新旧分值相差不超过该值时视为未变化，不写库
+SCORE_TOLERANCE = 1e-9
+# Dekker 拆分常数 2^27 + 1
+_SPLITTER = 134217729.0
+
+
+def round2(values):
+    """
+    Elementwise round(value, 2) with Python's semantics, as used by
+    register.knowledge_term.
+
+    np.round(values, 2) rounds values * 100, which is itself rounded, so it
+    disagrees with round() on some inputs (e.g. 1.005). Here the rounding
+    error of values * 100 is recovered exactly (Dekker's product) and the
+    exact value is rounded half to even; dividing the integer by 100 then
+    gives the same double as round().
+    """
+    scaled = values * 100.0
+    split = values * _SPLITTER
+    high = split - (split - values)
+    low = values - high
+    # scaled + error == values * 100 exactly
+    error = (high * 100.0 - scaled) + low * 100.0
+    floor = np.floor(scaled)
+    excess = ((scaled - floor) - 0.5) + error
+    up = (excess > 0) | ((excess == 0) & (np.fmod(floor, 2) != 0))
+    return (floor + up) / 100.0
+
+
+class MajorScorer:
+    """
+    Score matrices for one knowledge/skill layout (i.e. one major).
+
+    - `course_knowledge`: course x knowledge, base score (credits in `credits`)
+    - `activity_skills`: (research + contests) x skills, base score
+
+    Rows cover every course/research/contest of the catalog, like the global
+    name lookups used by update_user_progress; columns follow the user's own
+    knowledge/skill keys, so dimensions outside the layout are ignored.
+    """
+
+    def __init__(self, catalog_index, knowledge_dims, skill_dims):
+        self.knowledge_dims = knowledge_dims
+        self.skill_dims = skill_dims
+
+        course_items = list(catalog_index.courses.items())
+        self.course_rows = {name: row for row, (name, _) in enumerate(course_items)}
+        self.credits = np.array([float(info.get("credits", 0)) for _, info in course_items], dtype=np.float64)
+        self.course_knowledge = np.array(
+            [[info.get("knowledge", {}).get(k, 0) for k in knowledge_dims] for _, info in course_items],
+            dtype=np.float64,
+        ).reshape(len(course_items), len(knowledge_dims))
+
+        # 科研与竞赛共用一个活动矩阵，竞赛行排在科研之后
+        activities = list(catalog_index.research.items())
+        self.research_rows = {name: row for row, (name, _) in enumerate(activities)}
+        offset = len(activities)
+        self.contest_rows = {name: offset + row for row, name in enumerate(catalog_index.contests)}
+        activities += list(catalog_index.contests.items())
+        self.activity_skills = np.array(
+            [[float(info.get("skills", {}).get(s, 0)) for s in skill_dims] for _, info in activities],
+            dtype=np.float64,
+        ).reshape(len(activities), len(skill_dims))
+
+    def score_batch(self, progresses):
+        """
+        Compute scores for several users that share this layout.
+
+        Args:
+            progresses (list): The users' academic_progress dicts.
+
+        Returns:
+            tuple: (knowledge, skills, total_credits, grade_points, average_grades)
+            arrays, one row/entry per user.
+        """
+        batch = len(progresses)
+        # (用户, 课程, 绩点) 三元组，按修读记录顺序排列
+        pair_users, pair_courses, pair_grades = [], [], []
+        activity_counts = np.zeros((batch, self.activity_skills.shape[0]), dtype=np.float64)
+        for position, progress in enumerate(progresses):
+            for c_done in progress.get("completed_courses", []):
+                row = self.course_rows.get(c_done["name"])
+                if row is None:
+                    continue
+                pair_users.append(position)
+                pair_courses.append(row)
+                pair_grades.append(float(c_done.get("grade", 0)))
+            for r_done in progress.get("research_done", []):
+                row = self.research_rows.get(r_done["name"])
+                if row is not None:
+                    activity_counts[position, row] += 1.0
+            for ct_done in progress.get("competitions_done", []):
+                row = self.contest_rows.get(ct_done["name"])
+                if row is not None:
+                    activity_counts[position, row] += 1.0
+
+        pair_users = np.array(pair_users, dtype=np.intp)
+        pair_courses = np.array(pair_courses, dtype=np.intp)
+        pair_grades = np.array(pair_grades, dtype=np.float64)
+
+        # 知识树：每门课的贡献 维度分 * 学分 * 绩点 按 knowledge_term 的方式取整，再按修读顺序累加
+        knowledge = np.zeros((batch, len(self.knowledge_dims)), dtype=np.float64)
+        terms = round2(self.course_knowledge[pair_courses] * self.credits[pair_courses, None] * pair_grades[:, None])
+        np.add.at(knowledge, pair_users, terms)
+
+        # 雷达图：科研/竞赛次数向量与活动矩阵相乘
+        skills = activity_counts @ self.activity_skills
+
+        total_credits = np.zeros(batch, dtype=np.float64)
+        grade_points = np.zeros(batch, dtype=np.float64)
+        np.add.at(total_credits, pair_users, self.credits[pair_courses])
+        np.add.at(grade_points, pair_users, self.credits[pair_courses] * pair_grades)
+        average_grades = [
+            round(points / credits, 2) if credits > 0 else 0.0
+            for points, credits in zip(grade_points.tolist(), total_credits.tolist())
+        ]
+        return knowledge, skills, total_credits, grade_points, np.array(average_grades, dtype=np.float64)
+
+
+_scorers = {}
+_scorers_lock = threading.Lock()
+
+
+def get_scorer(knowledge_dims, skill_dims):
+    """Return the MajorScorer of a knowledge/skill layout for the current catalog version."""
+    catalog_index = get_catalog_index()
+    key = (tuple(knowledge_dims), tuple(skill_dims))
+    with _scorers_lock:
+        entry = _scorers.get(key)
+        if entry is None or entry[0] != catalog_index.version:
+            entry = _scorers[key] = (catalog_index.version, MajorScorer(catalog_index, *key))
+        return entry[1]
+
+
+def _layout(user):
+    return tuple(user.get("knowledge", {})), tuple(user.get("skills", {}))
+
+
+def _scores_to_fields(scorer, knowledge, skills, total_credits, grade_points, average_grades):
+    return {
+        "knowledge": dict(zip(scorer.knowledge_dims, knowledge.tolist())),
+        "skills": dict(zip(scorer.skill_dims, skills.tolist())),
+        "total_credits": float(total_credits),
+        "total_grade_points": float(grade_points),
+        "average_grades": float(average_grades),
+    }
+
+
+def score_user(user):
+    """
+    Compute the knowledge/skill scores and credit statistics of one user.
+
+    Args:
+        user (dict): The user record (users.json shape).
+
+    Returns:
+        dict: knowledge, skills, total_credits, total_grade_points and average_grades.
+    """
+    scorer = get_scorer(*_layout(user))
+    knowledge, skills, credits, points, grades = scorer.score_batch([user.get("academic_progress", {})])
+    return _scores_to_fields(scorer, knowledge[0], skills[0], credits[0], points[0], grades[0])
+
+
+def _changed(user, fields):
+    for key in ("knowledge", "skills"):
+        old = user.get(key, {})
+        if any(abs(old.get(k, 0.0) - v) > SCORE_TOLERANCE for k, v in fields[key].items()):
+            return True
+    return any(abs(user.get(key, 0.0) - fields[key]) > SCORE_TOLERANCE for key in ("total_credits", "average_grades"))
+
+
+def _rescore_setter(progress, fields):
+    def apply(record):
+        # 读取快照后若修读记录已被修改，则按最新记录单独重算
+        current = record.get("academic_progress", {})
+        values = fields if current == progress else score_user(record)
+        record.update(values)
+    return apply
+
+
+def _batch_mutators(batch):
+    """Score one batch and return user_id -> mutator for the users whose scores changed."""
+    groups = {}
+    for user_id, user in batch:
+        groups.setdefault(_layout(user), []).append((user_id, user))
+
+    mutators = {}
+    for layout, members in groups.items():
+        scorer = get_scorer(*layout)
+        progresses = [user.get("academic_progress", {}) for _, user in members]
+        knowledge, skills, credits, points, grades = scorer.score_batch(progresses)
+        for position, (user_id, user) in enumerate(members):
+            fields = _scores_to_fields(
+                scorer, knowledge[position], skills[position], credits[position], points[position], grades[position]
+            )
+            if _changed(user, fields):
+                mutators[user_id] = _rescore_setter(progresses[position], fields)
+    return mutators
+
+
+def rescore_all_users(batch_size=DEFAULT_BATCH_SIZE, dry_run=False, progress=None):
+    """
+    Recompute knowledge/skills, total credits and GPA of every stored user
+    from the current catalog, e.g. after a knowledge weight in courses.json
+    was changed.
+
+    Args:
+        batch_size (int): Users scored (and written) per batch.
+        dry_run (bool): Only count the users that would change.
+        progress (callable): Optional callback(scanned, updated) after each batch.
+
+    Returns:
+        dict: {"scanned": int, "updated": int}
+    """
+    store = get_user_store()
+    scanned, updated = 0, 0
+    batch = []
+
+    def flush():
+        nonlocal updated
+        mutators = _batch_mutators(batch)
+        if dry_run:
+            updated += len(mutators)
+        elif mutators:
+            updated += len(store.update_many(mutators))
+        batch.clear()
+        if progress:
+            progress(scanned, updated)
+
+    for user_id, user in store.items():
+        batch.append((user_id, user))
+        scanned += 1
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return {"scanned": scanned, "updated": updated}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score all users against the current catalog.")
+    parser.add_argument("action", choices=["rescore"])
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="only report how many users would change")
+    args = parser.parse_args()
+
+    result = rescore_all_users(
+        batch_size=args.batch_size,
+        dry_run=args.dry_run,
+        progress=lambda scanned, updated: print(f"  scanned {scanned}, changed {updated}"),
+    )
+    verb = "would change" if args.dry_run else "updated"
+    print(f"rescored {result['scanned']} users, {verb} {result['updated']}")
@@ -0,0 +1,238 @@
+import argparse
+import copy
+import csv
+import json
+import sys
+import time
+
+from catalog_index import get_catalog_index
+from register import _apply_completed_delta
+from user_store import get_user_store
+
+# 每批写入的用户数（每批一次存储事务/文件写入）
+DEFAULT_BATCH_SIZE = 500
+# 行类型 -> (add_completed_items 中的参数, 目录索引中的名称表)
+ROW_KINDS = {
+    "course": ("courses", "courses"),
+    "research": ("research", "research"),
+    "competition": ("competitions", "contests"),
+}
+
+
+class ImportReport:
+    """Counters and per-row errors of one import run."""
+
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.users = 0
+        self.errors = []
+        self.started = time.monotonic()
+
+    def error(self, line, message):
+        self.errors.append({"line": line, "error": message})
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "users": self.users,
+            "errors": self.errors,
+            "seconds": round(self.elapsed, 3),
+        }
+
+
+def read_rows(path, fmt=None):
+    """
+    Stream rows of a CSV (with header) or JSONL transcript file.
+
+    Yields:
+        tuple: (line number, dict) — dict is None for a line that is not valid JSON.
+    """
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if fmt == "csv":
+            for line, row in enumerate(csv.DictReader(f), start=2):
+                yield line, row
+        else:
+            for line, text in enumerate(f, start=1):
+                if not text.strip():
+                    continue
+                try:
+                    row = json.loads(text)
+                except json.JSONDecodeError:
+                    row = None
+                yield line, row if isinstance(row, dict) else None
+
+
+def parse_row(row, catalog_index):
+    """
+    Turn one transcript row into (user_id, add_completed_items argument, item).
+
+    Columns: student_id, course (or name), grade, semester; optional `kind`
+    (course / research / competition) and `award` for competitions.
+
+    Raises:
+        ValueError: If the row is incomplete or names an unknown item.
+    """
+    if row is None:
+        raise ValueError("无法解析的行")
+    student_id = str(row.get("student_id") or "").strip()
+    if not student_id.isdigit():
+        raise ValueError(f"学号无效: {student_id!r}")
+    kind = (row.get("kind") or "course").strip()
+    if kind not in ROW_KINDS:
+        raise ValueError(f"未知的类型: {kind!r}")
+    name = str(row.get("course") or row.get("name") or "").strip()
+    argument, lookup_name = ROW_KINDS[kind]
+    if name not in getattr(catalog_index, lookup_name):
+        raise ValueError(f"目录中不存在: {name!r}")
+
+    semester = row.get("semester")
+    try:
+        semester = int(semester) if semester not in (None, "") else None
+    except (TypeError, ValueError):
+        raise ValueError(f"学期无效: {semester!r}")
+    if semester is not None and not 1 <= semester <= 8:
+        raise ValueError(f"学期超出范围: {semester}")
+
+    if kind == "course":
+        try:
+            grade = float(row.get("grade"))
+        except (TypeError, ValueError):
+            raise ValueError(f"绩点无效: {row.get('grade')!r}")
+        if not 0.0 <= grade <= 4.0:
+            raise ValueError(f"绩点超出范围: {grade}")
+        item = {"name": name, "grade": grade, "semester": semester or 1}
+    elif kind == "research":
+        item = {"name": name, "complete_semester": semester or 1}
+    else:
+        item = {"name": name, "award": (row.get("award") or "参与奖").strip(), "complete_semester": semester or 1}
+    return f"user_{student_id.zfill(10)}", argument, item
+
+
+def _apply_rows(user, rows):
+    items = {"courses": [], "research": [], "competitions": []}
+    for _, argument, item in rows:
+        items[argument].append(item)
+    _apply_completed_delta(user, items["courses"], items["research"], items["competitions"])
+
+
+def _delta_mutator(rows, failures):
+    """
+    Mutator applying one user's rows of a batch; never raises.
+
+    The rows are scored on a copy of the record. If that fails they are
+    retried one at a time, so only the rows that raise are dropped; their
+    line -> message is recorded in `failures` and the rest of the batch is
+    still written.
+    """
+    def apply(user):
+        updated = copy.deepcopy(user)
+        try:
+            _apply_rows(updated, rows)
+        except Exception:
+            updated = copy.deepcopy(user)
+            for row in rows:
+                trial = copy.deepcopy(updated)
+                try:
+                    _apply_rows(trial, [row])
+                except Exception as e:
+                    failures[row[0]] = f"计分失败: {type(e).__name__}: {e}"
+                    continue
+                updated = trial
+        user.clear()
+        user.update(updated)
+    return apply
+
+
+def import_transcripts(path, batch_size=DEFAULT_BATCH_SIZE, fmt=None, progress=None):
+    """
+    Import a registrar export into the user store.
+
+    Rows are streamed and grouped per user; every `batch_size` users the
+    accumulated items are applied with the incremental scoring of
+    add_completed_items in a single store transaction. A student may appear
+    in several batches (the file does not need to be sorted). A row that
+    fails validation or scoring is reported as an error and skipped; the
+    other rows of its batch are still imported.
+
+    Args:
+        path (str): CSV or JSONL file.
+        batch_size (int): Users per store write.
+        fmt (str): "csv" or "jsonl"; guessed from the extension by default.
+        progress (callable): Optional callback(ImportReport) after each batch.
+
+    Returns:
+        ImportReport: Counters, elapsed time and per-row errors.
+    """
+    store = get_user_store()
+    catalog_index = get_catalog_index()
+    report = ImportReport()
+    pending = {}
+
+    def flush():
+        failures = {}
+        mutators = {user_id: _delta_mutator(rows, failures) for user_id, rows in pending.items()}
+        updated = set(store.update_many(mutators))
+        for user_id, rows in pending.items():
+            applied = 0
+            for line, _, _ in rows:
+                if user_id not in updated:
+                    report.error(line, f"学号未注册: {user_id}")
+                elif line in failures:
+                    report.error(line, failures[line])
+                else:
+                    applied += 1
+            report.imported += applied
+            report.users += applied > 0
+        pending.clear()
+        if progress:
+            progress(report)
+
+    for line, row in read_rows(path, fmt):
+        report.rows += 1
+        try:
+            user_id, argument, item = parse_row(row, catalog_index)
+        except ValueError as e:
+            report.error(line, str(e))
+            continue
+        pending.setdefault(user_id, []).append((line, argument, item))
+        if len(pending) >= batch_size:
+            flush()
+    if pending:
+        flush()
+    report.errors.sort(key=lambda error: error["line"])
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-import completed courses/research/competitions from a registrar export.")
+    parser.add_argument("path", help="CSV (with header) or JSONL file")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--errors", help="write the rejected rows to this JSONL file")
+    args = parser.parse_args()
+
+    def show_progress(report):
+        print(f"  {report.rows} rows, {report.users} users, {len(report.errors)} errors, {report.rows_per_second:.0f} rows/s")
+
+    result = import_transcripts(args.path, batch_size=args.batch_size, fmt=args.format, progress=show_progress)
+    print(f"imported {result.imported}/{result.rows} rows for {result.users} user updates in {result.elapsed:.1f}s")
+    if args.errors:
+        with open(args.errors, "w", encoding="utf-8") as f:
+            for error in result.errors:
+                f.write(json.dumps(error, ensure_ascii=False) + "\n")
+    else:
+        for error in result.errors[:20]:
+            print(f"  line {error['line']}: {error['error']}", file=sys.stderr)
+        if len(result.errors) > 20:
+            print(f"  ... {len(result.errors) - 20} more errors", file=sys.stderr)
@@ -0,0 +1,372 @@
+import math
+import os
+import sys
+import threading
+from array import array
+
+from catalog_index import get_catalog_index
+from user_store import USER_FIELDS
+
+# 各类修读记录：(academic_progress 中的字段, 名称表, [(字段, 列类型), ...])
+# 列类型：d -> float 列，h -> int 列，s -> 驻留字符串 ID 列
+ITEM_SCHEMAS = {
+    "courses": ("completed_courses", "courses", (("grade", "d"), ("semester", "h"))),
+    "research": ("research_done", "research", (("complete_semester", "h"),)),
+    "contests": ("competitions_done", "contests", (("award", "s"), ("complete_semester", "h"))),
+}
+# 缺失或类型不符的值在列中记为哨兵，原值放入该条目的 extras
+_MISSING = {"d": math.nan, "h": -32768, "i": -1, "s": -1}
+# 原记录中不存在的字段
+_MISSING_FIELD = object()
+# 共享池最多保留的子结构数，超出时清空重建（已构建的用户不受影响，只是不再与之后的用户共享）
+SHARE_POOL_SIZE = int(os.environ.get("USER_MODEL_SHARE_POOL_SIZE", "100000"))
+
+
+class NameTable:
+    """
+    Append-only table interning names to dense integer IDs.
+
+    IDs are only meaningful inside the current process; catalog names are
+    registered first (in catalog order), names that are not in the catalog
+    are appended, so any name round-trips.
+    """
+
+    __slots__ = ("ids", "names", "_lock")
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+        self._lock = threading.Lock()
+
+    def intern(self, name):
+        """Return the ID of `name`, registering it if needed."""
+        name_id = self.ids.get(name)
+        if name_id is None:
+            with self._lock:
+                name_id = self.ids.get(name)
+                if name_id is None:
+                    name_id = self.ids[name] = len(self.names)
+                    self.names.append(sys.intern(name))
+        return name_id
+
+    def name(self, name_id):
+        """Return the name registered under `name_id`."""
+        return self.names[name_id]
+
+    def __len__(self):
+        return len(self.names)
+
+
+# 进程级名称表：课程/科研/竞赛名称与竞赛奖项
+NAME_TABLES = {kind: NameTable() for kind in ("courses", "research", "contests", "awards")}
+_dims_pool = {}
+_seed_lock = threading.Lock()
+_seeded_version = [None]
+
+
+def _seed_from_catalog():
+    """Register catalog names (and per-major dimension layouts) once per catalog version."""
+    catalog_index = get_catalog_index()
+    if _seeded_version[0] == catalog_index.version:
+        return
+    with _seed_lock:
+        for kind in ("courses", "research", "contests"):
+            table = NAME_TABLES[kind]
+            for name in getattr(catalog_index, kind):
+                table.intern(name)
+        for major_catalog in catalog_index.majors.values():
+            shared_dims(major_catalog.knowledge_tags)
+            shared_dims(major_catalog.skill_tags)
+            for awards in major_catalog.contest_awards.values():
+                for award in awards:
+                    NAME_TABLES["awards"].intern(award)
+        _seeded_version[0] = catalog_index.version
+
+
+def shared_dims(keys):
+    """Return the shared tuple object for a knowledge/skill dimension layout."""
+    keys = tuple(sys.intern(k) for k in keys)
+    dims = _dims_pool.get(keys)
+    if dims is None:
+        dims = _dims_pool.setdefault(keys, keys)
+    return dims
+
+
+def _is_float(value):
+    return type(value) is float and not math.isnan(value)
+
+
+def _is_int(value):
+    return type(value) is int and -32768 < value < 32768
+
+
+class ItemColumns:
+    """Completed courses/research/contests of one user, stored column-wise."""
+
+    __slots__ = ("kind", "ids", "columns", "extras")
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.ids = array("i")
+        self.columns = tuple(array("i" if code == "s" else code) for _, code in ITEM_SCHEMAS[kind][2])
+        # 条目下标 -> 无法放入列中的键值（如课程的 category），按需创建
+        self.extras = None
+
+    @classmethod
+    def from_list(cls, kind, items):
+        columns = cls(kind)
+        _, table_kind, fields = ITEM_SCHEMAS[kind]
+        table = NAME_TABLES[table_kind]
+        field_names = {field for field, _ in fields}
+        for position, item in enumerate(items):
+            extra = {}
+            name = item.get("name")
+            if isinstance(name, str):
+                columns.ids.append(table.intern(name))
+            else:
+                columns.ids.append(-1)
+                if "name" in item:
+                    extra["name"] = name
+            for (field, code), column in zip(fields, columns.columns):
+                value = item.get(field)
+                if code == "s" and isinstance(value, str):
+                    column.append(NAME_TABLES["awards"].intern(value))
+                elif (code == "d" and _is_float(value)) or (code == "h" and _is_int(value)):
+                    column.append(value)
+                else:
+                    column.append(_MISSING[code])
+                    if field in item:
+                        extra[field] = value
+            for key, value in item.items():
+                if key != "name" and key not in field_names:
+                    extra[key] = value
+            if extra:
+                if columns.extras is None:
+                    columns.extras = {}
+                columns.extras[position] = extra
+        return columns
+
+    def to_list(self):
+        _, table_kind, fields = ITEM_SCHEMAS[self.kind]
+        table = NAME_TABLES[table_kind]
+        items = []
+        for position, name_id in enumerate(self.ids):
+            extra = self.extras.get(position, {}) if self.extras else {}
+            item = {}
+            if name_id >= 0:
+                item["name"] = table.name(name_id)
+            elif "name" in extra:
+                item["name"] = extra["name"]
+            for (field, code), column in zip(fields, self.columns):
+                value = column[position]
+                if code == "d" and not math.isnan(value):
+                    item[field] = value
+                elif code == "h" and value != _MISSING["h"]:
+                    item[field] = value
+                elif code == "s" and value >= 0:
+                    item[field] = NAME_TABLES["awards"].name(value)
+                elif field in extra:
+                    item[field] = extra[field]
+            for key, value in extra.items():
+                if key not in item:
+                    item[key] = value
+            items.append(item)
+        return items
+
+    def names(self):
+        """Return the item names (IDs that could not be interned are skipped)."""
+        table = NAME_TABLES[ITEM_SCHEMAS[self.kind][1]]
+        return [table.name(name_id) for name_id in self.ids if name_id >= 0]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class DimensionVector:
+    """Knowledge or skill scores: a shared key layout plus a float array."""
+
+    __slots__ = ("dims", "values")
+
+    def __init__(self, dims, values):
+        self.dims = dims
+        self.values = values
+
+    @classmethod
+    def from_dict(cls, scores):
+        if all(type(v) is float for v in scores.values()):
+            return cls(shared_dims(scores), array("d", scores.values()))
+        # 含有非 float 的分值时保留原始字典，保证无损
+        return cls(None, dict(scores))
+
+    def to_dict(self):
+        if self.dims is None:
+            return dict(self.values)
+        return dict(zip(self.dims, self.values))
+
+    def get(self, key, default=0.0):
+        if self.dims is None:
+            return self.values.get(key, default)
+        try:
+            return self.values[self.dims.index(key)]
+        except ValueError:
+            return default
+
+
+class CompactUser:
+    """
+    Memory-compact form of one users.json record.
+
+    Names are interned to integer IDs, scores are float arrays sharing one
+    key layout per major, and the repeated catalog-derived sections
+    (remaining_tasks) are shared between users. `to_dict()` returns a record
+    equal to the one passed to `from_dict()`.
+    """
+
+    __slots__ = (
+        "user_id", "profile", "current_semester", "courses", "research", "contests",
+        "progress_extra", "remaining_tasks", "path_review", "knowledge", "skills",
+        "total_credits", "average_grades", "raw", "extra",
+    )
+
+    @classmethod
+    def from_dict(cls, user_id, record):
+        """
+        Build a CompactUser from a users.json record.
+
+        Args:
+            user_id (str): The user ID.
+            record (dict): The record in the users.json shape.
+
+        Returns:
+            CompactUser: The compact record.
+        """
+        _seed_from_catalog()
+        user = cls()
+        user.user_id = user_id
+        # raw：形状不符合预期、只能原样保存的标准字段；extra：标准字段以外的键
+        user.raw = {key: _MISSING_FIELD for key in USER_FIELDS if key not in record}
+        user.extra = {key: value for key, value in record.items() if key not in USER_FIELDS} or None
+
+        user.profile = _share(record.get("profile"))
+        user.current_semester = user.courses = user.research = user.contests = None
+        user.progress_extra = None
+        progress = record.get("academic_progress")
+        if isinstance(progress, dict):
+            progress = dict(progress)
+            user.current_semester = progress.pop("current_semester", _MISSING_FIELD)
+            for kind, (field, _, _) in ITEM_SCHEMAS.items():
+                if isinstance(progress.get(field), list):
+                    setattr(user, kind, ItemColumns.from_list(kind, progress.pop(field)))
+            user.progress_extra = progress or None
+        elif "academic_progress" in record:
+            user.raw["academic_progress"] = progress
+
+        user.remaining_tasks = _share(record.get("remaining_tasks"))
+        user.path_review = record.get("path_review")
+        user.knowledge = user.skills = None
+        for key in ("knowledge", "skills"):
+            if isinstance(record.get(key), dict):
+                setattr(user, key, DimensionVector.from_dict(record[key]))
+            elif key in record:
+                user.raw[key] = record[key]
+        user.total_credits = record.get("total_credits")
+        user.average_grades = record.get("average_grades")
+        user.raw = user.raw or None
+        return user
+
+    def to_dict(self):
+        """Return the record in the users.json shape."""
+        progress = {}
+        if self.current_semester is not _MISSING_FIELD:
+            progress["current_semester"] = self.current_semester
+        for kind, (field, _, _) in ITEM_SCHEMAS.items():
+            columns = getattr(self, kind)
+            if columns is not None:
+                progress[field] = columns.to_list()
+        progress.update(self.progress_extra or {})
+
+        record = {
+            "profile": _unshare(self.profile),
+            "academic_progress": progress,
+            "remaining_tasks": _unshare(self.remaining_tasks),
+            "path_review": self.path_review,
+            "knowledge": self.knowledge.to_dict() if self.knowledge is not None else None,
+            "skills": self.skills.to_dict() if self.skills is not None else None,
+            "total_credits": self.total_credits,
+            "average_grades": self.average_grades,
+        }
+        for key, value in (self.raw or {}).items():
+            if value is _MISSING_FIELD:
+                del record[key]
+            else:
+                record[key] = value
+        record.update(self.extra or {})
+        return record
+
+    def completed_course_names(self):
+        """Return the names of the completed courses."""
+        return self.courses.names() if self.courses is not None else []
+
+    def semester(self):
+        """Return the current semester as an int (0 if missing), like peer_match.current_semester."""
+        try:
+            return int(self.current_semester)
+        except (TypeError, ValueError):
+            return 0
+
+    def major_key(self):
+        """Return (school, major), like peer_match.major_key."""
+        profile = _unshare(self.profile)
+        if not isinstance(profile, dict):
+            return None, None
+        return profile.get("school"), profile.get("major")
+
+
+# 共享池：相同的子结构（如同专业用户的 remaining_tasks）只保留一份
+_share_pool = {}
+
+
+def _share(obj):
+    """Return an immutable, pooled representation of a JSON value."""
+    if isinstance(obj, str):
+        return sys.intern(obj)
+    if isinstance(obj, dict):
+        key = ("d", tuple((sys.intern(k) if isinstance(k, str) else k, _share(v)) for k, v in obj.items()))
+    elif isinstance(obj, list):
+        key = ("l", tuple(_share(v) for v in obj))
+    elif obj is None:
+        return None
+    else:
+        # 区分 1 / 1.0 / True，避免池中相等但类型不同的值互相替换
+        key = ("v", type(obj).__name__, obj)
+    pooled = _share_pool.get(key)
+    if pooled is None:
+        if len(_share_pool) >= SHARE_POOL_SIZE:
+            _share_pool.clear()
+        pooled = _share_pool.setdefault(key, key)
+    return pooled
+
+
+def _unshare(obj):
+    """Inverse of `_share()`: return plain dicts and lists."""
+    if not isinstance(obj, tuple):
+        return obj
+    if obj[0] == "d":
+        return {k: _unshare(v) for k, v in obj[1]}
+    if obj[0] == "l":
+        return [_unshare(v) for v in obj[1]]
+    return obj[2]
+
+
+def compact_users(users):
+    """
+    Convert a users mapping (as returned by get_db_data("users.json")) or an
+    iterable of (user_id, record) pairs into {user_id: CompactUser}.
+    """
+    items = users.items() if isinstance(users, dict) else users
+    return {user_id: CompactUser.from_dict(user_id, record) for user_id, record in items}
+
+
+def expand_users(compact):
+    """Convert {user_id: CompactUser} back to the users.json shape."""
+    return {user_id: user.to_dict() for user_id, user in compact.items()}
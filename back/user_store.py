@@ -0,0 +1,790 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+# 定义数据库目录
+DB_DIR = os.path.join(os.path.dirname(__file__), "..", "databases")
+USERS_JSON_PATH = os.path.join(DB_DIR, "users.json")
+USERS_SQLITE_PATH = os.path.join(DB_DIR, "users.sqlite3")
+USERS_SHARD_DIR = os.path.join(DB_DIR, "users")
+
+# 用户记录的顶层字段（与 users.json 中的顺序一致）
+USER_FIELDS = (
+    "profile", "academic_progress", "remaining_tasks", "path_review",
+    "knowledge", "skills", "total_credits", "average_grades"
+)
+_JSON_FIELDS = USER_FIELDS[:6]
+_SCALAR_FIELDS = USER_FIELDS[6:]
+
+logger = logging.getLogger(__name__)
+
+
+class UserStore:
+    """
+    Storage backend for user records.
+
+    A user record has exactly the shape of one value of users.json. All
+    writes go through per-record methods so a backend only touches the
+    affected rows; `update` is the read-modify-write primitive and is
+    atomic with respect to other writers of the same store.
+
+    Every committed write is reported to the change listeners registered
+    with `add_change_listener` (in this process only), while the writer
+    still holds the store's lock, so listeners see writes in commit order.
+    """
+
+    # 分片后端内部的子存储不单独通知，由分片后端统一通知
+    notify_changes = True
+
+    def _notify(self, changes):
+        if self.notify_changes and (changes is None or changes):
+            _notify_listeners(changes)
+
+    def get(self, user_id):
+        """Return the record of `user_id`, or None if it does not exist."""
+        raise NotImplementedError
+
+    def insert(self, user_id, record):
+        """Create a record. Returns False if `user_id` already exists."""
+        raise NotImplementedError
+
+    def insert_many(self, records):
+        """
+        Create several records in a single transaction.
+
+        Args:
+            records (dict): user_id -> record. Existing IDs are skipped.
+
+        Returns:
+            list: The user IDs that were created.
+        """
+        return [user_id for user_id, record in records.items() if self.insert(user_id, record)]
+
+    def update(self, user_id, mutator):
+        """
+        Atomically apply `mutator(record)` to one record and persist it.
+
+        Args:
+            user_id (str): The ID of the user to update.
+            mutator (callable): Mutates the record in place. If it raises,
+                nothing is written.
+
+        Returns:
+            bool: False if the user does not exist, True otherwise.
+        """
+        return bool(self.update_many({user_id: mutator}))
+
+    def update_many(self, mutators):
+        """
+        Apply several per-user mutators in a single transaction.
+
+        Args:
+            mutators (dict): user_id -> callable(record). Unknown IDs are skipped.
+
+        Returns:
+            list: The user IDs that were updated.
+        """
+        raise NotImplementedError
+
+    def delete(self, user_id):
+        """Delete a record. Returns False if `user_id` does not exist."""
+        raise NotImplementedError
+
+    def items(self):
+        """Iterate (user_id, record) pairs in insertion order."""
+        raise NotImplementedError
+
+    def signature(self):
+        """
+        Cheap fingerprint (stat() of the backing files) that changes with every
+        committed write, including writes by other processes; None if the
+        backend cannot tell.
+        """
+        return None
+
+    def load_all(self):
+        """Return every user as a dict in the users.json layout."""
+        return dict(self.items())
+
+    def import_json(self, path=USERS_JSON_PATH):
+        """Replace the store content with the users of a users.json file."""
+        raise NotImplementedError
+
+    def export_json(self, path=USERS_JSON_PATH):
+        """Write every user to `path` in the users.json layout."""
+        _write_json_atomic(path, self.load_all())
+
+
+_change_listeners = []
+
+
+def add_change_listener(listener):
+    """
+    Register `listener(changes)` to be called after every committed write.
+
+    `changes` maps user_id -> the new record, or None for a deleted user;
+    it is None itself when the whole store was replaced (import_json).
+    """
+    if listener not in _change_listeners:
+        _change_listeners.append(listener)
+
+
+def remove_change_listener(listener):
+    """Unregister a listener added with add_change_listener."""
+    if listener in _change_listeners:
+        _change_listeners.remove(listener)
+
+
+def _notify_listeners(changes):
+    for listener in list(_change_listeners):
+        try:
+            listener(changes)
+        except Exception:
+            # 监听者（如索引）出错不影响已提交的写入
+            logger.exception("User store listener failed")
+
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            users = json.load(f)
+        except json.JSONDecodeError:
+            raise ValueError(f"Error decoding {os.path.basename(path)} file.")
+    if not isinstance(users, dict):
+        raise ValueError(f"{os.path.basename(path)} must contain a JSON object.")
+    return users
+
+
+def _write_json_atomic(path, users):
+    # 先写临时文件再替换，避免写到一半时其他会话读到残缺的 JSON
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(users, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _dump_users(users):
+    """
+    Serialize users byte-for-byte like json.dump(indent=2) and return the
+    encoded document plus the (start, end) byte range of every record.
+    """
+    if not users:
+        return b"{}", {}
+    parts, offsets, pos = [b"{\n"], {}, 2
+    for i, (user_id, record) in enumerate(users.items()):
+        if i:
+            parts.append(b",\n")
+            pos += 2
+        head = f"  {json.dumps(user_id, ensure_ascii=False)}: ".encode("utf-8")
+        # 嵌套一层的缩进：记录内部的字符串不含原始换行，可直接整体右移两格
+        body = json.dumps(record, ensure_ascii=False, indent=2).replace("\n", "\n  ").encode("utf-8")
+        parts.append(head)
+        pos += len(head)
+        offsets[user_id] = (pos, pos + len(body))
+        parts.append(body)
+        pos += len(body)
+    parts.append(b"\n}")
+    return b"".join(parts), offsets
+
+
+def _scan_offsets(path):
+    """Find the byte range of every top-level record of an arbitrary users.json."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    text = raw.decode("utf-8")
+    decoder = json.JSONDecoder()
+    offsets = {}
+    # 字符位置 -> 字节位置（增量换算，整份文件只编码一次）
+    char_pos, byte_pos = 0, 0
+
+    def to_bytes(pos):
+        nonlocal char_pos, byte_pos
+        byte_pos += len(text[char_pos:pos].encode("utf-8"))
+        char_pos = pos
+        return byte_pos
+
+    def skip_ws(pos):
+        while pos < len(text) and text[pos] in " \t\r\n":
+            pos += 1
+        return pos
+
+    try:
+        pos = skip_ws(0)
+        if text[pos] != "{":
+            raise ValueError
+        pos = skip_ws(pos + 1)
+        while text[pos] != "}":
+            user_id, pos = json.decoder.scanstring(text, pos + 1)
+            pos = skip_ws(pos)
+            if text[pos] != ":":
+                raise ValueError
+            pos = skip_ws(pos + 1)
+            start = to_bytes(pos)
+            _, pos = decoder.raw_decode(text, pos)
+            offsets[user_id] = (start, to_bytes(pos))
+            pos = skip_ws(pos)
+            if text[pos] == ",":
+                pos = skip_ws(pos + 1)
+    except (ValueError, IndexError):
+        raise ValueError(f"Error decoding {os.path.basename(path)} file.")
+    return offsets
+
+
+def _signature(stat):
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class JsonUserStore(UserStore):
+    """
+    The original single-file users.json layout.
+
+    Every write still rewrites the whole file, but read-modify-write cycles
+    are serialized by a process-wide lock, so concurrent Streamlit sessions
+    no longer overwrite each other's changes.
+
+    Single-user reads do not parse the whole file: a sidecar index
+    (users.json.idx) maps each user_id to the byte range of its record, so
+    `get` is one seek and one small json.loads. The index is produced while
+    writing, and rebuilt by a scan only if users.json was edited externally.
+    """
+
+    _locks = {}
+    _locks_guard = threading.Lock()
+
+    def __init__(self, path=USERS_JSON_PATH):
+        self.path = os.path.abspath(path)
+        self.index_path = f"{self.path}.idx"
+        self._offsets = None
+        with JsonUserStore._locks_guard:
+            self._lock = JsonUserStore._locks.setdefault(self.path, threading.RLock())
+
+    def _write(self, users):
+        data, offsets = _dump_users(users)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+        self._save_index(_signature(os.stat(self.path)), offsets)
+
+    def _save_index(self, signature, offsets):
+        self._offsets = (signature, offsets)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"signature": signature, "offsets": offsets}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def _current_offsets(self):
+        """Return (signature, offsets) matching the current users.json, or None if it is missing."""
+        try:
+            signature = _signature(os.stat(self.path))
+        except FileNotFoundError:
+            return None
+        if self._offsets and self._offsets[0] == signature:
+            return self._offsets
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("signature") == signature:
+                self._offsets = (signature, saved["offsets"])
+                return self._offsets
+        except (OSError, ValueError):
+            pass
+        with self._lock:
+            self._save_index(signature, _scan_offsets(self.path))
+        return self._offsets
+
+    def get(self, user_id):
+        for _ in range(3):
+            current = self._current_offsets()
+            if current is None:
+                return None
+            signature, offsets = current
+            if user_id not in offsets:
+                return None
+            start, end = offsets[user_id]
+            with open(self.path, "rb") as f:
+                # 打开的文件若已被并发写入替换，则偏移量作废，重试
+                if _signature(os.fstat(f.fileno())) != signature:
+                    continue
+                f.seek(start)
+                return json.loads(f.read(end - start))
+        return _read_json(self.path).get(user_id)
+
+    def insert(self, user_id, record):
+        with self._lock:
+            users = _read_json(self.path)
+            if user_id in users:
+                return False
+            users[user_id] = record
+            self._write(users)
+            self._notify({user_id: record})
+        return True
+
+    def insert_many(self, records):
+        with self._lock:
+            users = _read_json(self.path)
+            inserted = []
+            for user_id, record in records.items():
+                if user_id in users:
+                    continue
+                users[user_id] = record
+                inserted.append(user_id)
+            if inserted:
+                self._write(users)
+            self._notify({user_id: users[user_id] for user_id in inserted})
+        return inserted
+
+    def update_many(self, mutators):
+        with self._lock:
+            users = _read_json(self.path)
+            updated = []
+            for user_id, mutator in mutators.items():
+                if user_id not in users:
+                    continue
+                mutator(users[user_id])
+                updated.append(user_id)
+            if updated:
+                self._write(users)
+            self._notify({user_id: users[user_id] for user_id in updated})
+        return updated
+
+    def delete(self, user_id):
+        with self._lock:
+            users = _read_json(self.path)
+            if user_id not in users:
+                return False
+            users.pop(user_id)
+            self._write(users)
+            self._notify({user_id: None})
+        return True
+
+    def items(self):
+        return iter(_read_json(self.path).items())
+
+    def signature(self):
+        try:
+            return tuple(_signature(os.stat(self.path)))
+        except FileNotFoundError:
+            return ()
+
+    def load_all(self):
+        return _read_json(self.path)
+
+    def import_json(self, path=USERS_JSON_PATH):
+        if os.path.abspath(path) == self.path:
+            return
+        with self._lock:
+            self._write(_read_json(path))
+            self._notify(None)
+
+
+class SqliteUserStore(UserStore):
+    """
+    SQLite backend in WAL mode: one row per user, one JSON column per
+    nested section of the record.
+
+    Reads and writes touch a single row, readers never block the writer,
+    and `update` runs inside `BEGIN IMMEDIATE` so concurrent sessions
+    cannot lose each other's changes. users.json remains the import/export
+    format; an empty database is seeded from it on first use.
+
+    Writers of one process are also serialized by a process-wide lock per
+    database, held until the change listeners have been notified.
+    """
+
+    _locks = {}
+    _locks_guard = threading.Lock()
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS users ("
+        " user_id TEXT PRIMARY KEY,"
+        + "".join(f" {field} TEXT," for field in _JSON_FIELDS)
+        + "".join(f" {field} REAL," for field in _SCALAR_FIELDS)
+        + " extra TEXT NOT NULL DEFAULT '{}'"
+        ")"
+    )
+    _COLUMNS = ("user_id",) + USER_FIELDS + ("extra",)
+
+    def __init__(self, path=USERS_SQLITE_PATH, seed_path=USERS_JSON_PATH):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        with SqliteUserStore._locks_guard:
+            self._lock = SqliteUserStore._locks.setdefault(self.path, threading.RLock())
+        conn = self._conn()
+        conn.execute(self._SCHEMA)
+        if seed_path and conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+            self.import_json(seed_path)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 每个线程（Streamlit 会话）持有独立连接；事务由我们显式控制
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_row(user_id, record):
+        row = [user_id]
+        for field in _JSON_FIELDS:
+            row.append(json.dumps(record[field], ensure_ascii=False) if field in record else None)
+        for field in _SCALAR_FIELDS:
+            row.append(record.get(field))
+        extra = {k: v for k, v in record.items() if k not in USER_FIELDS}
+        row.append(json.dumps(extra, ensure_ascii=False))
+        return row
+
+    @staticmethod
+    def _from_row(row):
+        record = {}
+        for field, value in zip(_JSON_FIELDS, row[1:7]):
+            if value is not None:
+                record[field] = json.loads(value)
+        for field, value in zip(_SCALAR_FIELDS, row[7:9]):
+            if value is not None:
+                record[field] = value
+        record.update(json.loads(row[9]))
+        return row[0], record
+
+    def _select(self, where="", params=()):
+        sql = f"SELECT {', '.join(self._COLUMNS)} FROM users {where}"
+        return self._conn().execute(sql, params)
+
+    def _upsert(self, conn, user_id, record):
+        placeholders = ", ".join("?" for _ in self._COLUMNS)
+        assignments = ", ".join(f"{c} = excluded.{c}" for c in self._COLUMNS[1:])
+        conn.execute(
+            f"INSERT INTO users ({', '.join(self._COLUMNS)}) VALUES ({placeholders}) "
+            f"ON CONFLICT(user_id) DO UPDATE SET {assignments}",
+            self._to_row(user_id, record)
+        )
+
+    def get(self, user_id):
+        row = self._select("WHERE user_id = ?", (user_id,)).fetchone()
+        return self._from_row(row)[1] if row else None
+
+    def insert(self, user_id, record):
+        conn = self._conn()
+        with self._lock:
+            try:
+                placeholders = ", ".join("?" for _ in self._COLUMNS)
+                conn.execute(
+                    f"INSERT INTO users ({', '.join(self._COLUMNS)}) VALUES ({placeholders})",
+                    self._to_row(user_id, record)
+                )
+            except sqlite3.IntegrityError:
+                return False
+            self._notify({user_id: record})
+        return True
+
+    def insert_many(self, records):
+        conn = self._conn()
+        placeholders = ", ".join("?" for _ in self._COLUMNS)
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                inserted = []
+                for user_id, record in records.items():
+                    cur = conn.execute(
+                        f"INSERT OR IGNORE INTO users ({', '.join(self._COLUMNS)}) VALUES ({placeholders})",
+                        self._to_row(user_id, record)
+                    )
+                    if cur.rowcount > 0:
+                        inserted.append(user_id)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._notify({user_id: records[user_id] for user_id in inserted})
+        return inserted
+
+    def update_many(self, mutators):
+        conn = self._conn()
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                updated = {}
+                for user_id, mutator in mutators.items():
+                    row = conn.execute(
+                        f"SELECT {', '.join(self._COLUMNS)} FROM users WHERE user_id = ?", (user_id,)
+                    ).fetchone()
+                    if not row:
+                        continue
+                    record = self._from_row(row)[1]
+                    mutator(record)
+                    self._upsert(conn, user_id, record)
+                    updated[user_id] = record
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._notify(updated)
+        return list(updated)
+
+    def delete(self, user_id):
+        with self._lock:
+            cur = self._conn().execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+            if cur.rowcount > 0:
+                self._notify({user_id: None})
+        return cur.rowcount > 0
+
+    def items(self):
+        for row in self._select("ORDER BY rowid"):
+            yield self._from_row(row)
+
+    def signature(self):
+        # WAL 模式下提交先写入 -wal 文件，检查点再写回主库，两者都要看
+        result = []
+        for path in (self.path, f"{self.path}-wal"):
+            try:
+                result.append(tuple(_signature(os.stat(path))))
+            except FileNotFoundError:
+                result.append(None)
+        return tuple(result)
+
+    def import_json(self, path=USERS_JSON_PATH):
+        users = _read_json(path)
+        conn = self._conn()
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM users")
+                for user_id, record in users.items():
+                    self._upsert(conn, user_id, record)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._notify(None)
+
+
+class ShardedJsonUserStore(UserStore):
+    """
+    users.json split into one file per cohort: users/<enrollment_year>/<school>.json.
+
+    Each shard is a JsonUserStore (with its own lock and offset index), so a
+    write only rewrites the affected cohort file. A small router file
+    (users/_router.json) maps user_id -> shard; cross-shard reads such as
+    the ranking iterate the shards lazily, one file at a time. An empty
+    layout is seeded from users.json on first use.
+
+    The router is authoritative: a record moved to another shard is written
+    to the new shard, then the router, then removed from the old shard, so
+    an interrupted move leaves at most a stale copy that reads ignore.
+    """
+
+    ROUTER_NAME = "_router.json"
+
+    def __init__(self, root=USERS_SHARD_DIR, seed_path=USERS_JSON_PATH):
+        self.root = os.path.abspath(root)
+        self.router_path = os.path.join(self.root, self.ROUTER_NAME)
+        self._lock = threading.RLock()
+        self._shards = {}
+        self._router = None
+        self._router_signature = None
+        os.makedirs(self.root, exist_ok=True)
+        if seed_path and not os.path.exists(self.router_path) and os.path.exists(seed_path):
+            self.import_json(seed_path)
+
+    @staticmethod
+    def shard_key(record):
+        """Return the shard name of a record, e.g. "2023/信息学院.json"."""
+        profile = record.get("profile", {})
+        year = str(profile.get("enrollment_year") or "unknown")
+        school = str(profile.get("school") or "unknown").replace("/", "_").replace(os.sep, "_")
+        return f"{year}/{school}.json"
+
+    def _shard(self, key):
+        store = self._shards.get(key)
+        if store is None:
+            path = os.path.join(self.root, *key.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            store = self._shards[key] = JsonUserStore(path)
+            store.notify_changes = False
+        return store
+
+    def _load_router(self):
+        # 路由表常驻内存，其他进程改写后按 (mtime, size) 重新加载
+        try:
+            signature = _signature(os.stat(self.router_path))
+        except FileNotFoundError:
+            signature = None
+        if self._router is None or signature != self._router_signature:
+            self._router = _read_json(self.router_path)
+            self._router_signature = signature
+        return self._router
+
+    def _save_router(self):
+        _write_json_atomic(self.router_path, self._router)
+        self._router_signature = _signature(os.stat(self.router_path))
+
+    def shard_names(self):
+        """Return every shard name, sorted by enrollment year and school."""
+        with self._lock:
+            return sorted(set(self._load_router().values()))
+
+    def get(self, user_id):
+        key = self._load_router().get(user_id)
+        return self._shard(key).get(user_id) if key else None
+
+    def insert(self, user_id, record):
+        with self._lock:
+            router = self._load_router()
+            if user_id in router:
+                return False
+            key = self.shard_key(record)
+            if not self._shard(key).insert(user_id, record):
+                return False
+            router[user_id] = key
+            self._save_router()
+            self._notify({user_id: record})
+        return True
+
+    def insert_many(self, records):
+        with self._lock:
+            router = self._load_router()
+            by_shard = {}
+            for user_id, record in records.items():
+                if user_id not in router:
+                    by_shard.setdefault(self.shard_key(record), {})[user_id] = record
+            inserted = []
+            for key, shard_records in by_shard.items():
+                for user_id in self._shard(key).insert_many(shard_records):
+                    router[user_id] = key
+                    inserted.append(user_id)
+            if inserted:
+                self._save_router()
+            self._notify({user_id: records[user_id] for user_id in inserted})
+        return inserted
+
+    def update_many(self, mutators):
+        with self._lock:
+            router = self._load_router()
+            by_shard = {}
+            for user_id, mutator in mutators.items():
+                key = router.get(user_id)
+                if key:
+                    by_shard.setdefault(key, {})[user_id] = mutator
+
+            updated, moved, records = [], [], {}
+            for key, shard_mutators in by_shard.items():
+                # 分片内一次事务；跨分片的批量更新按分片依次提交
+                def track(user_id, mutator, key=key):
+                    def apply(record):
+                        mutator(record)
+                        records[user_id] = record
+                        if self.shard_key(record) != key:
+                            moved.append((user_id, key))
+                    return apply
+                updated += self._shard(key).update_many(
+                    {user_id: track(user_id, mutator) for user_id, mutator in shard_mutators.items()}
+                )
+
+            for user_id, old_key in moved:
+                # 入学年份或学院被修改时迁移到新分片：先写新分片，再改路由，最后删旧分片
+                self._move(user_id, records[user_id], old_key)
+            self._notify({user_id: records[user_id] for user_id in updated})
+        return updated
+
+    def _move(self, user_id, record, old_key):
+        new_key = self.shard_key(record)
+        target = self._shard(new_key)
+        if not target.insert(user_id, record):
+            # 上次迁移中断时留下的副本，整条覆盖
+            def replace(stale):
+                stale.clear()
+                stale.update(record)
+            target.update(user_id, replace)
+        self._router[user_id] = new_key
+        self._save_router()
+        self._shard(old_key).delete(user_id)
+
+    def delete(self, user_id):
+        with self._lock:
+            router = self._load_router()
+            key = router.get(user_id)
+            if not key:
+                return False
+            self._shard(key).delete(user_id)
+            router.pop(user_id)
+            self._save_router()
+            self._notify({user_id: None})
+        return True
+
+    def items(self):
+        with self._lock:
+            router = dict(self._load_router())
+        for key in sorted(set(router.values())):
+            for user_id, record in self._shard(key).items():
+                # 以路由表为准，跳过迁移中断留下的副本
+                if router.get(user_id) == key:
+                    yield user_id, record
+
+    def signature(self):
+        with self._lock:
+            keys = sorted(set(self._load_router().values()))
+            return (self._router_signature and tuple(self._router_signature),) + tuple(
+                (key, self._shard(key).signature()) for key in keys
+            )
+
+    def import_json(self, path=USERS_JSON_PATH):
+        users = _read_json(path)
+        shards = {}
+        for user_id, record in users.items():
+            shards.setdefault(self.shard_key(record), {})[user_id] = record
+        with self._lock:
+            for key in set(self._load_router().values()) - set(shards):
+                self._shard(key)._write({})
+            for key, shard_users in shards.items():
+                self._shard(key)._write(shard_users)
+            self._router = {user_id: key for key, shard_users in shards.items() for user_id in shard_users}
+            self._save_router()
+            self._notify(None)
+
+
+_BACKENDS = {
+    "json": JsonUserStore,
+    "sqlite": SqliteUserStore,
+    "sharded": ShardedJsonUserStore,
+}
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_user_store():
+    """
+    Return the process-wide user store.
+
+    The backend is chosen by the USER_STORE_BACKEND environment variable
+    ("json" by default, "sqlite", or "sharded").
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = os.environ.get("USER_STORE_BACKEND", "json").lower()
+                if backend not in _BACKENDS:
+                    raise ValueError(f"Unknown USER_STORE_BACKEND: {backend}")
+                _store = _BACKENDS[backend]()
+    return _store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import/export the user store in the users.json layout.")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("path", nargs="?", default=USERS_JSON_PATH)
+    args = parser.parse_args()
+
+    store = get_user_store()
+    if args.action == "import":
+        store.import_json(args.path)
+    else:
+        store.export_json(args.path)
+    print(f"{args.action}ed {len(store.load_all())} users ({args.path})")
@@ -15,13 +15,14 @@ if back_path not in sys.path:
 try:
     from register import (
         register_user, login_user, get_mandatory_roadmap, 
-        get_selection_options, update_user_progress, get_db_data,
+        get_selection_options, add_completed_items, get_user,
         update_current_semester, graduate_warning 
     )
     from recommend import stream_conversation_for_plan 
     from comment import record_comment, add_like
-    from match import stream_conversation_for_match
+    from match import stream_conversation_for_match, cached_match
     from rank import generate_comment_rank_list
+    from catalog_index import get_catalog_index
 except ImportError as e:
     st.error(f"❌ 无法加载后端模块: {e}")
 
@@ -108,11 +109,11 @@ if st.session_state.step == "login":
             if success:
                 st.session_state.user_id = msg_or_id
                 
-                # 登录成功后清空旧的匹配结果和聊天记录
-                st.session_state.matched_uids = []
+                # 登录成功后清空聊天记录；匹配结果从缓存恢复（修读记录或候选变化后缓存失效）
                 st.session_state.messages = []
 
                 update_current_semester(msg_or_id)
+                st.session_state.matched_uids = cached_match(msg_or_id) or []
                 st.session_state.step = "dashboard"
                 st.rerun()
             else:
@@ -177,8 +178,7 @@ elif st.session_state.step == "dashboard":
         st.session_state["ms_c"] = []; st.session_state["ms_ct"] = []; st.session_state["ms_r"] = []
         st.session_state.needs_reset = False
 
-    all_users = get_db_data("users.json")
-    user = all_users.get(st.session_state.user_id)
+    user = get_user(st.session_state.user_id)
     if not user: st.session_state.step = "login"; st.rerun()
 
     #st.title(f"智航看板 - 欢迎您，{user['profile']['name']}")
@@ -275,8 +275,8 @@ elif st.session_state.step == "dashboard":
         if st.button("同步数据并更新能力画像", type="primary", width='stretch'):
             if not course_new and not contest_new and not research_new: st.warning("未检测到新内容。")
             else:
-                final_payload = {"courses": history.get('completed_courses', []) + course_new, "research": history.get('research_done', []) + research_new, "competitions": history.get('competitions_done', []) + contest_new}
-                if update_user_progress(st.session_state.user_id, final_payload):
+                # 只提交本次新增的条目，后端按增量更新分值
+                if add_completed_items(st.session_state.user_id, courses=course_new, research=research_new, competitions=contest_new):
                     st.session_state.needs_reset = True; st.success("🎉 更新成功！"); st.rerun()
 
     with tab_tree:
@@ -300,16 +300,10 @@ elif st.session_state.step == "dashboard":
 
     with tab_map:
         st.subheader("专业必修课路线图")
-        target_roadmap = []
-        courses_db = get_db_data("courses.json")
-        for college in courses_db.get("学院列表", []):
-            if college.get("学院名称") == user['profile'].get('school'):
-                for major_item in college.get("专业列表", []):
-                    if major_item.get("专业名称") == user['profile'].get('major'):
-                        target_roadmap = major_item.get("course_map", [])
-                        break
+        major_catalog = get_catalog_index().major(user['profile'].get('school'), user['profile'].get('major'))
+        target_roadmap = major_catalog.course_map if major_catalog else []
         if target_roadmap:
-            target_roadmap.sort(key=lambda x: x.get("semester", 1))
+            target_roadmap = sorted(target_roadmap, key=lambda x: x.get("semester", 1))
             for s in range(1, 9):
                 s_courses = [c for c in target_roadmap if int(c.get('semester', 0)) == s]
                 if s_courses:
@@ -344,20 +338,10 @@ elif st.session_state.step == "dashboard":
         
         # 匹配结果展示逻辑
         if st.session_state.matched_uids:
-            c_db = get_db_data("courses.json"); r_db = get_db_data("research.json"); ct_db = get_db_data("contests.json")
-            desc_lookup = {}
-            for col in c_db.get("学院列表", []):
-                for m in col.get("专业列表", []):
-                    for c in m.get("课程列表", []): desc_lookup[c['name']] = c.get('course_introduction', "暂无介绍")
-            for col in r_db.get("学院列表", []):
-                for m in col.get("专业列表", []):
-                    for r in m.get("科研列表", []): desc_lookup[r['name']] = r.get('abstract', "暂无简介")
-            for col in ct_db.get("学院列表", []):
-                for m in col.get("专业列表", []):
-                    for ct in m.get("竞赛列表", []): desc_lookup[ct['name']] = ct.get('description', "暂无简介")
+            desc_lookup = get_catalog_index().descriptions
 
             for m_uid in st.session_state.matched_uids:
-                peer = all_users.get(m_uid)
+                peer = get_user(m_uid)
                 if not peer: continue
                 with st.container(border=True):
                     header_col, like_col = st.columns([5, 1])
@@ -398,7 +382,7 @@ elif st.session_state.step == "dashboard":
 
 # --- 6. 推荐页面 ---
 elif st.session_state.step == "recommendation":
-    all_users = get_db_data("users.json"); user = all_users.get(st.session_state.user_id)
+    user = get_user(st.session_state.user_id)
     st.title("AI 智能学业规划导师")
     st.markdown(f"#### 您好，{user['profile']['name']}！")
     st.markdown(f"""
@@ -418,7 +402,10 @@ elif st.session_state.step == "recommendation":
         with st.chat_message("assistant"):
             status_p = st.empty(); status_p.info("正在为您规划方案..."); container = {"first": False}
             try:
-                res_gen = stream_conversation_for_plan(st.session_state.user_id, prompt)
+                res_gen = stream_conversation_for_plan(
+                    st.session_state.user_id, prompt,
+                    on_queue=lambda pos: status_p.info(f"当前使用人数较多，正在排队（前面还有 {pos - 1} 位同学）..."),
+                )
                 def wrapped():
                     for chunk in res_gen:
                         if not container["first"]: status_p.empty(); container["first"] = True
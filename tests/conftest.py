@@ -0,0 +1,5 @@
+import os
+import sys
+
+# back/ 下的模块按裸模块名互相导入
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "back"))
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from catalog_cache import CatalogCache, thaw
+
+
+def _write(path, data):
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+
+def test_parses_once_until_the_file_changes(tmp_path):
+    path = tmp_path / "courses.json"
+    _write(path, {"学院列表": [{"学院名称": "信息学院"}]})
+    cache = CatalogCache()
+
+    first = cache.load(str(path))
+    assert cache.load(str(path)) is first
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+    _write(path, {"学院列表": [{"学院名称": "信息学院"}, {"学院名称": "数学学院"}]})
+    assert len(cache.load(str(path))["学院列表"]) == 2
+    assert cache.stats()["misses"] == 2
+
+
+def test_cached_documents_are_read_only(tmp_path):
+    path = tmp_path / "courses.json"
+    _write(path, {"学院列表": [{"学院名称": "信息学院"}]})
+    data = CatalogCache().load(str(path))
+
+    with pytest.raises(TypeError):
+        data["学院列表"][0]["学院名称"] = "改名"
+    assert isinstance(data["学院列表"], tuple)
+    copy = thaw(data)
+    copy["学院列表"][0]["学院名称"] = "改名"
+    assert data["学院列表"][0]["学院名称"] == "信息学院"
+
+
+def test_missing_and_invalid_files(tmp_path):
+    cache = CatalogCache()
+    with pytest.raises(FileNotFoundError):
+        cache.load(str(tmp_path / "missing.json"))
+    (tmp_path / "broken.json").write_text("{", encoding="utf-8")
+    with pytest.raises(ValueError):
+        cache.load(str(tmp_path / "broken.json"))
@@ -0,0 +1,62 @@
+import json
+import os
+
+import pytest
+
+from catalog_index import CATALOG_FILES, DB_DIR, ITEM_LIST_KEYS, CatalogIndex
+
+
+@pytest.fixture(scope="module")
+def catalogs():
+    result = {}
+    for kind, filename in CATALOG_FILES.items():
+        with open(os.path.join(DB_DIR, filename), "r", encoding="utf-8") as f:
+            result[kind] = json.load(f)
+    return result
+
+
+@pytest.fixture(scope="module")
+def index(catalogs):
+    return CatalogIndex(("test",), catalogs)
+
+
+def _scan(catalogs, kind, school, major):
+    """The linear lookup the index replaces."""
+    for college in catalogs[kind]["学院列表"]:
+        if college["学院名称"] != school:
+            continue
+        for major_item in college["专业列表"]:
+            if major_item["专业名称"] == major:
+                return major_item
+    return None
+
+
+def test_major_lookup_matches_a_linear_scan(catalogs, index):
+    for (school, major), entry in index.majors.items():
+        for kind in ("courses", "research", "contests"):
+            record = _scan(catalogs, kind, school, major)
+            items = record.get(ITEM_LIST_KEYS[kind], []) if record else []
+            assert [item["name"] for item in items] == [item["name"] for item in getattr(entry, kind)]
+    assert index.major("信息学院", "不存在的专业") is None
+
+
+def test_item_lookup_keeps_the_last_definition(catalogs, index):
+    expected = {}
+    for college in catalogs["courses"]["学院列表"]:
+        for major_item in college["专业列表"]:
+            for course in major_item.get("课程列表", []):
+                expected[course["name"]] = course
+    assert set(index.courses) == set(expected)
+    for name, course in expected.items():
+        assert index.courses[name] == course
+
+
+def test_user_template_follows_the_major_tags(index):
+    entry = index.major("信息学院", "计算机科学与技术")
+    template = entry.user_template
+    assert tuple(template["knowledge"]) == entry.knowledge_tags
+    assert tuple(template["skills"]) == entry.skill_tags
+    assert set(template["knowledge"].values()) == {0.0}
+    with pytest.raises(TypeError):
+        template["knowledge"]["数学基础"] = 1.0
+    assert sum(len(courses) for courses in entry.courses_by_semester.values()) == len(entry.courses)
@@ -0,0 +1,67 @@
+import pytest
+
+import register
+from catalog_index import get_catalog_index
+from catalog_retrieval import BM25Index, gap_score, get_major_retriever, retrieve_items, tokenize
+
+SCHOOL, MAJOR = "信息学院", "计算机科学与技术"
+
+
+def _user(semester=6):
+    _, user = register._new_user_record({
+        "student_id": 1, "name": "甲", "enrollment_year": 2023, "school": SCHOOL,
+        "major": MAJOR, "target": "保研", "current_semester": semester,
+    })
+    return user
+
+
+def test_tokenize_mixes_cjk_bigrams_and_words():
+    assert tokenize("机器学习 Python3") == ["机器", "器学", "学习", "python3"]
+    assert tokenize("AI") == ["ai"]
+
+
+def test_bm25_prefers_the_matching_document():
+    index = BM25Index([tokenize("数据库系统"), tokenize("机器学习导论"), tokenize("机器人")])
+    scores = index.scores(tokenize("机器学习"))
+    assert scores.index(max(scores)) == 1
+    assert scores[0] == 0.0
+    assert BM25Index([]).scores(["机器"]) == []
+
+
+def test_gap_score_favours_weak_dimensions():
+    user = {"knowledge": {"数学": 10.0, "编程": 0.0}}
+    assert gap_score({"knowledge": {"编程": 1}}, "courses", user) == 1.0
+    assert gap_score({"knowledge": {"数学": 1}}, "courses", user) == 0.0
+    assert gap_score({"knowledge": {"数学": 1, "编程": 1}}, "courses", user) == 0.5
+    assert gap_score({}, "courses", user) == 0.0
+
+
+def test_retrieval_keeps_required_courses_and_skips_completed():
+    user = _user()
+    entry = get_catalog_index().major(SCHOOL, MAJOR)
+    offered = [c for c in entry.courses if c.get("standard_semester") == 6]
+    required = [c["name"] for c in offered if c.get("category") in entry.required_categories]
+    electives = [c["name"] for c in offered if c.get("category") not in entry.required_categories]
+    user["academic_progress"]["completed_courses"] = [{"name": electives[0], "grade": 3.0, "semester": 5}]
+
+    selected = retrieve_items(user, "人工智能方向的选修课", top_k=2)
+    names = [c["name"] for c in selected["courses"]]
+    assert set(required) <= set(names)
+    assert electives[0] not in names
+    assert len(set(names) - set(required)) == min(2, len(electives) - 1)
+    assert names == [c["name"] for c in offered if c["name"] in names]
+    assert len(selected["research"]) == len(selected["contests"]) == 2
+
+
+def test_demand_decides_the_elective_ranking():
+    user = _user()
+    retriever = get_major_retriever(SCHOOL, MAJOR)
+    target = next(c for c in retriever.items["courses"] if c["name"] == "信息检索导论")
+    ranked = retriever.rank("courses", user, "信息检索", lambda c: c.get("standard_semester") == 6)
+    assert ranked[0][3] is target and ranked[0][1] == 1.0
+
+
+@pytest.mark.parametrize("top_k", [0, -1])
+def test_retrieval_can_be_switched_off(top_k):
+    assert retrieve_items(_user(), "选修课", top_k=top_k) is None
+    assert retrieve_items(dict(_user(), profile={"school": SCHOOL, "major": "不存在"}), "选修课", top_k=3) is None
@@ -0,0 +1,59 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import catalog_snapshot
+from catalog_index import CATALOG_FILES, DB_DIR
+from catalog_snapshot import compile_snapshot, load_snapshot, validate_catalogs
+
+
+@pytest.fixture
+def catalog_dir(tmp_path, monkeypatch):
+    for filename in CATALOG_FILES.values():
+        shutil.copy(os.path.join(DB_DIR, filename), tmp_path / filename)
+    monkeypatch.setattr(catalog_snapshot, "DB_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_snapshot_loads_while_sources_are_unchanged(catalog_dir):
+    path = str(catalog_dir / "catalog.snapshot")
+    compile_snapshot(path)
+    index = load_snapshot(path)
+    assert index is not None and index.major("信息学院", "计算机科学与技术") is not None
+
+    # 只改了 mtime、内容相同：按内容哈希仍然可用
+    courses = catalog_dir / "courses.json"
+    os.utime(courses, ns=(0, 0))
+    assert load_snapshot(path) is not None
+
+
+def test_snapshot_is_ignored_after_a_source_edit(catalog_dir):
+    path = str(catalog_dir / "catalog.snapshot")
+    compile_snapshot(path)
+    research = catalog_dir / "research.json"
+    research.write_text(research.read_text(encoding="utf-8") + "\n", encoding="utf-8")
+    assert load_snapshot(path) is None
+
+
+def test_unreadable_snapshot_is_ignored(tmp_path):
+    path = tmp_path / "catalog.snapshot"
+    path.write_bytes(b"not a pickle")
+    assert load_snapshot(str(path)) is None
+    assert load_snapshot(str(tmp_path / "missing.snapshot")) is None
+
+
+def test_validation_reports_broken_items():
+    catalogs = {}
+    for kind, filename in CATALOG_FILES.items():
+        with open(os.path.join(DB_DIR, filename), "r", encoding="utf-8") as f:
+            catalogs[kind] = json.load(f)
+    assert validate_catalogs(catalogs) == []
+
+    courses = catalogs["courses"]["学院列表"][0]["专业列表"][0]["课程列表"]
+    courses.append(dict(courses[0]))
+    courses[1]["credits"] = "三"
+    problems = validate_catalogs(catalogs)
+    assert any("重复条目" in problem for problem in problems)
+    assert any("credits 不是数字" in problem for problem in problems)
@@ -0,0 +1,62 @@
+import json
+
+import derived_index
+from derived_index import DerivedIndex, record_digest
+from user_store import JsonUserStore
+
+
+class MajorIndex(DerivedIndex):
+    """Smallest useful index: user_id -> major."""
+
+    def __init__(self):
+        super().__init__()
+        self.majors = {}
+        self.added = 0
+
+    def digest(self, record):
+        return record_digest(record["profile"]["major"])
+
+    def _add(self, user_id, record):
+        self.majors[user_id] = record["profile"]["major"]
+        self.added += 1
+
+    def _discard(self, user_id):
+        del self.majors[user_id]
+
+
+def _store(tmp_path, users):
+    path = tmp_path / "users.json"
+    path.write_text(json.dumps(users, ensure_ascii=False), encoding="utf-8")
+    return JsonUserStore(str(path))
+
+
+def test_revalidate_sees_writes_of_other_processes(tmp_path):
+    store = _store(tmp_path, {"user_1": {"profile": {"major": "计算机"}}})
+    index = MajorIndex()
+    index.reconcile(store)
+    assert index.revalidate(store) == 0
+
+    # 另一个进程（如 transcript_import）直接改写文件，本进程收不到变更通知
+    other = {"user_1": {"profile": {"major": "软件工程"}}, "user_2": {"profile": {"major": "计算机"}}}
+    (tmp_path / "users.json").write_text(json.dumps(other, ensure_ascii=False), encoding="utf-8")
+
+    assert index.revalidate(store) == 2
+    assert index.majors == {"user_1": "软件工程", "user_2": "计算机"}
+    assert index.revalidate(store) == 0
+
+
+def test_writes_outside_the_digest_are_skipped(tmp_path, monkeypatch):
+    store = _store(tmp_path, {"user_1": {"profile": {"major": "计算机"}}})
+    monkeypatch.setattr(derived_index, "get_user_store", lambda: store)
+    index = MajorIndex()
+    index.reconcile(store)
+    assert index.added == 1
+
+    store.update("user_1", lambda user: user.update(path_review={"like_count": 3}))
+    index.apply_changes({"user_1": store.get("user_1")})
+    assert index.added == 1 and index._unsaved == 1
+    assert index.revalidate(store) == 0
+
+    store.update("user_1", lambda user: user["profile"].update(major="软件工程"))
+    index.apply_changes({"user_1": store.get("user_1")})
+    assert index.added == 2 and index.majors == {"user_1": "软件工程"}
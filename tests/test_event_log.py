@@ -0,0 +1,75 @@
+import pytest
+
+import event_log
+from event_log import EventLog, apply_events, new_path_review
+from user_store import JsonUserStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JsonUserStore(str(tmp_path / "users.json"))
+    store.insert("user_1", {"profile": {}, "path_review": new_path_review()})
+    return store
+
+
+def _likes(store):
+    return store.get("user_1")["path_review"]["like_count"]
+
+
+def test_events_are_folded_then_compacted(tmp_path, store):
+    log = EventLog(str(tmp_path / "events.jsonl"))
+    log.append({"op": "like", "user_id": "user_1"})
+    log.append({"op": "review", "user_id": "user_1", "content": "先修数学"})
+    assert log.fold("user_1", store.get("user_1"))["path_review"]["like_count"] == 1
+
+    assert log.compact(store) == 2
+    record = store.get("user_1")
+    assert record["path_review"]["like_count"] == 1 and record["path_review"]["content"] == "先修数学"
+    assert log.pending("user_1") == []
+    assert log.fold("user_1", record)["path_review"]["like_count"] == 1
+    assert log.compact(store) == 0
+
+
+def test_writer_follows_a_rotation_by_another_process(tmp_path, store):
+    path = str(tmp_path / "events.jsonl")
+    app, cli = EventLog(path), EventLog(path)
+    app.append({"op": "like", "user_id": "user_1"})
+    assert cli.compact(store) == 1
+
+    # 应用进程仍持有改名前的文件句柄，这次点赞必须写进新的日志
+    app.append({"op": "like", "user_id": "user_1"})
+    assert app.fold("user_1", store.get("user_1"))["path_review"]["like_count"] == 2
+    assert cli.compact(store) == 1
+    assert _likes(store) == 2
+
+
+def test_interrupted_compaction_does_not_count_twice(tmp_path, store, monkeypatch):
+    path = str(tmp_path / "events.jsonl")
+    log = EventLog(path)
+    log.append({"op": "like", "user_id": "user_1"})
+    log.append({"op": "like", "user_id": "user_1"})
+
+    def crash(path):
+        raise OSError("killed")
+
+    # 存储已更新，但删除改名后的日志之前进程退出
+    monkeypatch.setattr(event_log.os, "remove", crash)
+    with pytest.raises(OSError):
+        log.compact(store)
+    monkeypatch.undo()
+    assert _likes(store) == 2
+
+    restarted = EventLog(path)
+    assert restarted.fold("user_1", store.get("user_1"))["path_review"]["like_count"] == 2
+    restarted.append({"op": "like", "user_id": "user_1"})
+    restarted.compact(store)
+    restarted.compact(store)
+    assert _likes(store) == 3
+
+
+def test_apply_events_skips_events_already_applied():
+    events = [{"op": "like", "user_id": "u", "id": str(i)} for i in range(3)]
+    user = apply_events({}, events[:2])
+    assert user["path_review"]["like_count"] == 2
+    apply_events(user, events)
+    assert user["path_review"]["like_count"] == 3 and user["path_review"]["last_event"] == "2"
@@ -0,0 +1,94 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from llm_client import LLMClient, LLMHTTPError
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = request["messages"][0]["content"]
+        if prompt == "fail":
+            self._send(503, b"unavailable", "text/plain")
+        elif request["stream"]:
+            events = [{"choices": [{"delta": {"content": part}}]} for part in ("你", "好")]
+            body = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+            self._send(200, body.encode("utf-8"), "text/event-stream")
+        else:
+            body = json.dumps({"choices": [{"message": {"content": f"re: {prompt}"}}]})
+            self._send(200, body.encode("utf-8"), "application/json")
+        # 模拟服务端悄悄关闭空闲连接
+        self.close_connection = self.server.drop_idle
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.connections = 0
+    server.drop_idle = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(server):
+    client = LLMClient(f"http://127.0.0.1:{server.server_address[1]}/v1", timeout=5)
+    yield client
+    client.pool.close()
+
+
+def test_sequential_calls_reuse_one_connection(server, client):
+    assert client.complete("a", "key") == "re: a"
+    assert "".join(client.stream("b", "key")) == "你好"
+    assert client.complete("c", "key") == "re: c"
+    assert server.connections == 1
+    assert [timing.reused for timing in client.timings] == [False, True, True]
+    assert all(timing.status == 200 and timing.total is not None for timing in client.timings)
+
+
+def test_abandoned_stream_is_not_pooled(server, client):
+    stream = client.stream("a", "key")
+    assert next(stream) == "你"
+    stream.close()
+    assert client.pool._idle == []
+    assert client.complete("b", "key") == "re: b"
+    assert server.connections == 2
+
+
+def test_stale_connection_is_replaced(server, client):
+    server.drop_idle = True
+    assert client.complete("a", "key") == "re: a"
+    assert client.complete("b", "key") == "re: b"
+    assert server.connections == 2
+
+
+def test_errors(client):
+    with pytest.raises(LLMHTTPError) as error:
+        client.complete("fail", "key")
+    assert error.value.status == 503 and isinstance(error.value, ConnectionError)
+    with pytest.raises(ValueError):
+        client.complete("a", "")
+    with pytest.raises(ConnectionError):
+        LLMClient("http://127.0.0.1:9/v1", timeout=1).complete("a", "key")
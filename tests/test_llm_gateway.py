@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+import llm_gateway
+from llm_client import LLMHTTPError
+from llm_gateway import CircuitBreaker, CircuitOpen, LLMGateway
+
+RESET = 0.05
+
+
+def _gateway(monkeypatch, outcomes):
+    """A gateway whose upstream calls play `outcomes` in order (an exception to raise, or a reply)."""
+    monkeypatch.setattr(llm_gateway, "MAX_RETRIES", 0)
+    gateway = LLMGateway(max_concurrency=1)
+    gateway.breaker = CircuitBreaker(failures=1, reset=RESET)
+
+    def blocking_call(prompt, api_key, stream, timeout, events, state):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        events.put(("result", outcome))
+
+    gateway._blocking_call = blocking_call
+    return gateway
+
+
+def test_breaker_opens_and_closes_after_successful_trial(monkeypatch):
+    gateway = _gateway(monkeypatch, [LLMHTTPError(503, "unavailable"), "ok"])
+    with pytest.raises(LLMHTTPError):
+        gateway.complete("p", "k")
+    with pytest.raises(CircuitOpen):
+        gateway.complete("p", "k")
+    time.sleep(RESET * 1.5)
+    assert gateway.complete("p", "k") == "ok"
+    assert gateway.breaker.opened_at is None and not gateway.breaker.trial
+
+
+def test_4xx_during_trial_reopens_instead_of_sticking(monkeypatch):
+    gateway = _gateway(monkeypatch, [LLMHTTPError(503, "unavailable"), LLMHTTPError(400, "bad request"), "ok"])
+    with pytest.raises(LLMHTTPError):
+        gateway.complete("p", "k")
+    time.sleep(RESET * 1.5)
+    with pytest.raises(LLMHTTPError) as excinfo:
+        gateway.complete("p", "k")
+    assert excinfo.value.status == 400
+    # 试探请求已了结：断路器重新打开，而不是永远停在试探中
+    assert not gateway.breaker.trial and gateway.breaker.opened_at is not None
+    with pytest.raises(CircuitOpen):
+        gateway.complete("p", "k")
+    time.sleep(RESET * 1.5)
+    assert gateway.complete("p", "k") == "ok"
+
+
+def test_unexpected_error_during_trial_reopens(monkeypatch):
+    gateway = _gateway(monkeypatch, [LLMHTTPError(503, "unavailable"), RuntimeError("boom"), "ok"])
+    with pytest.raises(LLMHTTPError):
+        gateway.complete("p", "k")
+    time.sleep(RESET * 1.5)
+    with pytest.raises(RuntimeError):
+        gateway.complete("p", "k")
+    assert not gateway.breaker.trial
+    time.sleep(RESET * 1.5)
+    assert gateway.complete("p", "k") == "ok"
+
+
+def test_4xx_outside_trial_does_not_count():
+    breaker = CircuitBreaker(failures=2, reset=RESET)
+    assert breaker.allow()
+    assert not llm_gateway._retryable(LLMHTTPError(400, "bad request"))
+    assert llm_gateway._retryable(LLMHTTPError(429, "slow down"))
+    assert llm_gateway._retryable(ConnectionError("reset"))
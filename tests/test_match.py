@@ -0,0 +1,88 @@
+import json
+import logging
+import os
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+import derived_index
+import match
+import match_prompt
+import peer_match
+from user_store import JsonUserStore, add_change_listener, remove_change_listener
+
+USERS_JSON = os.path.join(os.path.dirname(__file__), "..", "databases", "users.json")
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    with open(USERS_JSON, "r", encoding="utf-8") as f:
+        users = json.load(f)
+    (tmp_path / "users.json").write_text(json.dumps(users, ensure_ascii=False), encoding="utf-8")
+    store = JsonUserStore(str(tmp_path / "users.json"))
+    for module in (derived_index, match, match_prompt, peer_match):
+        monkeypatch.setattr(module, "get_user_store", lambda: store)
+    monkeypatch.setattr(match, "CANDIDATE_INDEX", "")
+    return store
+
+
+def _target(store):
+    """A user with at least two local candidates."""
+    for user_id, _ in store.items():
+        if len(peer_match.find_similar_users(user_id)) >= 2:
+            return user_id
+    pytest.skip("no user with two candidates")
+
+
+def test_rerank_logs_the_prompt_size(store, monkeypatch, caplog):
+    user_id = _target(store)
+    local = [uid for uid, _, _ in peer_match.find_similar_users(user_id, k=match.SHORTLIST_SIZE)]
+    monkeypatch.setattr(match, "llm_response", lambda prompt: f"1. {local[1]}\n2. {local[0]}")
+
+    with caplog.at_level(logging.DEBUG, logger="match"):
+        ids, complete = match._match(user_id, use_llm=True)
+    assert complete and ids[:2] == [local[1], local[0]]
+    assert "tokens" in caplog.text and "candidates" in caplog.text
+
+
+def test_rerank_failure_falls_back_to_the_local_order(store, monkeypatch, caplog):
+    user_id = _target(store)
+
+    def fail(prompt):
+        raise ConnectionError("timeout")
+
+    monkeypatch.setattr(match, "llm_response", fail)
+    with caplog.at_level(logging.WARNING, logger="match"):
+        ids, complete = match._match(user_id, use_llm=True)
+    assert not complete
+    assert ids == [uid for uid, _, _ in peer_match.find_similar_users(user_id)]
+    assert "re-ranking skipped" in caplog.text
+
+
+@pytest.fixture
+def cache(store, tmp_path, monkeypatch):
+    """A MatchCache on the test store, kept in sync by the store listeners."""
+    monkeypatch.setattr(match.MatchCache, "PATH", str(tmp_path / "match_cache.pkl"))
+    monkeypatch.setattr(match, "USE_MATCH_CACHE", True)
+    cache = match.MatchCache()
+    cache.reconcile(store)
+    monkeypatch.setattr(match, "get_match_cache", lambda: cache)
+    add_change_listener(cache.apply_changes)
+    yield cache
+    remove_change_listener(cache.apply_changes)
+
+
+def test_cached_match_survives_writes_outside_the_fingerprint(store, cache):
+    user_id = _target(store)
+    result = match.stream_conversation_for_match(user_id, use_llm=False)
+    assert match.cached_match(user_id, use_llm=False) == result
+
+    # 点赞、排名、评价等字段不参与匹配
+    store.update(user_id, lambda user: user.setdefault("path_review", {}).update(current_rank=7, like_count=3))
+    peer = result[0]
+    store.update(peer, lambda user: user.setdefault("path_review", {}).update(content="新的评价"))
+    assert match.cached_match(user_id, use_llm=False) == result
+
+    store.update(user_id, lambda user: user["academic_progress"].update(current_semester=8))
+    assert match.cached_match(user_id, use_llm=False) is None
@@ -0,0 +1,104 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+import derived_index
+import match
+import match_batch
+from peer_match import find_similar_users
+from user_store import JsonUserStore
+
+USERS_JSON = os.path.join(os.path.dirname(__file__), "..", "databases", "users.json")
+
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch):
+    """A pool worker initialized in-process on a copy of users.json."""
+    with open(USERS_JSON, "r", encoding="utf-8") as f:
+        users = json.load(f)
+    (tmp_path / "users.json").write_text(json.dumps(users, ensure_ascii=False), encoding="utf-8")
+    store = JsonUserStore(str(tmp_path / "users.json"))
+    for module in (derived_index, match, match_batch):
+        monkeypatch.setattr(module, "get_user_store", lambda: store)
+    monkeypatch.setattr(match_batch, "CANDIDATE_INDEX", "")
+    match_batch._init_worker()
+    return store
+
+
+def test_worker_ranking_matches_find_similar_users(worker):
+    user_ids = [uid for uid, _ in worker.items()]
+    _, results, errors, _ = match_batch._match_shard((0, user_ids, False))
+    assert errors == {}
+    for user_id in user_ids:
+        expected = [uid for uid, _, _ in find_similar_users(user_id, users=worker.items())]
+        assert results[user_id] == expected
+
+
+class _BrokenUser:
+    """A worker record that fails to expand."""
+
+    def semester(self):
+        return -1
+
+    def to_dict(self):
+        raise KeyError("profile")
+
+
+def test_a_failing_user_does_not_stop_the_shard(worker):
+    user_ids = [uid for uid, _ in worker.items()][:5]
+    match_batch._worker_users[user_ids[2]] = _BrokenUser()
+    _, results, errors, _ = match_batch._match_shard((0, user_ids, False))
+    assert errors == {user_ids[2]: "KeyError: 'profile'"}
+    assert set(results) == set(user_ids) - {user_ids[2]}
+
+
+@pytest.fixture
+def cache(worker, tmp_path, monkeypatch):
+    monkeypatch.setattr(match.MatchCache, "PATH", str(tmp_path / "match_cache.pkl"))
+    monkeypatch.setattr(match_batch, "CHECKPOINT_PATH", str(tmp_path / "match_batch.ckpt.json"))
+    cache = match.MatchCache()
+    monkeypatch.setattr(match_batch, "get_match_cache", lambda: cache)
+    return cache
+
+
+@pytest.fixture
+def saves(monkeypatch):
+    """Number of results in the cache at each save."""
+    saved = []
+    save = match.MatchCache.save
+
+    def counting_save(self, path=None):
+        saved.append(len(self.results))
+        save(self, path)
+
+    monkeypatch.setattr(match.MatchCache, "save", counting_save)
+    return saved
+
+
+def test_cache_is_saved_at_checkpoints(cache, saves):
+    report = match_batch.precompute_matches(workers=2, shard_size=2, checkpoint_every=3)
+    assert report.errors == {} and report.computed == report.users
+    assert len(saves) == -(-report.shards // 3)
+    assert saves[-1] == report.users
+    assert match.MatchCache.load().results == cache.results
+    assert not os.path.exists(match_batch.CHECKPOINT_PATH)
+
+
+def test_interrupted_run_keeps_saved_shards(cache):
+    def stop(report):
+        if len(report.shard_seconds) == 4:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        match_batch.precompute_matches(workers=1, shard_size=2, checkpoint_every=3, progress=stop)
+    with open(match_batch.CHECKPOINT_PATH, "r", encoding="utf-8") as f:
+        saved_shards = len(json.load(f)["done"])
+    assert saved_shards == 4
+    assert len(match.MatchCache.load().results) == 8
+
+    report = match_batch.precompute_matches(workers=1, shard_size=2, checkpoint_every=3)
+    assert report.skipped_shards == 4
+    assert len(cache.results) == report.users
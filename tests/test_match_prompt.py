@@ -0,0 +1,62 @@
+from match_prompt import build_match_prompt, estimate_tokens, slice_progress
+
+SCHOOL, MAJOR = "信息学院", "计算机科学与技术"
+
+
+def _record(semester, courses=(), major=MAJOR):
+    return {
+        "profile": {"school": SCHOOL, "major": major, "name": "不应出现"},
+        "academic_progress": {
+            "current_semester": semester,
+            "completed_courses": [
+                {"name": name, "grade": 3.0, "semester": s, "category": "计算机类 -13 系统与网络"}
+                for name, s in courses
+            ],
+            "research_done": [], "competitions_done": [],
+        },
+        "knowledge": {"数学基础": 12.5},
+    }
+
+
+def _users(count=30):
+    users = {"user_1": _record(4, courses=[("网络编程", 2)])}
+    for i in range(2, count + 2):
+        users[f"user_{i}"] = _record(4 + i % 3, courses=[(f"选修{i}-{j}", j) for j in range(1, 6)])
+    users["user_99"] = _record(6, courses=[("网络编程", 2)], major="软件工程")
+    users["user_98"] = _record(3, courses=[("网络编程", 2)])
+    return users
+
+
+def test_only_the_pre_target_slice_is_sent():
+    sliced = slice_progress(_record(5, courses=[("网络编程", 2), ("分布式系统", 4), ("操作系统", 1)]), 3)
+    assert [c["name"] for c in sliced["completed_courses"]] == ["网络编程", "操作系统"]
+    assert set(sliced["completed_courses"][0]) == {"name", "category", "semester"}
+
+    prompt = build_match_prompt("user_1", users=_users(3), template="T")
+    assert "不应出现" not in prompt.text and "数学基础" not in prompt.text
+
+
+def test_candidates_are_prefiltered():
+    prompt = build_match_prompt("user_1", candidate_ids=["user_99", "user_98", "user_3", "user_2"], users=_users(3))
+    assert prompt.candidate_ids == ["user_3", "user_2"]
+    assert "user_99" not in prompt.text and "user_98" not in prompt.text
+
+
+def test_budget_drops_the_least_similar_candidates():
+    users = _users()
+    order = [f"user_{i}" for i in range(2, 32)]
+    full = build_match_prompt("user_1", candidate_ids=order, users=users, budget=10 ** 6, template="T")
+    small = build_match_prompt("user_1", candidate_ids=order, users=users, budget=full.tokens // 3, template="T")
+    assert full.omitted == 0 and full.candidate_ids == order
+    assert small.candidate_ids == order[:len(small.candidate_ids)]
+    assert small.omitted == len(order) - len(small.candidate_ids) > 0
+    assert small.tokens <= small.budget
+    assert small.report()["candidates"] == len(small.candidate_ids)
+
+    # 预算再小也至少保留一个候选
+    assert len(build_match_prompt("user_1", candidate_ids=order, users=users, budget=1, template="T").candidate_ids) == 1
+
+
+def test_estimate_tokens_counts_cjk_per_character():
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("课程abcde") == 4
@@ -0,0 +1,86 @@
+import random
+
+import derived_index
+import minhash_index
+from minhash_index import (
+    MAX_SEMESTER, NUM_PERM, MinHashIndex, estimate_jaccard, experience_tokens, prefix_signatures,
+)
+from user_store import JsonUserStore, add_change_listener, remove_change_listener
+
+
+def _record(semester, courses=(), research=()):
+    return {
+        "academic_progress": {
+            "current_semester": semester,
+            "completed_courses": [{"name": name, "grade": 3.0, "semester": s} for name, s in courses],
+            "research_done": [{"name": name, "complete_semester": s} for name, s in research],
+            "competitions_done": [],
+        },
+    }
+
+
+def _courses(names, semester):
+    return [(name, semester) for name in names]
+
+
+def test_prefixes_accumulate_semesters():
+    record = _record(4, courses=_courses("ABC", 1) + _courses("DE", 3), research=[("课题", 0)])
+    assert experience_tokens(record)[0] == {"research:课题"}
+    signatures = prefix_signatures(record)
+    assert len(signatures) == MAX_SEMESTER and len(signatures[0]) == NUM_PERM
+    # 第 2 学期没有新经历：前缀签名不变
+    assert signatures[1] == signatures[0] != signatures[2]
+    assert prefix_signatures(_record(1))[0] is None
+    assert prefix_signatures(record) == signatures
+
+
+def test_estimate_tracks_the_exact_jaccard():
+    rng = random.Random(5)
+    pool = [f"课程{i}" for i in range(60)]
+    for _ in range(20):
+        a, b = set(rng.sample(pool, 20)), set(rng.sample(pool, 20))
+        exact = len(a & b) / len(a | b)
+        estimate = estimate_jaccard(
+            prefix_signatures(_record(2, courses=_courses(a, 1)))[0],
+            prefix_signatures(_record(2, courses=_courses(b, 1)))[0],
+        )
+        assert abs(estimate - exact) < 0.25
+    assert estimate_jaccard(None, prefix_signatures(_record(2, courses=_courses("A", 1)))[0]) == 0.0
+
+
+def test_query_follows_the_semester_rule():
+    index = MinHashIndex()
+    early = _courses([f"课程{i}" for i in range(8)], 1)
+    index.upsert("user_1", _record(2, courses=early))
+    index.upsert("user_2", _record(3, courses=early + _courses("XY", 2)))
+    index.upsert("user_3", _record(1, courses=early))
+    index.upsert("user_4", _record(5, courses=_courses([f"其他{i}" for i in range(8)], 1)))
+
+    assert index.query("user_1") == [("user_2", 1.0)]
+    assert [uid for uid, _ in index.query("user_1", prefix=1)] == ["user_2", "user_3"]
+    assert index.query("user_3") == []
+
+    index.remove("user_2")
+    assert index.query("user_1") == []
+    assert all("user_2" not in bucket for buckets in index.buckets for bucket in buckets.values())
+
+
+def test_writes_outside_academic_progress_keep_the_signatures(tmp_path, monkeypatch):
+    store = JsonUserStore(str(tmp_path / "users.json"))
+    store.insert("user_1", _record(2, courses=_courses("AB", 1)))
+    monkeypatch.setattr(derived_index, "get_user_store", lambda: store)
+    index = MinHashIndex()
+    index.reconcile(store)
+    calls = []
+    monkeypatch.setattr(minhash_index, "prefix_signatures", lambda record: calls.append(record) or (None,) * MAX_SEMESTER)
+
+    add_change_listener(index.apply_changes)
+    try:
+        store.update("user_1", lambda user: user.update(path_review={"content": "评价", "like_count": 1}))
+        assert calls == []
+        store.update("user_1", lambda user: user["academic_progress"]["completed_courses"].append(
+            {"name": "C", "grade": 3.0, "semester": 1}
+        ))
+        assert len(calls) == 1
+    finally:
+        remove_change_listener(index.apply_changes)
@@ -0,0 +1,75 @@
+import copy
+import json
+import os
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from peer_ann import PeerIndex, _current_semester
+from user_store import JsonUserStore
+
+USERS_JSON = os.path.join(os.path.dirname(__file__), "..", "databases", "users.json")
+
+
+@pytest.fixture
+def users():
+    with open(USERS_JSON, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def index(tmp_path, users):
+    path = tmp_path / "users.json"
+    path.write_text(json.dumps(users, ensure_ascii=False), encoding="utf-8")
+    index = PeerIndex()
+    index.reconcile(JsonUserStore(str(path)))
+    return index
+
+
+def _major(record):
+    return record["profile"]["school"], record["profile"]["major"]
+
+
+def test_peers_follow_the_candidate_rule(index, users):
+    for user_id, record in users.items():
+        peers = index.query(record, k=5, exclude=user_id)
+        scores = [score for _, score in peers]
+        assert scores == sorted(scores, reverse=True)
+        for uid, _ in peers:
+            assert uid != user_id
+            assert _major(users[uid]) == _major(record)
+            assert _current_semester(users[uid]) >= _current_semester(record)
+
+
+def test_identical_record_is_the_best_peer(index, users):
+    user_id, record = next(iter(users.items()))
+    index.upsert("user_9999999999", copy.deepcopy(record))
+    peers = index.query(record, k=3, exclude=user_id)
+    assert peers[0][0] == "user_9999999999"
+    assert peers[0][1] == pytest.approx(1.0)
+
+    index.remove("user_9999999999")
+    assert "user_9999999999" not in [uid for uid, _ in index.query(record, k=3, exclude=user_id)]
+
+
+def test_partitions_grow_and_reuse_rows(index, users):
+    user_id, record = next(iter(users.items()))
+    for i in range(40):
+        index.upsert(f"user_copy{i}", copy.deepcopy(record))
+    for i in range(20):
+        index.remove(f"user_copy{i}")
+    index.upsert("user_copy99", copy.deepcopy(record))
+
+    partition = index.partitions[_major(record)]
+    found = {uid for uid, _ in partition.query(partition.vectorize(record), 0, k=100)}
+    assert {f"user_copy{i}" for i in range(20, 40)} | {"user_copy99"} <= found
+    assert not found & {f"user_copy{i}" for i in range(20)}
+
+
+def test_saved_index_answers_the_same(index, users, tmp_path):
+    path = str(tmp_path / "peer_ann.pkl")
+    index.save(path)
+    loaded = PeerIndex.load(path)
+    for user_id, record in list(users.items())[:10]:
+        assert loaded.query(record, k=3, exclude=user_id) == index.query(record, k=3, exclude=user_id)
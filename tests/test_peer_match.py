@@ -0,0 +1,67 @@
+import pytest
+
+from peer_match import extract_experience, find_similar_users, parse_user_ids, similarity
+
+SCHOOL, MAJOR = "信息学院", "计算机科学与技术"
+ELECTIVES = ("计算机网络编程", "嵌入式系统", "数字图像处理")
+
+
+def _record(semester, courses=(), research=(), school=SCHOOL, major=MAJOR):
+    return {
+        "profile": {"school": school, "major": major},
+        "academic_progress": {
+            "current_semester": semester,
+            "completed_courses": [
+                {"name": name, "grade": 3.0, "semester": s, "category": "计算机类 -13 系统与网络"}
+                for name, s in courses
+            ],
+            "research_done": [{"name": name, "complete_semester": s} for name, s in research],
+            "competitions_done": [],
+        },
+    }
+
+
+def _users():
+    return {
+        "user_1": _record(4, courses=[(ELECTIVES[0], 2), (ELECTIVES[1], 3)]),
+        # 与目标完全相同，但经历都在目标当前学期之后
+        "user_2": _record(6, courses=[(ELECTIVES[0], 4), (ELECTIVES[1], 5)]),
+        "user_3": _record(5, courses=[(ELECTIVES[0], 1), (ELECTIVES[1], 2)]),
+        "user_4": _record(6, courses=[(ELECTIVES[0], 1)]),
+        # 学期早于目标：不是候选
+        "user_5": _record(3, courses=[(ELECTIVES[0], 1), (ELECTIVES[1], 2)]),
+        # 其他专业：不是候选
+        "user_6": _record(4, courses=[(ELECTIVES[0], 2), (ELECTIVES[1], 3)], major="软件工程"),
+        "user_7": _record(5, courses=[(ELECTIVES[0], 2), (ELECTIVES[1], 3)]),
+    }
+
+
+def test_candidates_share_the_major_and_are_not_behind():
+    ranked = find_similar_users("user_1", k=10, users=_users())
+    assert [uid for uid, _, _ in ranked] == ["user_3", "user_7", "user_4", "user_2"]
+    assert ranked[0][1] == ranked[1][1] == 1.0
+    assert ranked[-1][1] == 0.0
+
+
+def test_ranking_ignores_the_input_order():
+    users = _users()
+    forward = find_similar_users("user_1", users=users)
+    backward = find_similar_users("user_1", users=list(reversed(list(users.items()))))
+    assert forward == backward
+
+
+def test_missing_target_raises():
+    with pytest.raises(ValueError):
+        find_similar_users("user_9", users=_users())
+
+
+def test_only_experiences_before_the_baseline_are_compared():
+    experience = extract_experience(_users()["user_2"], 4)
+    assert experience.is_empty()
+    empty, parts = similarity(experience, extract_experience(_users()["user_2"], 4))
+    assert (empty, parts) == (0.0, {})
+
+
+def test_parse_user_ids_keeps_allowed_ids_in_order():
+    text = "1. user_3\n2. user_9\n3. user_1, user_3\n4. user_7"
+    assert parse_user_ids(text, {"user_1", "user_3", "user_7"}, exclude="user_1") == ["user_3", "user_7"]
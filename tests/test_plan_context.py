@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from catalog_cache import thaw
+from catalog_index import ITEM_LIST_KEYS, get_catalog_index
+from plan_context import CONTEXT_KINDS, MajorContext, get_major_context
+
+SCHOOL, MAJOR, SEMESTER = "信息学院", "计算机科学与技术", 6
+
+
+@pytest.fixture(scope="module")
+def context():
+    return MajorContext(get_catalog_index(), SCHOOL, MAJOR, SEMESTER)
+
+
+def _records(kind):
+    """The blocks as the plan prompt built them with json.dumps before the cache."""
+    catalog_index = get_catalog_index()
+    records = []
+    for school, major_info in catalog_index.records_for_major(kind, MAJOR):
+        major_info = thaw(major_info)
+        if kind == "courses":
+            major_info["课程列表"] = [c for c in major_info["课程列表"] if c.get("standard_semester") == SEMESTER]
+        records.append({"学院名称": school, "专业": major_info})
+    return records
+
+
+def test_full_blocks_equal_json_dumps(context):
+    for kind, _ in CONTEXT_KINDS:
+        assert context.block(kind) == json.dumps(_records(kind), ensure_ascii=False)
+
+
+def test_retrieved_blocks_equal_json_dumps(context):
+    entry = get_catalog_index().major(SCHOOL, MAJOR)
+    for kind, list_key in ITEM_LIST_KEYS.items():
+        record = next(r for r in _records(kind) if r["学院名称"] == SCHOOL)
+        items = list(entry.courses_by_semester[SEMESTER] if kind == "courses" else getattr(entry, kind))[::2]
+        record["专业"][list_key] = thaw(items)
+        assert context.block(kind, items) == json.dumps([record], ensure_ascii=False)
+
+    # 不属于本上下文的条目（如另一目录版本）现场序列化
+    outsider = {"name": "临时课程", "credits": 1}
+    assert json.loads(context.block("courses", [outsider]))[0]["专业"]["课程列表"] == [outsider]
+
+
+def test_shared_section_does_not_depend_on_retrieval(context):
+    entry = get_catalog_index().major(SCHOOL, MAJOR)
+    selected = {"courses": list(entry.courses_by_semester[SEMESTER])[:1], "research": list(entry.research)[:1]}
+    other = {"courses": list(entry.courses_by_semester[SEMESTER])[1:2], "research": list(entry.research)[1:2]}
+    lines = context.shared_section(selected).splitlines()
+    assert lines[0] == "Major-Scoped Databases:"
+    assert [line.split(":")[0] for line in lines[1:]] == ["course_requirement.json", "contests.json"]
+    assert context.shared_section(other) == context.shared_section(selected)
+
+    retrieved = context.retrieved_section(selected).splitlines()
+    assert retrieved[1:] == [
+        f"courses.json: {context.block('courses', selected['courses'])}",
+        f"research.json: {context.block('research', selected['research'])}",
+    ]
+
+
+def test_without_retrieval_every_block_is_shared(context):
+    assert context.retrieved_section() == context.retrieved_section({}) == ""
+    assert len(context.shared_section().splitlines()) == 1 + len(CONTEXT_KINDS)
+
+
+def test_contexts_are_shared_per_cohort():
+    first = get_major_context(SCHOOL, MAJOR, SEMESTER)
+    assert get_major_context(SCHOOL, MAJOR, SEMESTER) is first
+    assert get_major_context(SCHOOL, MAJOR, SEMESTER - 1) is not first
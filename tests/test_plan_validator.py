@@ -0,0 +1,93 @@
+import pytest
+
+import register
+from catalog_index import get_catalog_index
+from plan_validator import PlanValidator, StreamingValidation, normalize_reply, recommended_items, validate_plan
+
+SCHOOL, MAJOR = "信息学院", "计算机科学与技术"
+
+
+def _user(gpa=3.5):
+    _, user = register._new_user_record({
+        "student_id": 1, "name": "甲", "enrollment_year": 2023, "school": SCHOOL,
+        "major": MAJOR, "target": "保研", "current_semester": 6,
+    })
+    user["average_grades"] = gpa
+    user["academic_progress"]["completed_courses"] = [
+        {"name": "大数据可视化", "grade": 3.0, "semester": 5},
+        {"name": "自学的课（目录外）", "grade": 3.0, "semester": 5},
+    ]
+    for gap in user["remaining_tasks"]["optional_course_gap"]:
+        if gap["category"] == "计算机类 -10 计算机类专业实践":
+            gap["course_gap"] = 0
+    return user
+
+
+def _research():
+    return next(iter(get_catalog_index().major(SCHOOL, MAJOR).research_names))
+
+
+DRAFT = """## 第 6 学期规划
+1. **信息检索导论**：与保研方向相关
+2. 运筹学建模与算法
+3. 《大数据可视化》
+- 数据库系统开发实践
+- 机器学习（必修课，按培养方案修读）
+- 《不存在的课》
+"""
+
+
+def _rules(violations):
+    return sorted((v.rule, v.name) for v in violations)
+
+
+def test_each_rule_is_reported_once():
+    violations = validate_plan(DRAFT + DRAFT, _user())
+    assert _rules(violations) == [
+        ("category_met", "数据库系统开发实践"),
+        ("completed", "大数据可视化"),
+        ("unknown_item", "不存在的课"),
+        ("wrong_semester", "运筹学建模与算法"),
+    ]
+
+
+def test_low_gpa_blocks_research():
+    draft = f"- {_research()}\n- 信息检索导论\n"
+    assert validate_plan(draft, _user(gpa=3.0)) == []
+    assert _rules(validate_plan(draft, _user(gpa=2.0))) == [("low_gpa", _research())]
+
+
+def test_only_recommendation_lines_are_scanned():
+    text = "你已经学过信息检索导论。\n- 信息检索导论、运筹学建模与算法\n"
+    assert recommended_items(text) == ["信息检索导论", "运筹学建模与算法"]
+    # 目录外的已修课程名称优先匹配，其中包含的目录名称不算推荐
+    assert recommended_items("- 高等数学Ⅰ强化", extra_names=["高等数学Ⅰ强化"]) == ["高等数学Ⅰ强化"]
+
+
+def test_streaming_matches_a_whole_check():
+    user = _user()
+    streaming = StreamingValidation(user)
+    for position in range(0, len(DRAFT), 7):
+        streaming.feed(DRAFT[position:position + 7])
+    assert _rules(streaming.result(timeout=5)) == _rules(PlanValidator(user).check(DRAFT))
+    assert not streaming._worker.is_alive()
+
+
+def test_close_stops_the_worker_early():
+    streaming = StreamingValidation(_user())
+    streaming.feed("- 《不存在的课》\n- 运筹学")
+    streaming.close(timeout=5)
+    streaming.close(timeout=5)
+    assert not streaming._worker.is_alive()
+    # 关闭后未成行的部分不再检查
+    assert _rules(streaming.result(timeout=5)) == [("unknown_item", "不存在的课")]
+
+
+def test_normalize_reply():
+    assert normalize_reply(" 无需修正。\n") == normalize_reply("无需 修正!") == "无需修正"
+    assert normalize_reply("无需修正，但建议删除X") != "无需修正"
+
+
+@pytest.mark.parametrize("draft", ["", "没有推荐内容", "- 信息检索导论"])
+def test_clean_drafts_pass(draft):
+    assert validate_plan(draft, _user()) == []
@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+import recommend
+import register
+from plan_validator import StreamingValidation
+
+
+class _Gateway:
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.prompts = []
+
+    def stream(self, prompt, api_key, on_queue=None):
+        self.prompts.append(prompt)
+        reply = self.replies.pop(0)
+        for chunk in reply:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+@pytest.fixture
+def plan(monkeypatch):
+    """Run stream_conversation_for_plan against scripted LLM replies; returns (run, validations)."""
+    _, user = register._new_user_record({
+        "student_id": 1, "name": "甲", "enrollment_year": 2023, "school": "信息学院",
+        "major": "计算机科学与技术", "target": "保研", "current_semester": 6,
+    })
+    monkeypatch.setattr(recommend, "get_user", lambda user_id: user)
+    monkeypatch.setattr(recommend, "PLAN_STREAMING", "speculative")
+    monkeypatch.setattr(recommend, "_SESSION_CACHE", {})
+    validations = []
+
+    class Recorded(StreamingValidation):
+        def __init__(self, *args):
+            super().__init__(*args)
+            validations.append(self)
+
+    monkeypatch.setattr(recommend, "StreamingValidation", Recorded)
+
+    def run(*replies, demand="请为我规划本学期的选修课"):
+        gateway = _Gateway(*replies)
+        monkeypatch.setattr(recommend, "get_llm_gateway", lambda: gateway)
+        run.gateway = gateway
+        return recommend.stream_conversation_for_plan("user_1", demand)
+
+    return run, validations
+
+
+def test_draft_and_suppressed_correction(plan):
+    run, validations = plan
+    chunks = list(run(["- 《不存在的课》\n", "- 信息检索导论"], ["无需", "修正。"]))
+    assert "".join(chunks) == "- 《不存在的课》\n- 信息检索导论"
+    assert not validations[0]._worker.is_alive()
+
+
+def test_correction_is_appended(plan):
+    run, _ = plan
+    chunks = list(run(["- 《不存在的课》"], ["无需修正，", "但建议删除不存在的课"]))
+    assert "".join(chunks) == "- 《不存在的课》" + recommend.CORRECTION_HEADER + "无需修正，但建议删除不存在的课"
+
+
+def test_abandoned_stream_stops_the_worker(plan):
+    run, validations = plan
+    stream = run(["- 信息检索导论\n", "- 运筹学建模与算法\n"])
+    assert next(stream) == "- 信息检索导论\n"
+    stream.close()
+    assert not validations[0]._worker.is_alive()
+
+
+def test_failed_stream_stops_the_worker(plan):
+    run, validations = plan
+    with pytest.raises(ConnectionError):
+        list(run(["- 信息检索导论\n", ConnectionError("reset")]))
+    assert not validations[0]._worker.is_alive()
+    assert not [t for t in threading.enumerate() if t.name == "plan-validation"]
+
+
+def test_demands_share_the_prompt_prefix(plan):
+    run, _ = plan
+    prompts = []
+    for demand in ("推荐信息检索方向的选修课", "有哪些适合我的科研项目"):
+        list(run(["- 信息检索导论"], ["无需修正。"], demand=demand))
+        prompts.append(run.gateway.prompts[0])
+    session = recommend._SESSION_CACHE["user_1"]
+    prefix = prompts[0][:prompts[0].index(session["user_profile"])]
+    assert prompts[1].startswith(prefix) and "Major-Scoped Databases:" in prefix
+    assert "Retrieved Catalog Items" not in prefix and "Retrieved Catalog Items" in prompts[0]
@@ -0,0 +1,144 @@
+import copy
+import json
+import os
+
+import pytest
+
+import register
+from catalog_index import CATALOG_FILES, DB_DIR, get_catalog_index
+from user_store import JsonUserStore
+
+SCHOOL, MAJOR = "信息学院", "计算机科学与技术"
+
+
+def _data(student_id=1, **overrides):
+    data = {
+        "student_id": student_id, "name": "甲", "enrollment_year": 2023, "school": SCHOOL,
+        "major": MAJOR, "target": "保研", "current_semester": 3,
+    }
+    data.update(overrides)
+    return data
+
+
+def _new_user():
+    _, user = register._new_user_record(_data())
+    return user
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = JsonUserStore(str(tmp_path / "users.json"))
+    monkeypatch.setattr(register, "get_user_store", lambda: store)
+    return store
+
+
+def _courses(count):
+    # 每隔几门取一门，覆盖必修课与各个选修缺口类别
+    entry = get_catalog_index().major(SCHOOL, MAJOR)
+    return [
+        {"name": course["name"], "grade": (3.0, 3.7, 4.0)[i % 3], "semester": 1}
+        for i, course in enumerate(entry.courses[::5][:count])
+    ]
+
+
+def _assert_same_scores(user, expected):
+    assert user["total_credits"] == expected["total_credits"]
+    assert user["average_grades"] == expected["average_grades"]
+    assert user["total_grade_points"] == expected["total_grade_points"]
+    assert user["knowledge"] == pytest.approx(expected["knowledge"])
+    assert user["remaining_tasks"] == expected["remaining_tasks"]
+
+
+def test_delta_matches_a_full_recompute():
+    courses = _courses(12)
+    expected = _new_user()
+    register._recompute_progress(expected, {"courses": courses})
+
+    user = _new_user()
+    register._apply_completed_delta(user, courses[:5], (), ())
+    register._apply_completed_delta(user, courses[3:], (), ())
+    assert user["academic_progress"]["completed_courses"] == courses
+    _assert_same_scores(user, expected)
+
+
+def test_grade_change_adjusts_the_running_total():
+    courses = _courses(6)
+    user = _new_user()
+    register._apply_completed_delta(user, courses, (), ())
+    regraded = dict(courses[2], grade=1.0)
+    register._apply_completed_delta(user, [regraded], (), ())
+
+    expected = _new_user()
+    register._recompute_progress(expected, {"courses": courses[:2] + [regraded] + courses[3:]})
+    _assert_same_scores(user, expected)
+
+
+def test_legacy_record_without_grade_points():
+    courses = _courses(8)
+    user = _new_user()
+    register._recompute_progress(user, {"courses": courses[:4]})
+    del user["total_grade_points"]
+    register._apply_completed_delta(user, courses[4:], (), ())
+
+    expected = _new_user()
+    register._recompute_progress(expected, {"courses": courses})
+    _assert_same_scores(user, expected)
+
+
+def test_full_recompute_does_not_subtract_gaps_twice(store):
+    courses = _courses(12)
+    store.insert("user_1", _new_user())
+
+    assert register.add_completed_items("user_1", courses[:6])
+    assert register.add_completed_items("user_1", courses[6:], full_recompute=True)
+    assert register.add_completed_items("user_1", (), full_recompute=True)
+
+    expected = _new_user()
+    register._recompute_progress(expected, {"courses": copy.deepcopy(courses)})
+    assert expected["remaining_tasks"] != _new_user()["remaining_tasks"]
+    _assert_same_scores(store.get("user_1"), expected)
+
+
+def _major_section(kind):
+    with open(os.path.join(DB_DIR, CATALOG_FILES[kind]), "r", encoding="utf-8") as f:
+        data = json.load(f)
+    college = next(c for c in data["学院列表"] if c["学院名称"] == SCHOOL)
+    return next(m for m in college["专业列表"] if m["专业名称"] == MAJOR)
+
+
+def test_new_record_follows_the_major_section_of_the_catalog():
+    expected_tasks = {
+        "must_required_courses": _major_section("courses").get("course_map", []),
+        "optional_course_gap": _major_section("course_requirement").get("个性化选修课课程要求", []),
+    }
+    user_id, user = register._new_user_record(_data(42))
+    assert user_id == "user_0000000042"
+    assert user["remaining_tasks"] == expected_tasks
+    assert expected_tasks["optional_course_gap"]
+    assert set(user["knowledge"]) and set(user["knowledge"].values()) == {0.0}
+
+    # 每条新记录都是独立的可变副本
+    user["remaining_tasks"]["optional_course_gap"][0]["course_gap"] = 0
+    user["knowledge"][next(iter(user["knowledge"]))] = 5.0
+    assert _new_user()["remaining_tasks"] == expected_tasks
+    assert set(_new_user()["knowledge"].values()) == {0.0}
+
+
+def test_unknown_major_gets_an_empty_template():
+    _, user = register._new_user_record(_data(major="不存在的专业"))
+    assert user["knowledge"] == {} and user["skills"] == {}
+    assert user["remaining_tasks"] == {"must_required_courses": [], "optional_course_gap": []}
+
+
+def test_register_users_reports_each_row(store):
+    assert register.register_user(_data(1)) == (True, "user_0000000001")
+    results = register.register_users([
+        _data(2), _data(1), {"student_id": 3}, _data(2, name="乙"), _data(4),
+    ])
+    assert results[0] == (True, "user_0000000002")
+    assert results[1] == (False, "学号已注册")
+    assert results[2][0] is False
+    assert results[3] == (False, "学号已注册")
+    assert results[4] == (True, "user_0000000004")
+    assert sorted(uid for uid, _ in store.items()) == ["user_0000000001", "user_0000000002", "user_0000000004"]
+    assert store.get("user_0000000002")["profile"]["name"] == "甲"
@@ -0,0 +1,64 @@
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, normalize_demand, progress_fingerprint
+
+
+def _user(semester=6):
+    return {
+        "profile": {"major": "计算机科学与技术"},
+        "academic_progress": {"current_semester": semester, "completed_courses": []},
+        "remaining_tasks": {},
+        "path_review": {"like_count": 0},
+    }
+
+
+def test_normalize_demand():
+    assert normalize_demand("本学期应该选什么课？") == normalize_demand(" 本学期 应该选什么课 ") == "本学期应该选什么课"
+    assert normalize_demand("Python课程!") == normalize_demand("ｐｙｔｈｏｎ 课程") == "python课程"
+    assert normalize_demand(None) == ""
+
+
+def test_key_follows_progress_not_reviews():
+    user = _user()
+    key = ResponseCache.key("选课？", user, "v1")
+    user["path_review"]["like_count"] = 5
+    assert ResponseCache.key("选课", user, "v1") == key
+    assert ResponseCache.key("选课", _user(semester=7), "v1") != key
+    assert ResponseCache.key("选课", user, "v2") != key
+    assert ResponseCache.key("选课", user, "v1", settings=("speculative",)) != key
+    assert progress_fingerprint(user) == progress_fingerprint(_user())
+
+
+def test_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    cache = ResponseCache(ttl=10, size=4)
+    cache.put("a", "回复")
+    assert cache.get("a") == "回复"
+    now[0] += 10
+    assert cache.get("a") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_is_evicted():
+    cache = ResponseCache(ttl=60, size=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("1", "3")
+
+
+@pytest.mark.parametrize("ttl, size", [(0, 4), (60, 0)])
+def test_disabled_cache_stores_nothing(ttl, size):
+    cache = ResponseCache(ttl=ttl, size=size)
+    cache.put("a", "1")
+    assert cache.get("a") is None and not cache._entries
+
+
+def test_empty_replies_are_not_cached():
+    cache = ResponseCache(ttl=60, size=4)
+    cache.put("a", "")
+    assert cache.get("a") is None
@@ -0,0 +1,89 @@
+import copy
+import json
+import os
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import register
+import scoring
+from catalog_index import CATALOG_FILES, DB_DIR, CatalogIndex
+
+FRACTIONAL_WEIGHTS = (0.1, 0.15, 0.35, 0.45, 0.05, 1)
+FRACTIONAL_GRADES = (1.15, 2.35, 3.05, 3.7, 0.45, 4.0)
+
+
+def _fractional_catalog():
+    """The real catalog with every course knowledge weight replaced by a fractional one."""
+    rng = random.Random(7)
+    catalogs = {}
+    for kind, filename in CATALOG_FILES.items():
+        with open(os.path.join(DB_DIR, filename), "r", encoding="utf-8") as f:
+            catalogs[kind] = json.load(f)
+    for college in catalogs["courses"]["学院列表"]:
+        for major in college["专业列表"]:
+            for course in major.get("课程列表", []):
+                course["knowledge"] = {k: rng.choice(FRACTIONAL_WEIGHTS) for k in course.get("knowledge", {})}
+    return CatalogIndex(("fractional",), catalogs)
+
+
+def _users(catalog_index, count=20):
+    rng = random.Random(11)
+    courses = list(catalog_index.courses)
+    research = list(catalog_index.research)
+    contests = list(catalog_index.contests)
+    major = next(iter(catalog_index.majors.values()))
+    template = {
+        "profile": {"school": major.school, "major": major.major},
+        "academic_progress": {"completed_courses": [], "research_done": [], "competitions_done": []},
+        "knowledge": {k: 0.0 for k in major.knowledge_tags},
+        "skills": {s: 0.0 for s in major.skill_tags},
+    }
+    users = []
+    for _ in range(count):
+        user = copy.deepcopy(template)
+        payload = {
+            "courses": [{"name": n, "grade": rng.choice(FRACTIONAL_GRADES), "semester": 1} for n in rng.sample(courses, 12)],
+            "research": [{"name": n, "complete_semester": 2} for n in rng.sample(research, 2)],
+            "competitions": [{"name": n, "award": "参与奖", "complete_semester": 2} for n in rng.sample(contests, 2)],
+        }
+        users.append((user, payload))
+    return users
+
+
+def test_batch_scores_match_per_user_recompute_on_fractional_weights(monkeypatch):
+    catalog_index = _fractional_catalog()
+    monkeypatch.setattr(register, "get_catalog_index", lambda: catalog_index)
+    users = _users(catalog_index)
+    for user, payload in users:
+        register._recompute_progress(user, payload)
+
+    layout = (tuple(users[0][0]["knowledge"]), tuple(users[0][0]["skills"]))
+    scorer = scoring.MajorScorer(catalog_index, *layout)
+    knowledge, skills, credits, points, grades = scorer.score_batch([user["academic_progress"] for user, _ in users])
+    for position, (user, _) in enumerate(users):
+        fields = scoring._scores_to_fields(
+            scorer, knowledge[position], skills[position], credits[position], points[position], grades[position]
+        )
+        assert fields["knowledge"] == user["knowledge"]
+        assert fields["skills"] == user["skills"]
+        assert fields["total_credits"] == user["total_credits"]
+        assert fields["total_grade_points"] == user["total_grade_points"]
+        assert fields["average_grades"] == user["average_grades"]
+        assert not scoring._changed(user, fields)
+
+
+def test_knowledge_term_rounds_like_python_round():
+    assert register.knowledge_term(0.1, 1.0, 1.15) == round(0.1 * 1.0 * 1.15, 2) == 0.11
+
+
+def test_round2_matches_python_round():
+    rng = random.Random(3)
+    values = [rng.choice(FRACTIONAL_WEIGHTS) * rng.choice((0.5, 1.0, 2.5, 3.0)) * rng.choice(FRACTIONAL_GRADES)
+              for _ in range(20000)]
+    values += [rng.uniform(-1e4, 1e4) for _ in range(20000)] + [i / 1000 for i in range(-5000, 5000)]
+    values += [1.005, 2.675, 0.125, 0.375, 1.115]
+    expected = [round(value, 2) for value in values]
+    assert scoring.round2(np.array(values)).tolist() == expected
@@ -0,0 +1,46 @@
+import json
+import os
+
+import register
+import transcript_import
+from user_store import JsonUserStore
+
+USERS_JSON = os.path.join(os.path.dirname(__file__), "..", "databases", "users.json")
+USER_ID = "user_2023000001"
+
+
+def _store(tmp_path):
+    with open(USERS_JSON, "r", encoding="utf-8") as f:
+        user = json.load(f)[USER_ID]
+    path = tmp_path / "users.json"
+    path.write_text(json.dumps({USER_ID: user}, ensure_ascii=False), encoding="utf-8")
+    return JsonUserStore(str(path))
+
+
+def test_row_whose_scoring_raises_is_reported_and_skipped(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    monkeypatch.setattr(transcript_import, "get_user_store", lambda: store)
+
+    def apply_delta(user, courses, research, competitions):
+        if any(course["name"] == "高等代数Ⅱ" for course in courses):
+            raise KeyError("knowledge")
+        register._apply_completed_delta(user, courses, research, competitions)
+
+    monkeypatch.setattr(transcript_import, "_apply_completed_delta", apply_delta)
+    path = tmp_path / "export.csv"
+    path.write_text(
+        "student_id,course,grade,semester\n"
+        "2023000001,高等代数Ⅰ,3.7,1\n"
+        "2023000001,高等代数Ⅱ,3.3,2\n"
+        "2023000001,普通物理B,4.0,2\n"
+        "2023000001,不存在的课,4.0,2\n",
+        encoding="utf-8",
+    )
+
+    report = transcript_import.import_transcripts(str(path))
+
+    assert (report.rows, report.imported, report.users) == (4, 2, 1)
+    assert [error["line"] for error in report.errors] == [3, 5]
+    assert report.errors[0]["error"].startswith("计分失败: KeyError")
+    names = [c["name"] for c in store.get(USER_ID)["academic_progress"]["completed_courses"]]
+    assert "高等代数Ⅰ" in names and "普通物理B" in names and "高等代数Ⅱ" not in names
@@ -0,0 +1,59 @@
+import copy
+import json
+import os
+
+import user_model
+from user_model import CompactUser, compact_users, expand_users
+
+USERS_JSON = os.path.join(os.path.dirname(__file__), "..", "databases", "users.json")
+
+
+def _users():
+    with open(USERS_JSON, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_round_trip_is_lossless():
+    users = _users()
+    assert expand_users(compact_users(copy.deepcopy(users))) == users
+
+
+def test_unusual_records_round_trip():
+    record = {
+        "profile": {"name": "甲", "school": "信息学院", "major": "计算机科学与技术"},
+        "academic_progress": {
+            "completed_courses": [
+                {"name": "目录里没有的课", "grade": 4, "semester": "3", "category": "自选"},
+                {"grade": None},
+            ],
+            "competitions_done": [{"name": "某竞赛", "award": 1, "complete_semester": 2}],
+            "note": "额外字段",
+        },
+        "knowledge": {"数学基础": 1.5, "算法": "高"},
+        "skills": [],
+        "custom": {"a": [1, 1.0, True]},
+    }
+    user = CompactUser.from_dict("user_1", copy.deepcopy(record))
+    assert user.to_dict() == record
+    assert user.semester() == 0
+    assert user.completed_course_names() == ["目录里没有的课"]
+
+
+def test_repeated_sections_are_shared():
+    users = compact_users({
+        "user_1": {"profile": {"major": "软件工程"}, "remaining_tasks": {"must": ["高等数学Ⅰ"]}},
+        "user_2": {"profile": {"major": "软件工程"}, "remaining_tasks": {"must": ["高等数学Ⅰ"]}},
+    })
+    assert users["user_1"].remaining_tasks is users["user_2"].remaining_tasks
+    assert users["user_1"].profile is users["user_2"].profile
+
+
+def test_share_pool_is_bounded(monkeypatch):
+    monkeypatch.setattr(user_model, "SHARE_POOL_SIZE", 50)
+    user_model._share_pool.clear()
+    records = {f"user_{i}": {"profile": {"name": f"学生{i}", "major": "软件工程"}} for i in range(200)}
+    compact = compact_users(copy.deepcopy(records))
+    assert len(user_model._share_pool) <= 50
+    assert {uid: user.to_dict()["profile"] for uid, user in compact.items()} == {
+        uid: record["profile"] for uid, record in records.items()
+    }
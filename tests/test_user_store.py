@@ -0,0 +1,173 @@
+import json
+import logging
+
+import pytest
+
+from user_store import (
+    JsonUserStore, ShardedJsonUserStore, SqliteUserStore, _dump_users, _scan_offsets,
+    add_change_listener, remove_change_listener,
+)
+
+
+def _record(name, year=2023, school="信息学院"):
+    return {
+        "profile": {"name": name, "enrollment_year": year, "school": school, "major": "计算机科学与技术"},
+        "academic_progress": {"current_semester": 1, "completed_courses": []},
+        "knowledge": {}, "skills": {}, "total_credits": 0.0,
+    }
+
+
+@pytest.fixture(params=["json", "sqlite", "sharded"])
+def store(request, tmp_path):
+    if request.param == "json":
+        return JsonUserStore(str(tmp_path / "users.json"))
+    if request.param == "sqlite":
+        return SqliteUserStore(str(tmp_path / "users.sqlite3"), seed_path=None)
+    return ShardedJsonUserStore(str(tmp_path / "users"), seed_path=None)
+
+
+@pytest.fixture
+def changes():
+    seen = []
+    add_change_listener(seen.append)
+    yield seen
+    remove_change_listener(seen.append)
+
+
+def test_crud_round_trip(store, changes):
+    assert store.insert("user_1", _record("甲"))
+    assert not store.insert("user_1", _record("乙"))
+    assert store.insert_many({"user_1": _record("乙"), "user_2": _record("丙")}) == ["user_2"]
+    signature = store.signature()
+
+    assert store.update("user_1", lambda user: user.update(total_credits=3.0))
+    assert not store.update("user_9", lambda user: None)
+    assert store.get("user_1")["total_credits"] == 3.0
+    assert store.signature() != signature
+
+    assert store.delete("user_2") and not store.delete("user_2")
+    assert dict(store.items()) == {"user_1": store.get("user_1")}
+    assert changes == [
+        {"user_1": _record("甲")},
+        {"user_2": _record("丙")},
+        {"user_1": store.get("user_1")},
+        {"user_2": None},
+    ]
+
+
+def test_failing_mutator_writes_nothing(store):
+    store.insert("user_1", _record("甲"))
+
+    def fail(user):
+        user["total_credits"] = 99.0
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        store.update("user_1", fail)
+    assert store.get("user_1")["total_credits"] == 0.0
+
+
+def test_listeners_run_under_the_write_lock(store):
+    owned = []
+
+    def listener(changes):
+        owned.append(store._lock._is_owned())
+
+    add_change_listener(listener)
+    try:
+        store.insert("user_1", _record("甲"))
+        store.update("user_1", lambda user: None)
+        store.delete("user_1")
+    finally:
+        remove_change_listener(listener)
+    assert owned == [True, True, True]
+
+
+def test_listener_error_is_logged_and_write_kept(tmp_path, caplog):
+    store = JsonUserStore(str(tmp_path / "users.json"))
+
+    def listener(changes):
+        raise KeyError("index")
+
+    add_change_listener(listener)
+    try:
+        with caplog.at_level(logging.ERROR, logger="user_store"):
+            assert store.insert("user_1", _record("甲"))
+    finally:
+        remove_change_listener(listener)
+    assert store.get("user_1") == _record("甲")
+    assert "listener failed" in caplog.text
+
+
+def test_sharded_move_between_cohorts(tmp_path):
+    store = ShardedJsonUserStore(str(tmp_path / "users"), seed_path=None)
+    store.insert("user_1", _record("甲", year=2023))
+    store.update("user_1", lambda user: user["profile"].update(enrollment_year=2022))
+    assert store.shard_names() == ["2022/信息学院.json"]
+    assert store.get("user_1")["profile"]["enrollment_year"] == 2022
+    assert [uid for uid, _ in store._shard("2023/信息学院.json").items()] == []
+
+
+def test_sharded_interrupted_move_keeps_one_copy(tmp_path, monkeypatch):
+    store = ShardedJsonUserStore(str(tmp_path / "users"), seed_path=None)
+    store.insert("user_1", _record("甲", year=2023))
+    old_shard = store._shard("2023/信息学院.json")
+
+    def crash(user_id):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(old_shard, "delete", crash)
+    with pytest.raises(OSError):
+        store.update("user_1", lambda user: user["profile"].update(enrollment_year=2022))
+    monkeypatch.undo()
+
+    # 新分片与路由已写入，旧分片中的副本被忽略
+    assert [(uid, rec["profile"]["enrollment_year"]) for uid, rec in store.items()] == [("user_1", 2022)]
+    assert store.get("user_1")["profile"]["enrollment_year"] == 2022
+
+    # 再次迁移回原分片时覆盖遗留的副本
+    store.update("user_1", lambda user: user["profile"].update(enrollment_year=2023, name="乙"))
+    assert [(uid, rec["profile"]["name"]) for uid, rec in store.items()] == [("user_1", "乙")]
+
+
+def test_json_dump_offsets_match_the_standard_layout():
+    users = {"user_1": _record("甲"), "user_2": _record("乙\n丙")}
+    data, offsets = _dump_users(users)
+    assert data == json.dumps(users, ensure_ascii=False, indent=2).encode("utf-8")
+    for user_id, (start, end) in offsets.items():
+        assert json.loads(data[start:end]) == users[user_id]
+
+
+def test_json_get_survives_external_edits(tmp_path):
+    store = JsonUserStore(str(tmp_path / "users.json"))
+    store.insert_many({"user_1": _record("甲"), "user_2": _record("乙")})
+    assert store.get("user_2") == _record("乙")
+
+    # 手工改写（不同的排版）后旁路索引失效，重新扫描
+    users = {"user_2": _record("丙"), "user_1": _record("甲")}
+    (tmp_path / "users.json").write_text(json.dumps(users, ensure_ascii=False), encoding="utf-8")
+    assert store.get("user_2") == _record("丙")
+    assert store.get("user_3") is None
+    assert _scan_offsets(str(tmp_path / "users.json")).keys() == {"user_1", "user_2"}
+
+
+def test_sharded_layout_is_seeded_from_users_json(tmp_path):
+    users = {
+        "user_1": _record("甲", year=2023),
+        "user_2": _record("乙", year=2022, school="数学学院"),
+        "user_3": _record("丙", year=2023),
+    }
+    seed = tmp_path / "users.json"
+    seed.write_text(json.dumps(users, ensure_ascii=False), encoding="utf-8")
+    store = ShardedJsonUserStore(str(tmp_path / "users"), seed_path=str(seed))
+
+    assert store.shard_names() == ["2022/数学学院.json", "2023/信息学院.json"]
+    assert (tmp_path / "users" / "2023" / "信息学院.json").exists()
+    assert store.load_all() == {"user_2": users["user_2"], "user_1": users["user_1"], "user_3": users["user_3"]}
+
+    # 写入只改写所在的分片文件
+    other = tmp_path / "users" / "2022" / "数学学院.json"
+    before = other.stat().st_mtime_ns
+    store.update("user_1", lambda user: user.update(total_credits=2.0))
+    assert other.stat().st_mtime_ns == before
+    assert ShardedJsonUserStore(str(tmp_path / "users"), seed_path=str(seed)).get("user_1")["total_credits"] == 2.0